@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Резервные копии хранилища: хранилище объектов по хэшу содержимого и снимки-манифесты.
+
+Вместо полной копии хранилища на каждый запуск:
+- ``backups/objects/ab/cdef…`` — содержимое файлов, по одному объекту на
+  уникальный хэш (blake2b). Одинаковые файлы, переименования и файлы, не
+  менявшиеся между снимками, хранятся один раз;
+- ``backups/snapshots/<имя>.json.gz`` — манифест снимка: путь, хэш, размер,
+  mtime и права каждого файла. Неизменённый файл в новом снимке — это только
+  ссылка на уже сохранённый объект.
+
+Создание снимка сравнивает (size, mtime_ns) с прошлым снимком и читает
+только изменившиеся файлы, поэтому стоит столько, сколько изменилось.
+Десятки снимков занимают чуть больше одного: объекты общие, а манифесты
+маленькие и сжаты.
+
+Использование:
+    python3 backup_script.py create
+    python3 backup_script.py list
+    python3 backup_script.py cleanup [--keep 5]
+    python3 backup_script.py restore ИМЯ [--target КАТАЛОГ] [--path ПРЕФИКС]
+
+``cleanup`` оставляет последние снимки и удаляет объекты, на которые
+больше не ссылается ни один снимок.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import vault_metrics
+import vault_report
+from content_hash import CHUNK_SIZE, new_hasher
+from vault_metrics import incr, stage
+from vault_report import TEXT, Reporter
+from vault_scan import ScanEntry, scan_vault
+from vault_writer import atomic_replace, sync_paths
+
+VAULT_PATH = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+BACKUP_DIRNAME = "backups"
+BACKUP_PREFIX = "ios_knowledge_base_"
+BACKUP_ALGORITHM = "blake2b"
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".json.gz"
+# Имя снимка: префикс, время создания и номер при совпадении секунды (_2, _3, …)
+_SNAPSHOT_NAME_RE = re.compile(r"(.*_\d{8}_\d{6})(?:_(\d+))?")
+KEEP_LAST = 5
+# В резервную копию идёт всё, кроме самих копий и git (шаблоны — тоже)
+BACKUP_EXCLUDE_DIR_NAMES = frozenset({BACKUP_DIRNAME, ".git"})
+# Файлы не больше этого читаются целиком: объект пишется, только если его ещё нет
+INLINE_LIMIT = CHUNK_SIZE
+
+
+class FileRecord(NamedTuple):
+    path: str           # относительно корня хранилища, через "/"
+    digest: str
+    size: int
+    mtime_ns: int
+    mode: int
+
+
+class Snapshot(NamedTuple):
+    name: str
+    created: str
+    created_ns: int
+    stats: Dict[str, int]
+    files: List[FileRecord]
+
+
+class BackupStore:
+    """Каталог backups: объекты по хэшу и манифесты снимков."""
+
+    def __init__(self, backup_dir: Path):
+        self.root = backup_dir
+        self.objects = backup_dir / "objects"
+        self.snapshots = backup_dir / "snapshots"
+
+    @contextmanager
+    def locked(self) -> Iterator["BackupStore"]:
+        """Эксклюзивная блокировка: cleanup не удалит объекты снимка, который ещё пишется."""
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield self
+
+    # --- объекты ------------------------------------------------------------
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:]
+
+    def has_object(self, digest: str) -> bool:
+        return self.object_path(digest).exists()
+
+    def _publish(self, tmp_path: Path, digest: str) -> bool:
+        """Переносит готовый временный файл в объект; False — такой объект уже был."""
+        dst = self.object_path(digest)
+        if dst.exists():
+            os.unlink(tmp_path)
+            return False
+        dst.parent.mkdir(exist_ok=True)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, dst)
+        return True
+
+    def store(self, path: Path, size: int) -> Tuple[str, bool]:
+        """Сохраняет содержимое файла. Возвращает (хэш, был ли объект новым).
+
+        Небольшие файлы читаются в память и пишутся, только если такого объекта
+        ещё нет. Большие копируются потоково с одновременным хэшированием: имя
+        объекта — хэш именно скопированных байт, даже если файл меняется.
+        """
+        if size <= INLINE_LIMIT:
+            with stage("read"):
+                data = path.read_bytes()
+            incr("bytes_read", len(data))
+            with stage("hash"):
+                h = new_hasher(BACKUP_ALGORITHM)
+                h.update(data)
+                digest = h.hexdigest()
+            dst = self.object_path(digest)
+            if dst.exists():
+                return digest, False
+            dst.parent.mkdir(exist_ok=True)
+            atomic_replace(dst, lambda f: f.write(data))
+            os.chmod(dst, 0o444)
+            return digest, True
+
+        tmp_path = self.objects / f".incoming.{os.getpid()}.tmp"
+        h = new_hasher(BACKUP_ALGORITHM)
+        buf = bytearray(CHUNK_SIZE)
+        view = memoryview(buf)
+        total = 0
+        try:
+            with stage("read"), open(path, "rb", buffering=0) as src, open(tmp_path, "wb") as dst:
+                while True:
+                    n = src.readinto(buf)
+                    if not n:
+                        break
+                    h.update(view[:n])
+                    dst.write(view[:n])
+                    total += n
+            incr("bytes_read", total)
+            digest = h.hexdigest()
+            added = self._publish(tmp_path, digest)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        if added:
+            incr("bytes_written", total)
+        return digest, added
+
+    def iter_objects(self) -> Iterator[Tuple[str, Path]]:
+        for bucket in sorted(self.objects.iterdir()) if self.objects.exists() else ():
+            if not bucket.is_dir():
+                continue
+            for path in bucket.iterdir():
+                yield bucket.name + path.name, path
+
+    # --- снимки -------------------------------------------------------------
+
+    def snapshot_names(self) -> List[str]:
+        """Имена снимков от старых к новым (по времени в имени, затем по номеру)."""
+        if not self.snapshots.exists():
+            return []
+        names = (p.name[: -len(MANIFEST_SUFFIX)] for p in self.snapshots.glob(f"*{MANIFEST_SUFFIX}"))
+        return sorted(names, key=_snapshot_order)
+
+    def load(self, name: str) -> Snapshot:
+        with gzip.open(self.snapshots / f"{name}{MANIFEST_SUFFIX}", "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION or data.get("algorithm") != BACKUP_ALGORITHM:
+            raise ValueError(f"Снимок {name}: неподдерживаемая версия манифеста")
+        return Snapshot(
+            data["name"], data["created"], data["created_ns"], data["stats"],
+            [FileRecord(*item) for item in data["files"]],
+        )
+
+    def latest(self) -> Optional[Snapshot]:
+        for name in reversed(self.snapshot_names()):
+            try:
+                return self.load(name)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Снимок {name} не читается ({e}) — пропускаем")
+        return None
+
+    def save(self, snapshot: Snapshot) -> Path:
+        data = {
+            "version": MANIFEST_VERSION,
+            "algorithm": BACKUP_ALGORITHM,
+            "name": snapshot.name,
+            "created": snapshot.created,
+            "created_ns": snapshot.created_ns,
+            "stats": snapshot.stats,
+            "files": [list(record) for record in snapshot.files],
+        }
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        path = self.snapshots / f"{snapshot.name}{MANIFEST_SUFFIX}"
+        # mtime=0 — одинаковый манифест даёт одинаковые байты
+        atomic_replace(path, lambda f: f.write(gzip.compress(raw, mtime=0)))
+        return path
+
+    def new_name(self) -> str:
+        name = BACKUP_PREFIX + time.strftime("%Y%m%d_%H%M%S")
+        existing = set(self.snapshot_names())
+        candidate, n = name, 2
+        while candidate in existing:
+            candidate = f"{name}_{n}"
+            n += 1
+        return candidate
+
+
+def create_snapshot(root: Path, store: BackupStore, reporter: Reporter = TEXT) -> Snapshot:
+    """Снимок хранилища: изменившиеся с прошлого снимка файлы сохраняются в объекты.
+
+    Файл считается неизменённым, если совпали размер и mtime_ns, а mtime
+    старше начала прошлого снимка — файл, записанный в ту же секунду, что и
+    снимок, мог измениться без смены mtime, поэтому он перечитывается.
+    """
+    created_ns = time.time_ns()
+    previous = store.latest()
+    known: Dict[str, FileRecord] = {}
+    if previous is not None:
+        known = {
+            record.path: record for record in previous.files
+            if record.mtime_ns < previous.created_ns and store.has_object(record.digest)
+        }
+
+    entries: List[ScanEntry] = scan_vault(root, suffix=None, exclude=BACKUP_EXCLUDE_DIR_NAMES)
+    files: List[FileRecord] = []
+    new_objects: List[Path] = []
+    stats = {"files": 0, "bytes": 0, "reused": 0, "added_objects": 0, "added_bytes": 0, "errors": 0}
+    for entry in entries:
+        rel = entry.path.relative_to(root).as_posix()
+        st = entry.stat
+        old = known.get(rel)
+        if old is not None and old.size == st.st_size and old.mtime_ns == st.st_mtime_ns:
+            record = old._replace(mode=st.st_mode & 0o7777)
+            stats["reused"] += 1
+        else:
+            try:
+                digest, added = store.store(entry.path, st.st_size)
+            except OSError as e:
+                print(f"Ошибка чтения {entry.path}: {e}")
+                reporter.emit("error", path=entry.path, error=str(e))
+                stats["errors"] += 1
+                continue
+            record = FileRecord(rel, digest, st.st_size, st.st_mtime_ns, st.st_mode & 0o7777)
+            reporter.emit("stored", path=rel, digest=digest, size=st.st_size, new_object=added)
+            if added:
+                new_objects.append(store.object_path(digest))
+                stats["added_objects"] += 1
+                stats["added_bytes"] += st.st_size
+        files.append(record)
+        stats["files"] += 1
+        stats["bytes"] += record.size
+
+    snapshot = Snapshot(store.new_name(), time.strftime("%Y-%m-%dT%H:%M:%S"), created_ns, stats, files)
+    # Сначала на диске должны оказаться объекты, и только потом манифест, который на них ссылается
+    sync_paths(new_objects)
+    manifest = store.save(snapshot)
+    sync_paths([manifest])
+    return snapshot
+
+
+def _snapshot_order(name: str) -> Tuple[str, int]:
+    """Ключ сортировки снимков: номер при совпадении секунды сравнивается как число (_10 после _9)."""
+    m = _SNAPSHOT_NAME_RE.fullmatch(name)
+    if m is None:
+        return name, 0
+    return m.group(1), int(m.group(2) or 1)
+
+
+def cleanup_old_backups(backup_dir: Path, keep_last: int = KEEP_LAST, reporter: Reporter = TEXT) -> Tuple[int, int, int]:
+    """Оставляет keep_last последних снимков и удаляет объекты без ссылок.
+
+    Возвращает (удалено снимков, удалено объектов, освобождено байт).
+    """
+    store = BackupStore(backup_dir)
+    with store.locked():
+        names = store.snapshot_names()
+        doomed = names[: max(0, len(names) - keep_last)]
+        for name in doomed:
+            os.unlink(store.snapshots / f"{name}{MANIFEST_SUFFIX}")
+            reporter.emit("snapshot_removed", name=name)
+            print(f"🗑️ Удалён снимок {name}")
+
+        referenced: Set[str] = set()
+        for name in store.snapshot_names():
+            try:
+                snapshot = store.load(name)
+            except (OSError, ValueError) as e:
+                # Не зная, на что ссылается снимок, объекты удалять нельзя
+                print(f"❌ Снимок {name} не читается ({e}) — объекты не удаляются")
+                return len(doomed), 0, 0
+            referenced.update(record.digest for record in snapshot.files)
+
+        removed = freed = 0
+        for digest, path in store.iter_objects():
+            if digest in referenced:
+                continue
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        for path in store.objects.glob(".incoming.*.tmp"):
+            path.unlink(missing_ok=True)
+    return len(doomed), removed, freed
+
+
+def restore_snapshot(
+    store: BackupStore,
+    snapshot: Snapshot,
+    target: Path,
+    prefix: Optional[str] = None,
+    reporter: Reporter = TEXT,
+) -> Tuple[int, int, int]:
+    """Восстанавливает файлы снимка в target. Возвращает (восстановлено, без изменений, ошибок).
+
+    Файлы, которые в target уже совпадают со снимком по размеру и хэшу, не
+    перезаписываются; лишние файлы в target не удаляются.
+    """
+    restored = unchanged = errors = 0
+    for record in snapshot.files:
+        if prefix and not (record.path == prefix or record.path.startswith(prefix.rstrip("/") + "/")):
+            continue
+        dst = target / record.path
+        src = store.object_path(record.digest)
+        try:
+            st = dst.stat()
+        except OSError:
+            st = None
+        if st is not None and st.st_size == record.size:
+            h = new_hasher(BACKUP_ALGORITHM)
+            h.update(dst.read_bytes())
+            if h.hexdigest() == record.digest:
+                unchanged += 1
+                continue
+        try:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            with open(src, "rb") as f:
+                atomic_replace(dst, lambda out: _copy_stream(f, out))
+            os.chmod(dst, record.mode)
+            os.utime(dst, ns=(record.mtime_ns, record.mtime_ns))
+        except OSError as e:
+            print(f"Ошибка восстановления {record.path}: {e}")
+            reporter.emit("error", path=record.path, error=str(e))
+            errors += 1
+            continue
+        reporter.emit("restored", path=record.path, digest=record.digest)
+        restored += 1
+    return restored, unchanged, errors
+
+
+def _copy_stream(src, dst) -> None:
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+
+
+def _format_size(n: int) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "Б" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} ГБ"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Резервные копии хранилища с дедупликацией по содержимому")
+    parser.add_argument("--vault", type=Path, default=VAULT_PATH, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    parser.add_argument("--backup-dir", type=Path, default=None, help=f"Каталог копий (по умолчанию {BACKUP_DIRNAME}/ в корне)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = sub.add_parser("create", help="Создать снимок")
+    list_parser = sub.add_parser("list", help="Показать снимки")
+    cleanup_parser = sub.add_parser("cleanup", help="Удалить старые снимки и объекты без ссылок")
+    cleanup_parser.add_argument("--keep", type=int, default=KEEP_LAST, help="Сколько последних снимков оставить")
+    restore_parser = sub.add_parser("restore", help="Восстановить файлы из снимка")
+    restore_parser.add_argument("name", help="Имя снимка (см. list) или latest")
+    restore_parser.add_argument("--target", type=Path, default=None,
+                                help=f"Куда восстановить (по умолчанию {BACKUP_DIRNAME}/restore/ИМЯ)")
+    restore_parser.add_argument("--path", default=None, help="Только файлы с этим путём или в этом каталоге")
+    for subparser in (create_parser, list_parser, cleanup_parser, restore_parser):
+        vault_metrics.add_arguments(subparser)
+        vault_report.add_arguments(subparser)
+    args = parser.parse_args(argv)
+
+    tool = f"backup_script.{args.command}"
+    reporter = Reporter.from_args(tool, args)
+    with vault_metrics.instrument(tool, args), reporter.session():
+        return _run(args, reporter)
+
+
+def _run(args, reporter: Reporter) -> int:
+    backup_dir = args.backup_dir or args.vault / BACKUP_DIRNAME
+    store = BackupStore(backup_dir)
+
+    if args.command == "create":
+        start = time.perf_counter()
+        with store.locked():
+            snapshot = create_snapshot(args.vault, store, reporter)
+        stats = snapshot.stats
+        reporter.emit("summary", name=snapshot.name, **stats)
+        print(f"✅ Снимок {snapshot.name}: файлов {stats['files']} ({_format_size(stats['bytes'])})")
+        print(f"   Новых объектов: {stats['added_objects']} ({_format_size(stats['added_bytes'])}), "
+              f"без изменений: {stats['reused']}, за {time.perf_counter() - start:.1f} сек")
+        if stats["errors"]:
+            print(f"⚠️ Не удалось прочитать файлов: {stats['errors']}")
+            return 1
+        return 0
+
+    if args.command == "list":
+        names = store.snapshot_names()
+        if not names:
+            print("ℹ️ Резервных копий нет: python3 backup_script.py create")
+            reporter.emit("summary", snapshots=0)
+            return 0
+        print(f"📦 Снимков: {len(names)}")
+        for name in names:
+            try:
+                snapshot = store.load(name)
+            except (OSError, ValueError) as e:
+                print(f"  {name}: не читается ({e})")
+                continue
+            stats = snapshot.stats
+            reporter.emit("snapshot", name=name, created=snapshot.created, **stats)
+            print(f"  {name}  {snapshot.created}  файлов {stats['files']}, {_format_size(stats['bytes'])}, "
+                  f"новых {_format_size(stats['added_bytes'])}")
+        stored = sum(path.stat().st_size for _, path in store.iter_objects())
+        reporter.emit("summary", snapshots=len(names), stored_bytes=stored)
+        print(f"💾 Объекты на диске: {_format_size(stored)}")
+        return 0
+
+    if args.command == "cleanup":
+        snapshots, objects, freed = cleanup_old_backups(backup_dir, args.keep, reporter)
+        reporter.emit("summary", removed_snapshots=snapshots, removed_objects=objects, freed_bytes=freed)
+        print(f"✅ Удалено снимков: {snapshots}, объектов: {objects}, освобождено {_format_size(freed)}")
+        return 0
+
+    names = store.snapshot_names()
+    name = names[-1] if args.name == "latest" and names else args.name
+    if name not in names:
+        print(f"❌ Снимок {args.name} не найден (см. python3 backup_script.py list)")
+        return 1
+    snapshot = store.load(name)
+    target = args.target or backup_dir / "restore" / name
+    restored, unchanged, errors = restore_snapshot(store, snapshot, target, args.path, reporter)
+    reporter.emit("summary", name=name, target=target, restored=restored, unchanged=unchanged, errors=errors)
+    print(f"✅ Восстановлено в {target}: {restored}, уже совпадали: {unchanged}")
+    if errors:
+        print(f"⚠️ Ошибок: {errors}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
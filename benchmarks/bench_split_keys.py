@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк frontmatter_cleaner.split_multiple_keys на патологически длинных строках.
+
+Сравнивает текущий линейный разбор с прежней реализацией, которая в каждой
+позиции строки делала срез value_str[i:] и заново вызывала re.match, и
+проверяет, что результаты совпадают.
+
+Запуск:
+  python3 benchmarks/bench_split_keys.py
+  python3 benchmarks/bench_split_keys.py --sizes 1000 5000 20000 --repeat 3
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from frontmatter_cleaner import split_multiple_keys  # noqa: E402
+
+
+def legacy_split_multiple_keys(raw_line: str) -> List[str]:
+    """Прежняя реализация (до линейного разбора) — эталон для сравнения."""
+    # Ставит каждую пару key: value на отдельную строку, если их >1 в строке
+    line_no_nl = raw_line[:-1] if raw_line.endswith("\n") else raw_line
+    m = re.match(r"^(\s*[A-Za-z_][\w-]*\s*:\s*)(.*)$", line_no_nl)
+    if not m:
+        return [raw_line]
+
+    prefix, value_str = m.groups()
+
+    # Сканируем value_str на предмет второго ключа вне кавычек и квадратных скобок
+    in_quotes = False
+    escape = False
+    bracket_level = 0
+    pos2 = -1
+    i = 0
+    while i < len(value_str):
+        ch = value_str[i]
+        if escape:
+            escape = False
+            i += 1
+            continue
+        if ch == '\\':
+            escape = True
+            i += 1
+            continue
+        if ch == '"':
+            in_quotes = not in_quotes
+            i += 1
+            continue
+        if not in_quotes:
+            if ch == '[':
+                bracket_level += 1
+            elif ch == ']':
+                bracket_level = max(0, bracket_level - 1)
+            # Потенциальное начало нового ключа
+            if bracket_level == 0:
+                m2 = re.match(r"\s*([A-Za-z_][\w-]*)\s*:\s", value_str[i:])
+                if m2:
+                    pos2 = i + m2.start()
+                    break
+        i += 1
+
+    if pos2 == -1:
+        return [raw_line]
+
+    first = (prefix + value_str[:pos2].rstrip())
+    rest = value_str[pos2:].lstrip()
+    # Рекурсивно разбиваем хвост, если там тоже склеены ключи
+    tail_lines: List[str] = []
+    cur = rest
+    while True:
+        # добавим переносы строк к частям
+        block = cur
+        # следующий разрез
+        m_head = re.match(r"^(\s*[A-Za-z_][\w-]*\s*:\s*)(.*)$", block)
+        if not m_head:
+            tail_lines.append(block)
+            break
+        pfx, val = m_head.groups()
+        # поиск следующего ключа
+        in_q = False
+        esc = False
+        br = 0
+        cut = -1
+        j = 0
+        while j < len(val):
+            c = val[j]
+            if esc:
+                esc = False
+                j += 1
+                continue
+            if c == '\\':
+                esc = True
+                j += 1
+                continue
+            if c == '"':
+                in_q = not in_q
+                j += 1
+                continue
+            if not in_q:
+                if c == '[':
+                    br += 1
+                elif c == ']':
+                    br = max(0, br - 1)
+                if br == 0:
+                    m3 = re.match(r"\s*([A-Za-z_][\w-]*)\s*:\s", val[j:])
+                    if m3:
+                        cut = j + m3.start()
+                        break
+            j += 1
+
+        if cut == -1:
+            tail_lines.append(pfx + val)
+            break
+        else:
+            tail_lines.append((pfx + val[:cut].rstrip()))
+            cur = val[cut:].lstrip()
+            continue
+
+    result = []
+    result.append(first + ("\n" if not first.endswith("\n") else ""))
+    for t in tail_lines:
+        t2 = t + ("\n" if not t.endswith("\n") else "")
+        result.append(t2)
+    return result
+
+
+def pathological_lines(size):
+    """Строки длиной ~size символов, на которых прежний разбор квадратичен"""
+    word = "abcdefghij"
+    return {
+        "одно длинное слово": "summary: " + word * (size // len(word)),
+        "много слов без ключей": "summary: " + " ".join([word] * (size // (len(word) + 1))),
+        "длинный список тегов": "tags: " + ", ".join(["tag"] * (size // 5)),
+        "склеенные ключи": "".join(f"k{i}: v " for i in range(size // 6)),
+    }
+
+
+def best_time(func, line, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'случай':<24} {'длина':>7} {'было, с':>10} {'стало, с':>10} {'ускорение':>10}")
+    for size in args.sizes:
+        for name, line in pathological_lines(size).items():
+            expected = legacy_split_multiple_keys(line)
+            actual = split_multiple_keys(line)
+            if expected != actual:
+                print(f"❌ Результаты различаются: {name}, длина {len(line)}")
+                return 1
+            old = best_time(legacy_split_multiple_keys, line, args.repeat)
+            new = best_time(split_multiple_keys, line, args.repeat)
+            print(f"{name:<24} {len(line):>7} {old:>10.4f} {new:>10.4f} {old / new:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки скриптов обслуживания на синтетическом хранилище.
+
+Хранилище генерируется из seed (см. synthetic_vault.py), поэтому прогоны на
+одной машине сравнимы между собой. Меряются:
+- этапы — отдельные функции в этом процессе (обход, разбор заголовков,
+  clean_frontmatter_text и префильтр дефектов, поиск дубликатов, граф
+  ссылок, план переименований);
+- инструменты — каждый скрипт целиком отдельным процессом на свежей копии
+  хранилища: время и пиковый RSS (os.wait4).
+
+Из нескольких повторов берётся лучшее время и наибольший RSS. Результат
+сравнивается с сохранённым baseline: рост времени или RSS больше порога —
+регрессия, и скрипт завершается с кодом 1.
+
+Запуск:
+  python3 benchmarks/run_benchmarks.py --save-baseline          # записать baseline
+  python3 benchmarks/run_benchmarks.py                          # сравнить с ним
+  python3 benchmarks/run_benchmarks.py --notes 20000 --only find_duplicates
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import find_duplicates  # noqa: E402
+import link_graph  # noqa: E402
+import normalize_filenames  # noqa: E402
+from content_hash import find_duplicate_groups  # noqa: E402
+from frontmatter_cleaner import clean_frontmatter_text, has_defects, split_frontmatter  # noqa: E402
+from synthetic_vault import GENERATOR_VERSION, VaultSpec, generate_vault  # noqa: E402
+from vault_frontmatter import parse_note, read_header  # noqa: E402
+from vault_scan import scan_vault  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+# Этапы короче этого слишком шумные, чтобы ловить по ним регрессии
+MIN_SECONDS = 0.005
+
+# Инструменты целиком: имя → аргументы скрипта (--vault добавляется сам)
+TOOLS: Dict[str, List[str]] = {
+    "frontmatter_cleaner": ["frontmatter_cleaner.py", "--full"],
+    "frontmatter_cleaner_check": ["frontmatter_cleaner.py", "--full", "--check"],
+    "standardize_frontmatter": ["standardize_frontmatter.py", "--full"],
+    "find_duplicates": ["find_duplicates.py", "--full"],
+    "find_duplicates_near": ["find_duplicates.py", "--full", "--near"],
+    "link_graph": ["link_graph.py", "--full"],
+    "normalize_filenames": ["normalize_filenames.py", "--apply", "--strip-suffix"],
+    "vault_catalog": ["vault_catalog.py", "update"],
+    "complete_maintenance": ["complete_maintenance.py", "--full"],
+}
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _quiet(func: Callable[[], object]) -> Callable[[], object]:
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return run
+
+
+def stage_benchmarks(root: Path) -> Dict[str, Callable[[], object]]:
+    """Этапы над уже сгенерированным хранилищем; данные для них готовятся заранее."""
+    entries = scan_vault(root)
+    texts = [e.path.read_text(encoding="utf-8") for e in entries]
+    fm_texts = [fm for fm, _, _ in map(split_frontmatter, texts) if fm is not None]
+    headers = [f"---\n{fm}---\n" for fm in fm_texts]
+
+    def plan():
+        normalize_filenames.ROOT = root
+        return normalize_filenames.plan_normalization(strip_suffix=True)
+
+    return {
+        "scan_vault": lambda: scan_vault(root),
+        "read_header": lambda: [read_header(e.path, tolerant=True) for e in entries],
+        "split_frontmatter": lambda: [split_frontmatter(t) for t in texts],
+        "clean_frontmatter_text": lambda: [clean_frontmatter_text(t) for t in fm_texts],
+        "frontmatter_prefilter": lambda: [has_defects(h) for h in headers],
+        "parse_note": lambda: [parse_note(t) for t in texts],
+        "find_duplicate_groups": lambda: find_duplicate_groups(entries),
+        "duplicate_groups_serial": lambda: find_duplicate_groups(entries, workers=1),
+        "near_duplicates": _quiet(lambda: find_duplicates.find_near_duplicates(entries)),
+        "similar_names": _quiet(lambda: find_duplicates.find_similar_files(entries)),
+        "extract_links": lambda: [link_graph.extract_links(t) for t in texts],
+        "build_graph": lambda: link_graph.build_graph(root, full=True),
+        "plan_normalization": plan,
+    }
+
+
+def run_tool(args: List[str], vault: Path) -> Tuple[float, int, int]:
+    """Запускает скрипт отдельным процессом. Возвращает (секунды, пиковый RSS в КБ, код выхода)."""
+    cmd = [sys.executable, str(REPO / args[0]), "--vault", str(vault), *args[1:]]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=vault, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss: КБ в Linux, байты в macOS
+    rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return elapsed, rss_kb, proc.returncode
+
+
+def tool_benchmark(args: List[str], pristine: Path, workdir: Path, repeat: int) -> Dict[str, object]:
+    best = None
+    peak = 0
+    code = 0
+    for _ in range(repeat):
+        # Инструменты правят хранилище: каждый повтор — на свежей копии (копирование не меряется)
+        vault = workdir / "vault"
+        if vault.exists():
+            shutil.rmtree(vault)
+        shutil.copytree(pristine, vault, symlinks=True)
+        elapsed, rss_kb, code = run_tool(args, vault)
+        best = elapsed if best is None else min(best, elapsed)
+        peak = max(peak, rss_kb)
+    return {"seconds": round(best, 4), "rss_kb": peak, "exit_code": code}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float,
+            rss_threshold: float) -> List[str]:
+    """Список регрессий относительно baseline (пустой — всё в пределах порогов).
+
+    Код выхода инструмента, отличный от baseline (без него в baseline — ненулевой),
+    тоже регрессия: упавший в начале скрипт иначе выглядел бы ускорением.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if "exit_code" in current:
+            expected = base.get("exit_code", 0)
+            if current["exit_code"] != expected:
+                regressions.append(f"{name}: код выхода {expected} → {current['exit_code']}")
+                continue
+        if base["seconds"] >= MIN_SECONDS and current["seconds"] > base["seconds"] * (1 + threshold):
+            regressions.append(f"{name}: время {base['seconds']:.4f} → {current['seconds']:.4f} с")
+        base_rss = base.get("rss_kb")
+        if base_rss and current.get("rss_kb") and current["rss_kb"] > base_rss * (1 + rss_threshold):
+            regressions.append(f"{name}: RSS {base_rss} → {current['rss_kb']} КБ")
+    return regressions
+
+
+def load_baseline(path: Path, params: Dict[str, object]) -> Optional[Dict[str, Dict]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("params") != params:
+        print(f"⚠️ Baseline {path} снят с другими параметрами ({data.get('params')}) — сравнение пропущено")
+        return None
+    return data.get("results") or {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки скриптов обслуживания")
+    parser.add_argument("--notes", type=int, default=VaultSpec().notes, help="Размер синтетического хранилища")
+    parser.add_argument("--seed", type=int, default=VaultSpec().seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Только эти этапы/инструменты")
+    parser.add_argument("--skip-tools", action="store_true", help="Только этапы, без запуска скриптов")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Записать результат как новый baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимый рост времени (0.25 = +25%%)")
+    parser.add_argument("--rss-threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимый рост пикового RSS")
+    parser.add_argument("--json", type=Path, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    params = {"generator": GENERATOR_VERSION, "notes": args.notes, "seed": args.seed}
+    wanted = set(args.only) if args.only else None
+    results: Dict[str, Dict] = {}
+
+    with tempfile.TemporaryDirectory(prefix="vault_bench_") as tmp:
+        pristine = Path(tmp) / "pristine"
+        start = time.perf_counter()
+        stats = generate_vault(pristine, VaultSpec(notes=args.notes, seed=args.seed))
+        print(f"📦 Хранилище: {stats} ({time.perf_counter() - start:.1f} сек)")
+
+        # Этапы меряются на копии: build_graph пишет кэш ссылок в корень хранилища
+        stage_root = Path(tmp) / "stages"
+        shutil.copytree(pristine, stage_root)
+        for name, func in stage_benchmarks(stage_root).items():
+            if wanted is not None and name not in wanted:
+                continue
+            results[name] = {"seconds": round(best_time(func, args.repeat), 4)}
+            print(f"  ⏱️ {name:<26} {results[name]['seconds']:>9.4f} с")
+
+        if not args.skip_tools:
+            for name, tool_args in TOOLS.items():
+                if wanted is not None and name not in wanted:
+                    continue
+                results[name] = tool_benchmark(tool_args, pristine, Path(tmp), args.repeat)
+                r = results[name]
+                print(f"  🛠️ {name:<26} {r['seconds']:>9.4f} с {r['rss_kb'] / 1024:>8.1f} МБ (код {r['exit_code']})")
+
+    report = {
+        "params": params,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 Baseline сохранён: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline, params)
+    if baseline is None:
+        print("ℹ️ Baseline не найден — сравнивать не с чем (--save-baseline, чтобы записать)")
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.rss_threshold)
+    if regressions:
+        print(f"\n❌ Регрессии (порог +{args.threshold:.0%} по времени, +{args.rss_threshold:.0%} по RSS):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\n✅ Регрессий относительно baseline нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетического хранилища для бенчмарков.
+
+Хранилище полностью определяется параметрами и seed: один и тот же набор
+аргументов на любой машине даёт побайтно одинаковые файлы. В нём есть всё, на
+что рассчитаны скрипты обслуживания:
+- каталоги разной глубины (глубина распределена геометрически);
+- имена в NFD и с суффиксами ' 2'/' 3' (для normalize_filenames);
+- точные копии и почти-копии заметок (для find_duplicates);
+- сломанный фронтматтер: ``title: "..."---``, склеенные
+  ``topics: [...]status:``, slug-заголовки, topics строкой, CRLF;
+- wikilink- и markdown-ссылки, в том числе битые и внутри блоков кода.
+
+Запуск:
+  python3 benchmarks/synthetic_vault.py /tmp/bench_vault --notes 5000 --seed 1
+"""
+import argparse
+import random
+import shutil
+import sys
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+# Меняется при любом изменении генератора: baseline со старой версией несравним
+GENERATOR_VERSION = 1
+
+TOPICS = [
+    "Concurrency", "Memory", "Networking", "UIKit", "SwiftUI", "Testing",
+    "Architecture", "Persistence", "Performance", "Security", "Accessibility",
+]
+DIR_NAMES = [
+    "iOS", "General", "Playbooks", "Snippets", "Архитектура", "Многопоточность",
+    "Жизненный цикл", "Сеть и данные", "Café Notes", "Тестирование", "Память",
+]
+WORDS = [
+    "actor", "reentrancy", "task", "await", "async", "queue", "thread", "lock",
+    "retain", "cycle", "weak", "unowned", "closure", "protocol", "generic",
+    "view", "layout", "render", "cache", "request", "response", "decoder",
+    "актор", "очередь", "поток", "память", "ссылка", "кэш", "запрос", "ответ",
+    "слой", "модуль", "зависимость", "тест", "сборка", "профилирование",
+]
+# Слова с буквами, у которых есть NFD-разложение (й, ё, é)
+NFD_WORDS = ["Жизненный", "Её", "Café", "Мой", "Résumé", "Сборщик мусорный"]
+TYPES = ["thread", "guide", "example", "topic", "cheat-sheet"]
+STATUSES = ["draft", "review", "done"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+
+
+class VaultSpec(NamedTuple):
+    notes: int = 2000
+    seed: int = 1
+    depth_p: float = 0.45           # вероятность спуститься ещё на уровень
+    max_depth: int = 5
+    nfd_fraction: float = 0.05
+    suffix_fraction: float = 0.02   # имена с ' 2'/' 3'
+    duplicate_fraction: float = 0.03
+    near_duplicate_fraction: float = 0.03
+    broken_fraction: float = 0.10
+    crlf_fraction: float = 0.02
+    links_per_note: int = 4
+    broken_link_fraction: float = 0.05
+    paragraphs: int = 6
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[:1].upper() + text[1:] + "."
+
+
+def _directories(rng: random.Random, spec: VaultSpec) -> List[str]:
+    """Пул каталогов: глубина каждого — геометрическое распределение."""
+    dirs = [""]
+    for _ in range(max(4, spec.notes // 40)):
+        parts = [rng.choice(DIR_NAMES)]
+        while len(parts) < spec.max_depth and rng.random() < spec.depth_p:
+            parts.append(f"{rng.choice(TOPICS)} {rng.randint(1, 9)}")
+        dirs.append("/".join(parts))
+    return sorted(set(dirs))
+
+
+def _note_name(rng: random.Random, spec: VaultSpec, index: int) -> str:
+    roll = rng.random()
+    if roll < spec.nfd_fraction:
+        return unicodedata.normalize("NFD", f"{rng.choice(NFD_WORDS)} {rng.choice(WORDS)} {index}")
+    name = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{index}"
+    if roll < spec.nfd_fraction + spec.suffix_fraction:
+        name += rng.choice((" 2", " 3"))
+    return name
+
+
+def _frontmatter(rng: random.Random, spec: VaultSpec, name: str) -> str:
+    topics = rng.sample(TOPICS, rng.randint(1, 3))
+    title = " ".join(w.capitalize() for w in name.replace("-", " ").split())
+    topics_text = "[" + ", ".join(f'"{t}"' for t in topics) + "]"
+    lines = {
+        "type": f'type: "{rng.choice(TYPES)}"',
+        "topics": f"topics: {topics_text}",
+        "status": f'status: "{rng.choice(STATUSES)}"',
+        "level": f'level: "{rng.choice(LEVELS)}"',
+        "title": f'title: "{title}"',
+        "tags": f'tags: ["{rng.choice(WORDS)}", "{rng.choice(WORDS)}"]',
+    }
+    order = ["type", "topics", "status", "level", "title", "tags"]
+    if rng.random() < spec.broken_fraction:
+        kind = rng.randrange(5)
+        if kind == 0:
+            # Закрывающий разделитель приклеен к последнему значению
+            return "---\n" + "\n".join(lines[k] for k in order) + "---\n"
+        if kind == 1:
+            lines["topics"] += lines.pop("status")
+            order.remove("status")
+        elif kind == 2:
+            lines["title"] = f"title: {name.lower().replace(' ', '-')}"
+        elif kind == 3:
+            lines["topics"] = 'topics: "[\\"' + topics[0] + '\\"]"'
+        else:
+            lines["topics"] = "topics: [" + ", ".join(f'"{t}"' for t in topics + topics) + "]"
+    return "---\n" + "\n".join(lines[k] for k in order) + "\n---\n"
+
+
+def _body(rng: random.Random, spec: VaultSpec, names: List[str]) -> str:
+    out: List[str] = []
+    for i in range(rng.randint(max(1, spec.paragraphs // 2), spec.paragraphs * 2)):
+        if i % 3 == 0:
+            out.append(f"## {_sentence(rng, rng.randint(2, 5))[:-1]}\n")
+        sentences = [_sentence(rng, rng.randint(5, 14)) for _ in range(rng.randint(2, 6))]
+        out.append(" ".join(sentences) + "\n")
+        if rng.random() < 0.2:
+            # [[Int]] внутри кода — не ссылка
+            out.append("```swift\nlet values: [[Int]] = [[1], [2]]\n```\n")
+    links = []
+    for _ in range(rng.randint(0, spec.links_per_note * 2)):
+        if not names or rng.random() < spec.broken_link_fraction:
+            links.append(f"[[missing-note-{rng.randint(0, 10 ** 6)}]]")
+        elif rng.random() < 0.8:
+            links.append(f"[[{rng.choice(names)}]]")
+        else:
+            target = rng.choice(names)
+            links.append(f"[{target}]({target.replace(' ', '%20')}.md)")
+    if links:
+        out.append("См. также: " + ", ".join(links) + "\n")
+    return "\n".join(out)
+
+
+def _near_copy(rng: random.Random, text: str) -> str:
+    words = text.split(" ")
+    for _ in range(max(1, len(words) // 50)):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def generate_vault(root: Path, spec: VaultSpec = VaultSpec()) -> Dict[str, int]:
+    """Создаёт хранилище в root (каталог пересоздаётся). Возвращает счётчики."""
+    rng = random.Random(spec.seed)
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+    dirs = _directories(rng, spec)
+
+    stats = {"notes": 0, "duplicates": 0, "near_duplicates": 0, "nfd_names": 0, "crlf": 0}
+    files: Dict[str, str] = {}
+    names: List[str] = []
+    originals: List[str] = []
+    index = 0
+    while stats["notes"] < spec.notes:
+        roll = rng.random()
+        if originals and roll < spec.duplicate_fraction:
+            src = rng.choice(originals)
+            rel = f"{src[:-3]} {rng.choice(('2', 'copy'))}.md"
+            if rel in files:
+                continue
+            files[rel] = files[src]
+            stats["duplicates"] += 1
+        elif originals and roll < spec.duplicate_fraction + spec.near_duplicate_fraction:
+            src = rng.choice(originals)
+            rel = f"{src[:-3]} draft.md"
+            if rel in files:
+                continue
+            files[rel] = _near_copy(rng, files[src])
+            stats["near_duplicates"] += 1
+        else:
+            name = _note_name(rng, spec, index)
+            index += 1
+            directory = rng.choice(dirs)
+            rel = f"{directory}/{name}.md" if directory else f"{name}.md"
+            text = _frontmatter(rng, spec, name) + "\n" + _body(rng, spec, names)
+            if rng.random() < spec.crlf_fraction:
+                text = text.replace("\n", "\r\n")
+                stats["crlf"] += 1
+            if unicodedata.is_normalized("NFC", name) is False:
+                stats["nfd_names"] += 1
+            files[rel] = text
+            names.append(name)
+            originals.append(rel)
+        stats["notes"] += 1
+
+    # Шаблоны и вложения: цели ссылок, которые скрипты не должны править
+    files["Templates/Note Template.md"] = "---\ntype: \"\"\ntopics: []\n---\n"
+    for rel in sorted(files):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(files[rel].encode("utf-8"))
+    return stats
+
+
+def main():
+    defaults = VaultSpec()
+    parser = argparse.ArgumentParser(description="Синтетическое хранилище для бенчмарков")
+    parser.add_argument("output", type=Path, help="Каталог хранилища (будет пересоздан)")
+    parser.add_argument("--notes", type=int, default=defaults.notes)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--depth-p", type=float, default=defaults.depth_p)
+    parser.add_argument("--nfd", type=float, default=defaults.nfd_fraction, help="Доля имён в NFD")
+    parser.add_argument("--duplicates", type=float, default=defaults.duplicate_fraction)
+    parser.add_argument("--near-duplicates", type=float, default=defaults.near_duplicate_fraction)
+    parser.add_argument("--broken", type=float, default=defaults.broken_fraction, help="Доля сломанного фронтматтера")
+    args = parser.parse_args()
+
+    spec = defaults._replace(
+        notes=args.notes,
+        seed=args.seed,
+        depth_p=args.depth_p,
+        nfd_fraction=args.nfd,
+        duplicate_fraction=args.duplicates,
+        near_duplicate_fraction=args.near_duplicates,
+        broken_fraction=args.broken,
+    )
+    stats = generate_vault(args.output, spec)
+    print(f"✅ Хранилище {args.output}: " + ", ".join(f"{k} {v}" for k, v in stats.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
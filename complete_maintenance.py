@@ -1,78 +1,474 @@
 #!/usr/bin/env python3
 """
 Полное обслуживание базы знаний - запускает все инструменты
+
+Шаги выполняются в одном процессе по графу зависимостей: сначала шаги,
+которые правят заметки, затем read-only анализаторы — параллельно. Все шаги
+делят один обход хранилища, индекс изменений и кэш разобранных заметок; эти
+структуры не потокобезопасны, поэтому шаги, работающие с ними в этом
+процессе, выполняются по одному, параллельно лишь со скриптами-подпроцессами.
+Время каждого шага записывается в машиночитаемый отчёт maintenance_report.json.
+
+По умолчанию инструменты обрабатывают только заметки, изменившиеся с прошлого
+прогона (vault_index.py). Флаг --full передаётся им для полной обработки.
+С --watch скрипт не завершается, а обрабатывает заметки по мере сохранения
+(vault_watch.py).
+
+С --changed-since REV источником изменений служит git (vault_git.py): правятся
+только заметки, изменившиеся с ревизии REV (или с прошлого прогона — last), а
+хэши чистых файлов берутся из git без чтения. Так pre-commit и CI обслуживают
+только дифф.
 """
+import argparse
+import cProfile
+import io
+import json
 import os
 import subprocess
-from pathlib import Path
+import sys
+import tempfile
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Tuple
+
+import find_duplicates
+import link_graph
+import vault_catalog
+import vault_git
+import vault_metrics
+import vault_report
+import vault_watch
+from content_hash import DigestCache
+from standardize_frontmatter import standardize_frontmatter
+from vault_frontmatter import NoteCache
+from vault_index import VaultIndex
+from vault_report import TEXT, Reporter
+from vault_scan import EXCLUDE_DIR_NAMES, ScanEntry, markdown_files, scan_vault
+from vault_writer import write_if_changed
+
+VAULT_PATH = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+REPORT_FILENAME = "maintenance_report.json"
+SCRIPT_TIMEOUT = 300  # 5 минут таймаут
+DEFAULT_WORKERS = 4
+LAST_RUN = "last"  # --changed-since last: с коммита прошлого прогона (git_head в отчёте)
+
+class Step(NamedTuple):
+    """Шаг обслуживания: run(ctx) -> bool, deps — имена шагов, которые должны завершиться раньше.
+
+    writes=True — шаг правит заметки: после него stat общего обхода обновляется.
+    shared=True — шаг в этом процессе работает с ctx.index, ctx.cache и
+    ctx.digests: такие шаги выполняются по одному (под ctx.shared_lock).
+    """
+    name: str
+    description: str
+    run: Callable[["MaintenanceContext"], bool]
+    deps: Tuple[str, ...] = ()
+    writes: bool = False
+    shared: bool = False
+
+class StepResult(NamedTuple):
+    step: Step
+    success: bool
+    start: float
+    end: float
+    output: str
+    error: Optional[str]
+    metrics: dict
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+class MaintenanceContext:
+    """Общее состояние прогона: один обход, индекс изменений, кэш заметок и хэшей"""
+
+    def __init__(self, root, full=False, changes=None, blobs=None):
+        self.root = root
+        self.full = full
+        # Режим --changed-since: изменения из git (vault_git.GitChanges) и blob ID
+        # чистых файлов; None — обычный режим по индексу изменений
+        self.changes = changes
+        self.blobs = blobs
+        # Один обход на всех: files — все файлы для графа ссылок (с шаблонами и
+        # вложениями), entries — заметки, которые обрабатывают инструменты
+        self.files = scan_vault(root, suffix=None, exclude=link_graph.LINK_EXCLUDE_DIR_NAMES)
+        self.entries = self._notes(self.files)
+        self.index = VaultIndex.load(root)
+        self.cache = NoteCache()
+        self.digests = DigestCache("git" if blobs is not None else "md5")
+        # index, cache и digests без внутренних блокировок: шаги с shared=True — по одному
+        self.shared_lock = threading.Lock()
+        # Профили потоков шагов при --profile (None — без профилирования)
+        self.profilers = None
+        # Находки шагов при --format jsonl
+        self.reporter = TEXT
+
+    def _notes(self, files):
+        return [
+            e for e in markdown_files(files)
+            if not EXCLUDE_DIR_NAMES.intersection(e.path.relative_to(self.root).parts[:-1])
+        ]
 
-def run_script(script_name, description):
-    """Запускает скрипт и показывает прогресс"""
-    print(f"\n🚀 {description}")
-    print(f"Выполняется: python3 {script_name}")
+    def changed_entries(self):
+        """Заметки, которые разрешено править: все или только из диффа git"""
+        if self.changes is None:
+            return self.entries
+        return [e for e in self.entries if e.path in self.changes.changed]
 
+    def refresh(self):
+        """Перечитывает stat после шага, который правил заметки (без повторного обхода каталогов)"""
+        fresh = []
+        for entry in self.files:
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                continue
+            fresh.append(ScanEntry(entry.path, st, entry.is_dir))
+            if self.blobs is not None and (st.st_size, st.st_mtime_ns) != (entry.stat.st_size, entry.stat.st_mtime_ns):
+                # Файл переписан шагом — blob ID из git ему больше не соответствует
+                self.blobs.pop(entry.path, None)
+        self.files = fresh
+        self.entries = self._notes(fresh)
+
+class _ThreadOutput:
+    """Подмена sys.stdout: вывод каждого шага собирается в буфер его потока.
+
+    Ставится один раз на время run_plan и снимается в finally; буферы —
+    в threading.local, у потоков нет общего изменяемого состояния. Вывод
+    потоков, которые шаг запустил сам, идёт в исходный поток.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        buf = io.StringIO()
+        self._local.buffer = buf
+        return buf
+
+    def release(self):
+        self._local.buffer = None
+
+    def write(self, text):
+        return (getattr(self._local, "buffer", None) or self._stream).write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+def run_script(script_name, extra_args=()):
+    """Запускает внешний скрипт; его вывод попадает в вывод шага"""
+    if not Path(script_name).exists():
+        print(f"⚠️ Скрипт {script_name} не найден, пропускаем")
+        return False
+
+    command = ['python3', script_name, *extra_args]
+    print(f"Выполняется: {' '.join(command)}")
+    # Скрипты на vault_metrics допишут свои метрики сюда — они войдут в метрики шага
+    fd, metrics_path = tempfile.mkstemp(prefix="vault_metrics_", suffix=".jsonl")
+    os.close(fd)
     try:
-        start_time = time.time()
         result = subprocess.run(
-            ['python3', script_name],
+            command,
             capture_output=True,
             text=True,
-            timeout=300  # 5 минут таймаут
+            timeout=SCRIPT_TIMEOUT,
+            env={**os.environ, vault_metrics.METRICS_ENV: metrics_path},
         )
+    except subprocess.TimeoutExpired:
+        print(f"⏰ Превышено время ожидания ({SCRIPT_TIMEOUT} сек)")
+        return False
+    finally:
+        for record in vault_metrics.read_records(metrics_path):
+            vault_metrics.current().merge(record)
+        os.unlink(metrics_path)
 
-        end_time = time.time()
-        duration = end_time - start_time
+    if result.stdout.strip():
+        print(result.stdout.rstrip())
+    if result.returncode != 0 and result.stderr.strip():
+        print(f"Ошибка: {result.stderr.strip()}")
+    return result.returncode == 0
 
-        if result.returncode == 0:
-            print(f"✅ {description} завершено за {duration:.1f} сек")
-            if result.stdout.strip():
-                print("📋 Результат:")
-                for line in result.stdout.strip().split('\n')[-5:]:  # Последние 5 строк
-                    if line.strip():
-                        print(f"  {line}")
-        else:
-            print(f"❌ {description} завершено с ошибкой")
-            if result.stderr.strip():
-                print(f"Ошибка: {result.stderr.strip()}")
+def script_step(script_name):
+    """Шаг, который запускает скрипт отдельным процессом (для скриптов без общего API)"""
+    return lambda ctx: run_script(script_name)
 
-        return result.returncode == 0
+def standardize_step(ctx):
+    standardize_frontmatter(
+        full=ctx.full, root=ctx.root, entries=ctx.changed_entries(), index=ctx.index, cache=ctx.cache,
+        reporter=ctx.reporter.child("standardize_frontmatter"),
+    )
+    return True
 
-    except subprocess.TimeoutExpired:
-        print(f"⏰ {description} превысило время ожидания")
-        return False
-    except Exception as e:
-        print(f"❌ Ошибка запуска {script_name}: {e}")
+def duplicates_step(ctx):
+    argv = ["--full"] if ctx.full else []
+    argv += ["--hash", ctx.digests.algorithm]
+    return find_duplicates.main(
+        argv, entries=ctx.entries, index=ctx.index, cache=ctx.cache, digests=ctx.digests,
+        reporter=ctx.reporter.child("find_duplicates"), blobs=ctx.blobs,
+    ) == 0
+
+def links_step(ctx):
+    argv = ["--full"] if ctx.full else []
+    return link_graph.main(
+        argv, root=ctx.root, files=ctx.files, cache=ctx.cache, reporter=ctx.reporter.child("link_graph")
+    ) == 0
+
+def catalog_step(ctx):
+    # Каталог необязателен: обновляем только уже созданный (vault_catalog.py update)
+    if not (ctx.root / vault_catalog.CATALOG_FILENAME).exists():
+        print("ℹ️ Каталог не создан — пропускаем")
+        return True
+    if not vault_catalog.fts5_available():
+        print("❌ sqlite3 этого Python собран без FTS5 — каталог недоступен")
         return False
+    vault_catalog.update_catalog(
+        ctx.root, ctx.entries, full=ctx.full, cache=ctx.cache, reporter=ctx.reporter.child("vault_catalog.update")
+    )
+    return True
+
+# Сначала шаги, которые правят заметки, затем read-only анализаторы параллельно
+MAINTENANCE_PLAN = [
+    Step("standardize", "Стандартизация фронтматтера", standardize_step, writes=True, shared=True),
+    Step("frontmatter_issues", "Исправление проблем фронтматтера",
+         script_step("fix_frontmatter_issues.py"), deps=("standardize",), writes=True),
+    Step("duplicates", "Поиск дублированного контента", duplicates_step, deps=("frontmatter_issues",), shared=True),
+    Step("broken_links", "Проверка битых ссылок", links_step, deps=("frontmatter_issues",), shared=True),
+    Step("catalog", "Обновление каталога заметок", catalog_step, deps=("frontmatter_issues",), shared=True),
+    Step("content_quality", "Анализ качества контента",
+         script_step("content_quality_analyzer.py"), deps=("frontmatter_issues",)),
+    Step("maintenance", "Комплексная проверка",
+         script_step("maintenance_scripts.py"), deps=("frontmatter_issues",)),
+    Step("git", "Анализ Git интеграции", script_step("git_integration.py"), deps=("frontmatter_issues",)),
+]
+
+def _run_step(step, ctx, output):
+    if not step.shared:
+        return _run_step_unlocked(step, ctx, output)
+    # Время ожидания блокировки во время шага не входит
+    with ctx.shared_lock:
+        return _run_step_unlocked(step, ctx, output)
+
+def _run_step_unlocked(step, ctx, output):
+    buf = output.capture()
+    # До Python 3.12 cProfile видит только свой поток — у каждого шага свой профиль
+    profiler = cProfile.Profile() if ctx.profilers is not None else None
+    start = time.perf_counter()
+    error = None
+    with vault_metrics.scope() as metrics:
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # 3.12+: профиль основного потока общий и уже видит все потоки
+                profiler = None
+        try:
+            success = bool(step.run(ctx))
+        except Exception as e:
+            success = False
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                ctx.profilers.append(profiler)
+            output.release()
+    return StepResult(step, success, start, time.perf_counter(), buf.getvalue(), error, metrics.snapshot())
+
+def print_step_result(result):
+    """Показывает итог шага так же, как раньше после каждого скрипта"""
+    description = result.step.description
+    if result.success:
+        print(f"✅ {description} завершено за {result.duration:.1f} сек")
+    else:
+        print(f"❌ {description} завершено с ошибкой ({result.duration:.1f} сек)")
+    if result.error:
+        print(f"Ошибка: {result.error}")
+    lines = [line for line in result.output.strip().split('\n') if line.strip()]
+    if lines:
+        print("📋 Результат:")
+        for line in lines[-5:]:  # Последние 5 строк
+            print(f"  {line}")
+
+def run_plan(steps, ctx, workers=DEFAULT_WORKERS):
+    """Выполняет шаги по графу зависимостей, независимые — параллельно в потоках.
+
+    Зависимость задаёт только порядок: шаг запускается, когда все его
+    зависимости завершились, успешно или нет (как в прежней цепочке).
+    Возвращает результаты в порядке steps.
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        unknown = [dep for dep in step.deps if dep not in by_name]
+        if unknown:
+            raise ValueError(f"Шаг {step.name} зависит от неизвестных шагов: {', '.join(unknown)}")
+
+    remaining = {step.name: set(step.deps) for step in steps}
+    results = {}
+    running = {}
+    output = _ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while remaining or running:
+                for name in [name for name, deps in remaining.items() if not deps]:
+                    del remaining[name]
+                    print(f"\n🚀 {by_name[name].description}")
+                    running[pool.submit(_run_step, by_name[name], ctx, output)] = name
+                if not running:
+                    raise ValueError(f"Цикл в зависимостях шагов: {', '.join(remaining)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result = future.result()
+                    results[name] = result
+                    ctx.reporter.emit(
+                        "step",
+                        name=name,
+                        success=result.success,
+                        seconds=round(result.duration, 3),
+                        error=result.error,
+                        metrics=result.metrics,
+                    )
+                    print()
+                    print_step_result(result)
+                    if result.step.writes:
+                        ctx.refresh()
+                    for deps in remaining.values():
+                        deps.discard(name)
+    finally:
+        sys.stdout = output._stream
+    return [results[step.name] for step in steps]
+
+def write_report(path, results, ctx, workers, started_at, wall_time, git_head=None, changed_since=None):
+    """Сохраняет машиночитаемый отчёт о прогоне: время и итог каждого шага
+
+    git_head — коммит хранилища на момент прогона: с него начнёт следующий
+    прогон с --changed-since last.
+    """
+    origin = min((r.start for r in results), default=0.0)
+    report = {
+        "started_at": started_at,
+        "full": ctx.full,
+        "git_head": git_head,
+        "changed_since": changed_since,
+        "changed_notes": len(ctx.changed_entries()) if ctx.changes is not None else None,
+        "workers": workers,
+        "wall_seconds": round(wall_time, 3),
+        "steps_seconds_total": round(sum(r.duration for r in results), 3),
+        "notes": len(ctx.entries),
+        "note_cache": {"hits": ctx.cache.hits, "misses": ctx.cache.misses},
+        "digest_cache": {"hits": ctx.digests.hits, "misses": ctx.digests.misses},
+        "steps": [
+            {
+                "name": r.step.name,
+                "description": r.step.description,
+                "deps": list(r.step.deps),
+                "success": r.success,
+                "start": round(r.start - origin, 3),
+                "end": round(r.end - origin, 3),
+                "seconds": round(r.duration, 3),
+                "error": r.error,
+                "metrics": r.metrics,
+            }
+            for r in results
+        ],
+    }
+    write_if_changed(path, json.dumps(report, ensure_ascii=False, indent=2) + "\n")
 
 def main():
     """Главная функция - запускает полное обслуживание"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="Полная обработка всех заметок, без учёта индекса изменений")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Сколько шагов выполнять одновременно")
+    parser.add_argument("--report", type=Path, default=None, help=f"Куда записать отчёт (по умолчанию {REPORT_FILENAME} в корне)")
+    parser.add_argument("--watch", action="store_true", help="Не выходить: обрабатывать заметки сразу после сохранения")
+    parser.add_argument("--debounce", type=float, default=vault_watch.DEFAULT_DEBOUNCE,
+                        help="Сколько секунд файл должен не меняться перед обработкой (--watch)")
+    parser.add_argument("--poll", action="store_true", help="Опрашивать файлы вместо inotify (--watch)")
+    parser.add_argument("--durable", action="store_true", help="fsync после каждого файла (--watch)")
+    parser.add_argument("--changed-since", metavar="REV",
+                        help=f"Править только заметки, изменившиеся в git с ревизии REV ({LAST_RUN} — с прошлого прогона)")
+    parser.add_argument("--vault", type=Path, default=VAULT_PATH, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    vault_metrics.add_arguments(parser)
+    vault_report.add_arguments(parser)
+    args = parser.parse_args()
+    reporter = Reporter.from_args("complete_maintenance", args)
+    with reporter.session():
+        return _run(args, reporter)
+
+def _last_run_head(report_path):
+    """Коммит прошлого прогона из его отчёта (None — отчёта нет или он без git_head)"""
+    try:
+        with open(report_path, encoding="utf-8") as f:
+            return json.load(f).get("git_head")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def git_changes(root, since, report_path):
+    """Изменения и blob ID из git для --changed-since; (None, None, head) — обычный режим"""
+    try:
+        head = vault_git.head(root)
+    except vault_git.GitError as e:
+        if since is not None:
+            print(f"⚠️ Хранилище не в git-репозитории ({e}) — обрабатываем по индексу изменений")
+        return None, None, None
+    if since is None:
+        return None, None, head
+    if since == LAST_RUN:
+        since = _last_run_head(report_path)
+        if since is None:
+            print(f"⚠️ В {report_path} нет коммита прошлого прогона — обрабатываем по индексу изменений")
+            return None, None, head
+    try:
+        changes = vault_git.changed_since(root, since)
+        blobs = vault_git.blob_ids(root)
+    except vault_git.GitError as e:
+        print(f"⚠️ Не удалось получить изменения из git ({e}) — обрабатываем по индексу изменений")
+        return None, None, head
+    print(f"🔀 Изменено с {since}: {len(changes.changed)} файлов, удалено: {len(changes.deleted)}")
+    return changes, blobs, head
+
+def _run(args, reporter):
+    if args.watch:
+        return vault_watch.watch(
+            args.vault, debounce=args.debounce, polling=args.poll, durable=args.durable, reporter=reporter
+        )
+
     print("🎉 Запуск полного обслуживания базы знаний iOS разработки")
     print("=" * 60)
 
-    scripts_dir = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+    scripts_dir = args.vault
     os.chdir(scripts_dir)
 
-    # Список скриптов для запуска
-    maintenance_plan = [
-        ("standardize_frontmatter.py", "Стандартизация фронтматтера"),
-        ("find_duplicates.py", "Поиск дублированного контента"),
-        ("fix_broken_links.py", "Проверка битых ссылок"),
-        ("fix_frontmatter_issues.py", "Исправление проблем фронтматтера"),
-        ("content_quality_analyzer.py", "Анализ качества контента"),
-        ("maintenance_scripts.py", "Комплексная проверка"),
-        ("git_integration.py", "Анализ Git интеграции"),
-    ]
-
-    results = []
-
-    for script_name, description in maintenance_plan:
-        if Path(script_name).exists():
-            success = run_script(script_name, description)
-            results.append((description, success))
-        else:
-            print(f"⚠️ Скрипт {script_name} не найден, пропускаем")
-            results.append((description, False))
+    report_path = args.report or scripts_dir / REPORT_FILENAME
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    wall_start = time.perf_counter()
+    profilers = [] if args.profile else None
+    with vault_metrics.instrument("complete_maintenance", args, profilers):
+        changes, blobs, git_head = git_changes(scripts_dir, args.changed_since, report_path)
+        ctx = MaintenanceContext(scripts_dir, full=args.full, changes=changes, blobs=blobs)
+        ctx.profilers = profilers
+        ctx.reporter = reporter
+        step_results = run_plan(MAINTENANCE_PLAN, ctx, args.workers)
+        # Метрики шагов собраны отдельно (vault_metrics.scope) — сводим их в общую запись
+        for r in step_results:
+            vault_metrics.current().merge(r.metrics)
+        ctx.index.prune(e.path for e in ctx.entries)
+        ctx.index.save()
+    wall_time = time.perf_counter() - wall_start
+
+    write_report(
+        report_path, step_results, ctx, args.workers, started_at, wall_time, git_head,
+        args.changed_since if changes is not None else None,
+    )
+
+    results = [(r.step.description, r.success) for r in step_results]
 
     # Итоговый отчет
     print("\n" + "=" * 60)
@@ -81,14 +477,17 @@ def main():
 
     successful = sum(1 for _, success in results if success)
     total = len(results)
+    reporter.emit("summary", steps=total, successful=successful, wall_seconds=round(wall_time, 3), report=report_path)
 
     print(f"\n✅ Успешно выполнено: {successful}/{total}")
     print(f"❌ Не удалось: {total - successful}/{total}")
 
     print("\n📋 Детальный отчет:")
-    for description, success in results:
-        status = "✅" if success else "❌"
-        print(f"  {status} {description}")
+    for r in step_results:
+        status = "✅" if r.success else "❌"
+        print(f"  {status} {r.step.description} ({r.duration:.1f} сек)")
+    print(f"\n⏱️ Общее время: {wall_time:.1f} сек (сумма шагов: {sum(r.duration for r in step_results):.1f} сек)")
+    print(f"📄 Отчет по шагам: {report_path}")
 
     # Рекомендации
     print("\n💡 Рекомендации:")
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Потоковое хэширование файлов и поэтапный поиск дубликатов по содержимому.
+
+Поиск дубликатов идёт в три этапа, чтобы большинство файлов вообще не читать:
+1. группировка по st_size из уже выполненного обхода (ни одного чтения);
+2. хэш первых HEAD_BYTES байт только у файлов одинакового размера;
+3. полный потоковый хэш только у файлов, совпавших и по размеру, и по началу.
+
+Помимо MD5 (совместим с vault_index и normalize_filenames.compute_md5) доступны
+более быстрые алгоритмы: blake2b, некриптографический crc32 и xxh64, если
+установлен пакет xxhash. Алгоритм git считает blob ID git (SHA-1 от
+«blob <размер>\\0» и содержимого) — такие хэши совпадают с vault_git.blob_ids, и
+чистые файлы из репозитория можно вообще не читать.
+
+DigestCache — кэш хэшей на один прогон по (st_dev, st_ino, st_size,
+st_mtime_ns): каждый файл хэшируется не больше одного раза, а файлы разного
+размера сравниваются вообще без чтения. DuplicateIndex — то же для
+долгоживущего процесса: дубликаты одного изменённого файла без пересчёта всех.
+
+Хэширование упирается в задержку чтения (медленные и синхронизируемые по сети
+диски), а hashlib отпускает GIL на больших блоках, поэтому файлы хэшируются в
+пуле потоков (iter_hashed): до read_ahead файлов читаются наперёд, а хэши
+выдаются строго в порядке входа.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, TypeVar
+
+try:
+    import xxhash
+except ImportError:  # необязательная зависимость
+    xxhash = None
+
+from vault_metrics import incr, stage
+from vault_scan import ScanEntry
+
+
+CHUNK_SIZE = 1024 * 1024
+HEAD_BYTES = 4096
+DEFAULT_ALGORITHM = "md5"
+# Потоков хэширования и файлов в работе наперёд; 1 поток — последовательно, без пула
+DEFAULT_HASH_WORKERS = 4
+DEFAULT_READ_AHEAD = 16
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _Crc32:
+    """Обёртка над zlib.crc32 с интерфейсом hashlib."""
+
+    name = "crc32"
+
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data: bytes) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+def _git_blob(size: int):
+    """SHA-1 blob-объекта git: заголовок с размером идёт перед содержимым."""
+    h = hashlib.sha1()
+    h.update(b"blob %d\0" % size)
+    return h
+
+
+_HASHERS: Dict[str, Callable[..., object]] = {
+    "md5": hashlib.md5,
+    "blake2b": lambda: hashlib.blake2b(digest_size=16),
+    "crc32": _Crc32,
+    "git": _git_blob,
+}
+if xxhash is not None:
+    _HASHERS["xxh64"] = xxhash.xxh64
+
+HASH_ALGORITHMS = tuple(_HASHERS)
+# Алгоритмы, которым размер данных нужен до первого update
+SIZED_ALGORITHMS = frozenset({"git"})
+
+
+def new_hasher(algorithm: str = DEFAULT_ALGORITHM, size: Optional[int] = None):
+    """Новый хэшер алгоритма; size обязателен для SIZED_ALGORITHMS."""
+    try:
+        factory = _HASHERS[algorithm]
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный алгоритм хэширования: {algorithm} (доступны: {', '.join(HASH_ALGORITHMS)})"
+        ) from None
+    if algorithm not in SIZED_ALGORITHMS:
+        return factory()
+    if size is None:
+        raise ValueError(f"Алгоритму {algorithm} нужен размер данных заранее")
+    return factory(size)
+
+
+def hash_file(
+    path: Path,
+    algorithm: str = DEFAULT_ALGORITHM,
+    limit: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> str:
+    """Потоково хэширует файл в бинарном режиме; limit — хэшировать только первые limit байт.
+
+    Чтение идёт в один заранее выделенный буфер (readinto), без новых bytes на
+    каждый блок. Для алгоритма git размер берётся из fstat открытого файла;
+    хэш первых limit байт — blob ID этого префикса.
+    """
+    remaining = limit
+    if limit is not None:
+        chunk_size = min(chunk_size, max(limit, 1))
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    total = 0
+    with stage("hash"), open(path, "rb", buffering=0) as f:
+        size = None
+        if algorithm in SIZED_ALGORITHMS:
+            size = os.fstat(f.fileno()).st_size
+            if limit is not None:
+                size = min(size, limit)
+        h = new_hasher(algorithm, size)
+        while remaining is None or remaining > 0:
+            n = f.readinto(buf if remaining is None or remaining >= chunk_size else view[:remaining])
+            if not n:
+                break
+            h.update(view[:n])
+            total += n
+            if remaining is not None:
+                remaining -= n
+    incr("bytes_read", total)
+    return h.hexdigest()
+
+
+def add_arguments(parser) -> None:
+    """Флаги --hash-workers и --read-ahead для argparse-парсера скрипта."""
+    parser.add_argument(
+        "--hash-workers",
+        type=int,
+        default=DEFAULT_HASH_WORKERS,
+        help="Потоков хэширования (1 — последовательно)",
+    )
+    parser.add_argument(
+        "--read-ahead",
+        type=int,
+        default=DEFAULT_READ_AHEAD,
+        help="Сколько файлов хэшировать наперёд, пока ждём результат текущего",
+    )
+
+
+def iter_hashed(
+    jobs: Iterable[T],
+    hash_one: Callable[[T], R],
+    workers: int = DEFAULT_HASH_WORKERS,
+    read_ahead: int = DEFAULT_READ_AHEAD,
+    executor: Optional[Executor] = None,
+) -> Iterator[Tuple[T, Optional[R], Optional[OSError]]]:
+    """Применяет hash_one к jobs в пуле потоков; выдаёт (job, результат, ошибка) в порядке jobs.
+
+    В работе одновременно не больше read_ahead заданий: jobs читается лениво,
+    поэтому вход может быть генератором, зависящим от уже выданных результатов.
+    OSError задания возвращается третьим элементом, прочие исключения
+    пробрасываются. Метрики заданий попадают в метрики вызывающего (контекст
+    копируется в поток). executor — общий пул нескольких конвейеров; без него
+    при workers <= 1 задания выполняются в текущем потоке.
+    """
+    if executor is None and workers <= 1:
+        for job in jobs:
+            try:
+                yield job, hash_one(job), None
+            except OSError as e:
+                yield job, None, e
+        return
+
+    def run(job: T) -> Tuple[Optional[R], Optional[OSError]]:
+        try:
+            return hash_one(job), None
+        except OSError as e:
+            return None, e
+
+    own = executor is None
+    if own:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+    pending = deque()
+    try:
+        for job in jobs:
+            pending.append((job, executor.submit(copy_context().run, run, job)))
+            while len(pending) >= max(read_ahead, 1):
+                done_job, future = pending.popleft()
+                yield (done_job, *future.result())
+        while pending:
+            done_job, future = pending.popleft()
+            yield (done_job, *future.result())
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if own:
+            executor.shutdown(wait=True)
+
+
+class DigestCache:
+    """Хэши файлов на один прогон, ключ — (st_dev, st_ino, st_size, st_mtime_ns).
+
+    Изменённый файл получает новый ключ и хэшируется заново; жёсткие ссылки
+    и повторные запросы одного файла хэшируются один раз.
+    """
+
+    def __init__(self, algorithm: str = DEFAULT_ALGORITHM):
+        new_hasher(algorithm, 0)  # проверка имени алгоритма
+        self.algorithm = algorithm
+        self._digests: Dict[Tuple[int, int, int, int, Optional[int]], str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, path: Path, st: Optional[os.stat_result] = None, limit: Optional[int] = None) -> str:
+        """Хэш файла (или первых limit байт) из кэша или с диска."""
+        if st is None:
+            st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, limit)
+        cached = self._digests.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+        digest = hash_file(path, self.algorithm, limit=limit)
+        self._digests[key] = digest
+        return digest
+
+    def same_content(self, a: Path, b: Path) -> bool:
+        """Одинаково ли содержимое файлов; разный размер — сразу False без чтения."""
+        st_a = os.stat(a)
+        st_b = os.stat(b)
+        if st_a.st_size != st_b.st_size:
+            return False
+        if (st_a.st_dev, st_a.st_ino) == (st_b.st_dev, st_b.st_ino):
+            return True
+        return self.digest(a, st_a) == self.digest(b, st_b)
+
+    def same_content_many(
+        self,
+        pairs: Iterable[Tuple[Path, Path]],
+        workers: int = DEFAULT_HASH_WORKERS,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+    ) -> Iterator[Tuple[Tuple[Path, Path], bool]]:
+        """same_content для многих пар сразу в пуле потоков; ((a, b), совпадают ли) в порядке pairs.
+
+        Пара, которую не удалось прочитать, считается несовпадающей.
+        """
+        for pair, same, error in iter_hashed(pairs, lambda pair: self.same_content(*pair), workers, read_ahead):
+            yield pair, error is None and same
+
+
+class _HashJob(NamedTuple):
+    bucket: int  # номер группы одного размера
+    entry: ScanEntry
+    limit: Optional[int]  # None — полный хэш, иначе хэш первых limit байт
+    known: Optional[str]  # хэш уже известен (кэш или предыдущий этап)
+    fresh: bool  # known вычислен в этом прогоне, а не взят из cached_hash
+
+
+def iter_duplicate_groups(
+    entries: Iterable[ScanEntry],
+    algorithm: str = DEFAULT_ALGORITHM,
+    head_bytes: int = HEAD_BYTES,
+    cached_hash: Optional[Callable[[ScanEntry], Optional[str]]] = None,
+    on_full_hash: Optional[Callable[[ScanEntry, str], None]] = None,
+    on_error: Optional[Callable[[Path, Exception], None]] = None,
+    digests: Optional[DigestCache] = None,
+    workers: int = DEFAULT_HASH_WORKERS,
+    read_ahead: int = DEFAULT_READ_AHEAD,
+) -> Iterator[Tuple[str, List[Path]]]:
+    """Выдаёт группы (хэш, файлы) с идентичным содержимым по мере нахождения.
+
+    Группы одного размера выдаются, как только этот размер разобран, — в
+    памяти держатся только кандидаты размеров, хэшируемых наперёд.
+
+    Хэши голов и полные хэши считают два конвейера iter_hashed на общем пуле
+    из workers потоков: пока разбирается один размер, следующие уже читаются.
+    Порядок групп и файлов в них от числа потоков не зависит.
+
+    cached_hash — источник уже известных полных хэшей (например, из vault_index);
+    on_full_hash вызывается для каждого вычисленного полного хэша, чтобы его
+    можно было закэшировать. digests — общий DigestCache прогона (его алгоритм
+    должен совпадать с algorithm). Все обратные вызовы выполняются в
+    вызывающем потоке.
+    """
+    if digests is not None and digests.algorithm != algorithm:
+        raise ValueError(f"DigestCache считает {digests.algorithm}, а запрошен {algorithm}")
+
+    def hash_job(job: _HashJob) -> str:
+        if job.known is not None:
+            return job.known
+        if digests is not None:
+            return digests.digest(job.entry.path, job.entry.stat, job.limit)
+        return hash_file(job.entry.path, algorithm, limit=job.limit)
+
+    def known_hash(entry: ScanEntry) -> Optional[str]:
+        return cached_hash(entry) if cached_hash is not None else None
+
+    # Этап 1: размер известен из обхода
+    by_size: Dict[int, List[ScanEntry]] = defaultdict(list)
+    for entry in entries:
+        by_size[entry.stat.st_size].append(entry)
+    # Группы внутри одного размера — так короткие некриптографические хэши
+    # файлов разного размера не сливаются при коллизии
+    buckets = [(size, same_size) for size, same_size in by_size.items() if len(same_size) > 1]
+
+    def head_jobs() -> Iterator[_HashJob]:
+        for bucket, (size, same_size) in enumerate(buckets):
+            for entry in same_size:
+                if size <= head_bytes:
+                    # Маленькие файлы целиком помещаются в «голову» — сразу полный хэш
+                    known = known_hash(entry)
+                    yield _HashJob(bucket, entry, None, known, False)
+                else:
+                    # Этап 2: хэш первых head_bytes байт
+                    yield _HashJob(bucket, entry, head_bytes, None, False)
+
+    def full_jobs(heads: Iterator[Tuple[_HashJob, Optional[str], Optional[OSError]]]) -> Iterator[_HashJob]:
+        """Этап 3: полный хэш только для совпавших голов; готовые хэши проходят как есть."""
+        bucket = None
+        by_head: Dict[str, List[_HashJob]] = defaultdict(list)
+
+        def flush() -> Iterator[_HashJob]:
+            for candidates in by_head.values():
+                if len(candidates) < 2:
+                    continue
+                for job in candidates:
+                    if job.limit is None:
+                        yield job
+                    else:
+                        yield _HashJob(job.bucket, job.entry, None, known_hash(job.entry), False)
+            by_head.clear()
+
+        for job, digest, error in heads:
+            if job.bucket != bucket:
+                yield from flush()
+                bucket = job.bucket
+            if error is not None:
+                if on_error is not None:
+                    on_error(job.entry.path, error)
+                continue
+            if job.limit is None:
+                # Полный хэш маленького файла: группировать по нему будет финальный проход
+                by_head[""].append(job._replace(known=digest, fresh=job.fresh or job.known is None))
+            else:
+                by_head[digest].append(job)
+        yield from flush()
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash") if workers > 1 else None
+    try:
+        heads = iter_hashed(head_jobs(), hash_job, workers, read_ahead, executor)
+        bucket = None
+        groups: Dict[str, List[Path]] = defaultdict(list)
+        for job, digest, error in iter_hashed(full_jobs(heads), hash_job, workers, read_ahead, executor):
+            if job.bucket != bucket:
+                yield from ((d, files) for d, files in groups.items() if len(files) > 1)
+                groups.clear()
+                bucket = job.bucket
+            if error is not None:
+                if on_error is not None:
+                    on_error(job.entry.path, error)
+                continue
+            if on_full_hash is not None and (job.fresh or job.known is None):
+                on_full_hash(job.entry, digest)
+            groups[digest].append(job.entry.path)
+        yield from ((d, files) for d, files in groups.items() if len(files) > 1)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def find_duplicate_groups(
+    entries: Iterable[ScanEntry],
+    algorithm: str = DEFAULT_ALGORITHM,
+    head_bytes: int = HEAD_BYTES,
+    cached_hash: Optional[Callable[[ScanEntry], Optional[str]]] = None,
+    on_full_hash: Optional[Callable[[ScanEntry, str], None]] = None,
+    on_error: Optional[Callable[[Path, Exception], None]] = None,
+    digests: Optional[DigestCache] = None,
+    workers: int = DEFAULT_HASH_WORKERS,
+    read_ahead: int = DEFAULT_READ_AHEAD,
+) -> List[Tuple[str, List[Path]]]:
+    """Все группы iter_duplicate_groups одним списком."""
+    return list(iter_duplicate_groups(
+        entries, algorithm, head_bytes, cached_hash, on_full_hash, on_error, digests, workers, read_ahead
+    ))
+
+
+class DuplicateIndex:
+    """Живой индекс дубликатов для watch-режима.
+
+    Хранит только размеры файлов из обхода (без чтения). При изменении файла
+    хэшируются лишь он и файлы того же размера, поэтому стоимость обновления
+    не зависит от размера хранилища. Хэши берутся из DigestCache.
+    """
+
+    def __init__(self, entries: Iterable[ScanEntry], digests: Optional[DigestCache] = None):
+        self.digests = digests or DigestCache()
+        self._sizes: Dict[Path, int] = {}
+        self._by_size: Dict[int, Set[Path]] = defaultdict(set)
+        for entry in entries:
+            self._add(entry.path, entry.stat.st_size)
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._sizes
+
+    def paths(self) -> List[Path]:
+        return list(self._sizes)
+
+    def _add(self, path: Path, size: int) -> None:
+        self._sizes[path] = size
+        self._by_size[size].add(path)
+
+    def remove(self, path: Path) -> None:
+        size = self._sizes.pop(path, None)
+        if size is None:
+            return
+        same_size = self._by_size[size]
+        same_size.discard(path)
+        if not same_size:
+            del self._by_size[size]
+
+    def update(self, path: Path, st: Optional[os.stat_result] = None) -> List[Path]:
+        """Учитывает новую версию файла и возвращает его дубликаты (по пути)."""
+        if st is None:
+            st = os.stat(path)
+        self.remove(path)
+        self._add(path, st.st_size)
+        others = [p for p in self._by_size[st.st_size] if p != path]
+        if not others:
+            return []
+        digest = self.digests.digest(path, st)
+        duplicates = []
+        for other in others:
+            try:
+                if self.digests.digest(other) == digest:
+                    duplicates.append(other)
+            except OSError:
+                # Файл пропал между событием и проверкой — событие об этом ещё придёт
+                continue
+        return sorted(duplicates)
@@ -1,123 +1,585 @@
 #!/usr/bin/env python3
 """
 Поиск дублированного контента в базе знаний
+
+Режим --near дополнительно ищет почти-дубликаты (например, разошедшиеся копии
+"Note 2"/"Note 3") через MinHash-сигнатуры тел заметок и LSH-бакетирование.
 """
-import os
+import argparse
 import hashlib
+import itertools
+import math
+import re
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
+
+import content_hash
+import vault_git
+import vault_metrics
+import vault_report
+from content_hash import (
+    DEFAULT_ALGORITHM,
+    DEFAULT_HASH_WORKERS,
+    DEFAULT_READ_AHEAD,
+    HASH_ALGORITHMS,
+    DigestCache,
+    iter_duplicate_groups,
+)
+from frontmatter_cleaner import split_frontmatter
+from normalize_filenames import normalize_component
+from vault_index import VaultIndex
+from vault_report import TEXT
+from vault_scan import scan_vault
+
+VAULT_PATH = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+
+# Параметры поиска почти-дубликатов
+SHINGLE_SIZE = 5  # слов в одном шингле
+NUM_PERM = 128  # длина MinHash-сигнатуры
+NEAR_THRESHOLD = 0.8  # порог сходства Жаккара
+
+# Параметры поиска похожих названий
+NAME_THRESHOLD = 0.75  # порог сходства Жаккара по триграммам имён
 
-def find_duplicate_content():
-    """Находит файлы с идентичным содержимым"""
+_WORD_RE = re.compile(r"\w+")
+_SLUG_SEP_RE = re.compile(r"[\s_\-]+")
+_NUMBER_RE = re.compile(r"\d+")
+_MAX_HASH = (1 << 64) - 1
+
+def find_duplicate_content(entries=None, index=None, full=False, algorithm=DEFAULT_ALGORITHM, digests=None,
+                           reporter=TEXT, workers=DEFAULT_HASH_WORKERS, read_ahead=DEFAULT_READ_AHEAD, blobs=None):
+    """Находит файлы с идентичным содержимым
+
+    Файлы сначала группируются по размеру, затем по хэшу первых байт, и только
+    оставшиеся совпадения хэшируются целиком (см. content_hash.py).
+    Если передан индекс (vault_index.VaultIndex), MD5-хэши неизменённых файлов
+    берутся из него (кроме full=True), а новые хэши в него записываются.
+    blobs — blob ID чистых файлов из vault_git.blob_ids: для algorithm="git"
+    такие файлы не читаются вовсе (кроме full=True).
+    digests — общий content_hash.DigestCache прогона; reporter
+    (vault_report.Reporter) получает каждую группу, как только она найдена,
+    и группы не копятся в памяти. workers и read_ahead — потоки хэширования
+    и сколько файлов читать наперёд. Возвращает число групп.
+    """
     print("🔍 Поиск дублированного контента...")
 
-    obsidian_root = Path("/Users/kirilltitov/Documents/Obsidian Vault")
-    file_hashes = defaultdict(list)
+    if entries is None:
+        entries = scan_vault(VAULT_PATH)
 
-    # Проходим по всем .md файлам
-    for md_file in obsidian_root.rglob("*.md"):
-        if "Templates" in md_file.parts or "backups" in md_file.parts:
-            continue
+    # Индекс хранит MD5 — переиспользуем его только для этого алгоритма
+    use_index = index is not None and algorithm == "md5"
 
-        try:
-            with open(md_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+    # Blob ID из git совпадают с хэшами алгоритма git
+    use_blobs = blobs is not None and algorithm == "git"
 
-            # Создаем хэш от содержимого файла
-            content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-            file_hashes[content_hash].append(md_file)
+    def cached_hash(entry):
+        if full:
+            return None
+        if use_blobs:
+            return blobs.get(entry.path)
+        if not use_index:
+            return None
+        return index.content_hash(entry.path, entry.stat)
 
-        except Exception as e:
-            print(f"Ошибка обработки {md_file}: {e}")
+    def remember(entry, content_hash):
+        if use_index:
+            index.remember_hash(entry.path, entry.stat, content_hash)
+
+    def report_error(md_file, e):
+        print(f"Ошибка обработки {md_file}: {e}")
 
-    # Находим дубликаты
-    duplicates = []
-    for hash_value, files in file_hashes.items():
-        if len(files) > 1:
-            duplicates.append((hash_value, files))
+    duplicates = 0
+    for hash_value, files in iter_duplicate_groups(
+        entries,
+        algorithm=algorithm,
+        cached_hash=cached_hash,
+        on_full_hash=remember,
+        on_error=report_error,
+        digests=digests,
+        workers=workers,
+        read_ahead=read_ahead,
+    ):
+        reporter.emit("duplicate_content", hash=hash_value, paths=files)
+        print(f"\nХэш: {hash_value}")
+        for file_path in files:
+            print(f"  {file_path}")
+        duplicates += 1
 
     if duplicates:
-        print(f"\n❌ Найдено {len(duplicates)} групп дублированного контента:")
-        for hash_value, files in duplicates:
-            print(f"\nХэш: {hash_value}")
-            for file_path in files:
-                print(f"  {file_path}")
+        print(f"\n❌ Найдено {duplicates} групп дублированного контента")
     else:
         print("✅ Дублированного контента не найдено")
 
     return duplicates
 
-def find_similar_files():
-    """Находит файлы с похожими названиями"""
-    print("🔍 Поиск файлов с похожими названиями...")
+def name_key(stem):
+    """Ключ имени заметки (без расширения) для сравнения названий
 
-    obsidian_root = Path("/Users/kirilltitov/Documents/Obsidian Vault")
-    file_names = defaultdict(list)
+    NFC и без суффикса копии " 2"/" 3" (как в normalize_filenames), casefold,
+    дефисы и подчёркивания slug-имён — как пробелы (как в
+    normalize_title_value): "Keychain Guide", "keychain-guide" и
+    "Keychain Guide 2" дают один ключ.
+    """
+    stem = normalize_component(stem, strip_suffix=True)
+    return _SLUG_SEP_RE.sub(" ", stem.casefold()).strip()
 
-    # Собираем все имена файлов
-    for md_file in obsidian_root.rglob("*.md"):
-        if "Templates" in md_file.parts or "backups" in md_file.parts:
-            continue
+def name_trigrams(key):
+    """Множество триграмм ключа; пробелы по краям отмечают начало и конец"""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """Индекс похожих названий по триграммам ключей (префиксная фильтрация, PPJoin).
+
+    Файлы с одинаковым ключом сразу попадают в одну группу (сходство 1.0).
+    Разные ключи сравниваются по сходству Жаккара триграмм, но не все пары:
+    триграммы каждого ключа упорядочиваются от редких к частым, и у двух
+    множеств со сходством >= t префиксы такого порядка обязательно
+    пересекаются — кандидаты ищутся только по спискам вхождений префиксов.
+    Ключи обрабатываются по возрастанию размера, поэтому короткие кандидаты
+    (меньше t·|A|) навсегда отрезаются с начала списков, а кандидат
+    отбрасывается, как только оставшиеся позиции префикса уже не могут дать
+    нужного пересечения. Число проверок почти линейно по числу имён.
+
+    Сравниваются только ключи с одинаковыми числами: "Lecture 4" и
+    "Lecture 5", "iOS 16" и "iOS 17" — разные заметки, а не копии (суффикс
+    копии " 2" уже снят в name_key). Заодно нумерованные серии не дают
+    квадратичного числа пар.
+    """
+
+    def __init__(self, threshold=NAME_THRESHOLD):
+        self.threshold = threshold
+        self._paths = defaultdict(list)  # ключ -> пути
 
-        file_names[md_file.name].append(md_file)
+    def __len__(self):
+        return len(self._paths)
 
-    # Находим похожие имена
-    similar = []
-    for name, files in file_names.items():
-        if len(files) > 1:
-            similar.append((name, files))
+    def add(self, path):
+        self._paths[name_key(path.stem)].append(path)
+
+    def pairs(self):
+        """Пары разных ключей со сходством >= threshold: [(сходство, ключ_a, ключ_b)] по убыванию"""
+        t = self.threshold
+        # Поправка на погрешность float: t·|A| вроде 7.000000000000001 не должно округляться до 8
+        epsilon = 1e-9
+        by_size = sorted((len(key_grams), key, key_grams) for key, key_grams in
+                         ((key, name_trigrams(key)) for key in self._paths))
+        keys = [key for _, key, _ in by_size]
+        grams = [key_grams for _, _, key_grams in by_size]
+        sizes = [size for size, _, _ in by_size]
+        numbers = [tuple(_NUMBER_RE.findall(key)) for key in keys]
+        frequency = Counter(g for key_grams in grams for g in key_grams)
+        postings = defaultdict(list)  # (числа, триграмма) -> [(номер ключа, позиция в его порядке)]
+        starts = defaultdict(int)  # сколько коротких записей в начале списка уже не нужны
+        overlap_ratio = t / (1 + t)
+        result = []
+        for i, key_grams in enumerate(grams):
+            tokens = sorted(key_grams, key=lambda g: (frequency[g], g))
+            size = sizes[i]
+            min_size = t * size - epsilon
+            probe = size - math.ceil(t * size - epsilon) + 1
+            index = size - math.ceil(2 * overlap_ratio * size - epsilon) + 1
+            overlap = {}
+            for pos, g in enumerate(tokens[:probe]):
+                g = (numbers[i], g)
+                posting = postings[g]
+                start = starts[g]
+                while start < len(posting) and sizes[posting[start][0]] < min_size:
+                    start += 1
+                starts[g] = start
+                rest = size - pos - 1
+                for j, pos_j in itertools.islice(posting, start, None):
+                    seen = overlap.get(j, 0)
+                    if seen < 0:
+                        continue
+                    other = sizes[j]
+                    # Позиционный фильтр: даже если совпадут все оставшиеся триграммы, хватит ли пересечения
+                    if seen + 1 + min(rest, other - pos_j - 1) >= overlap_ratio * (size + other) - epsilon:
+                        overlap[j] = seen + 1
+                    else:
+                        overlap[j] = -1
+                if pos < index:
+                    posting.append((i, pos))
+            for j, seen in overlap.items():
+                if seen <= 0:
+                    continue
+                common = len(key_grams & grams[j])
+                score = common / (size + sizes[j] - common)
+                if score >= t:
+                    a, b = sorted((keys[i], keys[j]))
+                    result.append((score, a, b))
+        result.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return result
+
+    def groups(self):
+        """Группы похожих названий: [(сходство, [пути])] по убыванию сходства
+
+        Ключи объединяются по парам от самых похожих к менее похожим, поэтому
+        сходство группы — самое слабое звено, которым она связана. Группа
+        окончательна только после всех пар (следующая пара может слить её с
+        другой), поэтому группы отдаются списком после построения; память —
+        O(число имён), как и у самого индекса.
+        """
+        parent = {key: key for key in self._paths}
+        score = dict.fromkeys(self._paths, 1.0)
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for similarity, a, b in self.pairs():
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+                score[root_a] = min(score[root_a], score[root_b], similarity)
+        members = defaultdict(list)
+        for key, paths in self._paths.items():
+            members[find(key)].extend(paths)
+        result = [(score[root], sorted(paths, key=str)) for root, paths in members.items() if len(paths) > 1]
+        result.sort(key=lambda item: (-item[0], str(item[1][0])))
+        return result
+
+def find_similar_files(entries=None, reporter=TEXT, threshold=NAME_THRESHOLD):
+    """Находит файлы с похожими названиями
+
+    Имена сравниваются после нормализации (см. name_key) — регистр, NFC/NFD,
+    slug-написание и суффиксы копий не мешают. Кроме одинаковых ключей
+    находятся и близкие (сходство триграмм >= threshold, см. NameIndex).
+    Группы выдаются reporter по убыванию сходства, когда индекс построен
+    (см. NameIndex.groups). Возвращает число групп.
+    """
+    print("🔍 Поиск файлов с похожими названиями...")
+
+    if entries is None:
+        entries = scan_vault(VAULT_PATH)
+    index = NameIndex(threshold)
+    for entry in entries:
+        index.add(entry.path)
+
+    similar = 0
+    for score, files in index.groups():
+        name = files[0].name
+        reporter.emit("similar_name", name=name, score=round(score, 4), paths=files)
+        print(f"\nФайл: {name}" + (f" (≈{score:.2f})" if score < 1.0 else ""))
+        for file_path in files:
+            print(f"  {file_path}")
+        similar += 1
 
     if similar:
-        print(f"\n❌ Найдено {len(similar)} групп файлов с похожими названиями:")
-        for name, files in similar:
-            print(f"\nФайл: {name}")
-            for file_path in files:
-                print(f"  {file_path}")
+        print(f"\n❌ Найдено {similar} групп файлов с похожими названиями")
     else:
         print("✅ Файлов с похожими названиями не найдено")
 
     return similar
 
-def find_empty_files():
-    """Находит пустые файлы"""
+def find_empty_files(entries=None, reporter=TEXT):
+    """Находит пустые файлы; возвращает их число"""
     print("🔍 Поиск пустых файлов...")
 
-    obsidian_root = Path("/Users/kirilltitov/Documents/Obsidian Vault")
-    empty_files = []
-
-    for md_file in obsidian_root.rglob("*.md"):
-        if "Templates" in md_file.parts or "backups" in md_file.parts:
-            continue
+    if entries is None:
+        entries = scan_vault(VAULT_PATH)
+    empty_files = 0
 
-        try:
-            if md_file.stat().st_size == 0:
-                empty_files.append(md_file)
-        except:
-            pass
+    # Размер уже известен из обхода — повторный stat не нужен
+    for entry in entries:
+        if entry.stat.st_size == 0:
+            reporter.emit("empty_file", path=entry.path)
+            print(f"  {entry.path}")
+            empty_files += 1
 
     if empty_files:
-        print(f"\n❌ Найдено {len(empty_files)} пустых файлов:")
-        for file_path in empty_files:
-            print(f"  {file_path}")
+        print(f"\n❌ Найдено {empty_files} пустых файлов")
     else:
         print("✅ Пустых файлов не найдено")
 
     return empty_files
 
-def main():
-    """Главная функция"""
+def _hash64(text):
+    """Стабильный между запусками 64-битный хэш строки."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def note_shingles(content, size=SHINGLE_SIZE):
+    """Множество хэшей словесных шинглов тела заметки (без фронтматтера)"""
+    fm_text, _, body = split_frontmatter(content)
+    words = _WORD_RE.findall(body.casefold())
+    if not words:
+        return set()
+    if len(words) <= size:
+        return {_hash64(" ".join(words))}
+    return {_hash64(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+def minhash_signature(shingles, num_perm=NUM_PERM):
+    """MinHash-сигнатура по схеме one permutation hashing с уплотнением.
+
+    Каждый шингл хэшируется один раз: младшие биты выбирают ячейку, старшие —
+    значение, в ячейке остаётся минимум. Пустые ячейки заполняются из ближайшей
+    непустой справа со сдвигом (densification), чтобы сигнатуры оставались
+    сравнимыми. Стоимость — O(число шинглов), а не O(шинглы × num_perm).
+    """
+    signature = [_MAX_HASH] * num_perm
+    for h in shingles:
+        slot = h % num_perm
+        value = h // num_perm
+        if value < signature[slot]:
+            signature[slot] = value
+    if _MAX_HASH not in signature or all(v == _MAX_HASH for v in signature):
+        return tuple(signature)
+    # Проход справа налево по кругу: расстояние до ближайшей непустой ячейки
+    dense = list(signature)
+    step = _MAX_HASH // num_perm
+    nearest = None
+    distance = 0
+    for i in range(2 * num_perm - 1, -1, -1):
+        slot = i % num_perm
+        if signature[slot] != _MAX_HASH:
+            nearest = signature[slot]
+            distance = 0
+            continue
+        distance += 1
+        if i < num_perm and nearest is not None:
+            dense[slot] = nearest + distance * step
+    return tuple(dense)
+
+def estimate_similarity(sig_a, sig_b):
+    """Оценка сходства Жаккара по доле совпавших позиций сигнатур"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+def optimal_lsh_params(threshold, num_perm):
+    """Подбирает (bands, rows) с bands * rows <= num_perm.
+
+    Минимизирует сумму площадей ложноположительных и ложноотрицательных
+    срабатываний кривой 1 - (1 - s^rows)^bands относительно порога.
+    """
+    def area(lo, hi, f, steps=50):
+        step = (hi - lo) / steps
+        return sum(f(lo + (i + 0.5) * step) for i in range(steps)) * step
+
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            fp = area(0.0, threshold, lambda s: 1 - (1 - s ** rows) ** bands)
+            fn = area(threshold, 1.0, lambda s: (1 - s ** rows) ** bands)
+            error = fp + fn
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+class MinHashLSH:
+    """LSH-индекс по полосам MinHash-сигнатур.
+
+    Кандидаты — только заметки, совпавшие хотя бы в одной полосе, поэтому
+    сравнения не квадратичны по числу заметок. Поддерживает удаление, чтобы
+    индекс можно было обновлять по изменённым файлам.
+    """
+
+    def __init__(self, threshold=NEAR_THRESHOLD, num_perm=NUM_PERM):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_lsh_params(threshold, num_perm)
+        self._buckets = [defaultdict(set) for _ in range(self.bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, signature[start:start + self.rows]
+
+    def add(self, key, signature):
+        if key in self._signatures:
+            self.remove(key)
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].add(key)
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(self, key):
+        """Похожие на key заметки: [(сходство, другой ключ)] выше порога"""
+        signature = self._signatures.get(key)
+        if signature is None:
+            return []
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        candidates.discard(key)
+        result = []
+        for other in candidates:
+            score = estimate_similarity(signature, self._signatures[other])
+            if score >= self.threshold:
+                result.append((score, other))
+        result.sort(key=lambda item: (-item[0], str(item[1])))
+        return result
+
+    def _first_shared_band(self, sig_a, sig_b):
+        for band in range(self.bands):
+            start = band * self.rows
+            if sig_a[start:start + self.rows] == sig_b[start:start + self.rows]:
+                return band
+        return -1
+
+    def iter_pairs(self):
+        """Пары кандидатов выше порога по мере нахождения: (сходство, ключ_a, ключ_b).
+
+        Пара проверяется только в первой полосе, где её ключи совпали, —
+        без множества уже виденных пар, память не растёт с их числом.
+        """
+        for band, buckets in enumerate(self._buckets):
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                ordered = sorted(members, key=str)
+                for i, a in enumerate(ordered):
+                    sig_a = self._signatures[a]
+                    for b in ordered[i + 1:]:
+                        sig_b = self._signatures[b]
+                        if self._first_shared_band(sig_a, sig_b) != band:
+                            continue
+                        score = estimate_similarity(sig_a, sig_b)
+                        if score >= self.threshold:
+                            yield score, a, b
+
+    def pairs(self):
+        """Все пары кандидатов выше порога: [(сходство, ключ_a, ключ_b)] по убыванию сходства"""
+        result = list(self.iter_pairs())
+        result.sort(key=lambda item: (-item[0], str(item[1]), str(item[2])))
+        return result
+
+def find_near_duplicates(entries=None, threshold=NEAR_THRESHOLD, num_perm=NUM_PERM, cache=None, reporter=TEXT):
+    """Находит пары заметок с похожим телом (сходство Жаккара по шинглам >= threshold)
+
+    cache — общий vault_frontmatter.NoteCache, если заметки уже читались.
+    Пары выдаются reporter по мере нахождения (в порядке полос LSH, а не по
+    сходству) и не копятся в памяти. Возвращает число пар.
+    """
+    print("🔍 Поиск почти-дубликатов...")
+
+    if entries is None:
+        entries = scan_vault(VAULT_PATH)
+    lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+
+    for entry in entries:
+        if entry.stat.st_size == 0:
+            continue
+        try:
+            if cache is not None:
+                content = cache.text(entry.path, entry.stat)
+            else:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+        except Exception as e:
+            print(f"Ошибка обработки {entry.path}: {e}")
+            continue
+        shingles = note_shingles(content)
+        if shingles:
+            lsh.add(entry.path, minhash_signature(shingles, num_perm))
+
+    near = 0
+    for score, a, b in lsh.iter_pairs():
+        reporter.emit("near_duplicate", score=round(score, 4), paths=[a, b])
+        print(f"\n≈{score:.2f}")
+        print(f"  {a}")
+        print(f"  {b}")
+        near += 1
+
+    if near:
+        print(f"\n❌ Найдено {near} пар почти-дубликатов (порог {threshold:.2f})")
+    else:
+        print("✅ Почти-дубликатов не найдено")
+
+    return near
+
+def main(argv=None, entries=None, index=None, cache=None, digests=None, reporter=None, blobs=None):
+    """Главная функция
+
+    entries, index, cache, digests и blobs передаёт complete_maintenance, чтобы не
+    обходить хранилище и не спрашивать git повторно; переданный индекс сохраняет
+    вызывающий. reporter —
+    его vault_report.Reporter (иначе формат берётся из --format).
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="Перехэшировать все файлы, игнорируя индекс изменений")
+    parser.add_argument(
+        "--hash",
+        choices=HASH_ALGORITHMS,
+        default=DEFAULT_ALGORITHM,
+        help="Алгоритм хэширования содержимого (crc32/xxh64 быстрее, но некриптографические; "
+        "git — blob ID, чистые файлы репозитория не читаются)",
+    )
+    parser.add_argument("--near", action="store_true", help="Искать также почти-дубликаты (MinHash/LSH)")
+    parser.add_argument("--threshold", type=float, default=NEAR_THRESHOLD, help="Порог сходства для --near (0..1)")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM, help="Длина MinHash-сигнатуры для --near")
+    parser.add_argument(
+        "--name-threshold",
+        type=float,
+        default=NAME_THRESHOLD,
+        help="Порог сходства названий (0..1; 1 — только одинаковые после нормализации)",
+    )
+    parser.add_argument("--vault", type=Path, default=VAULT_PATH, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    content_hash.add_arguments(parser)
+    vault_metrics.add_arguments(parser)
+    vault_report.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if reporter is None:
+        reporter = vault_report.Reporter.from_args("find_duplicates", args)
+    with vault_metrics.instrument("find_duplicates", args), reporter.session():
+        return _run(args, entries, index, cache, digests, reporter, blobs)
+
+def _run(args, entries, index, cache, digests, reporter=TEXT, blobs=None):
     print("🚀 Анализ базы знаний на наличие дубликатов...")
 
-    duplicates = find_duplicate_content()
-    similar = find_similar_files()
-    empty = find_empty_files()
+    # Один обход хранилища на все проверки
+    if entries is None:
+        entries = scan_vault(args.vault)
+    owns_index = index is None
+    if owns_index:
+        index = VaultIndex.load(args.vault)
+
+    if digests is None or digests.algorithm != args.hash:
+        digests = DigestCache(args.hash)
+    if args.hash == "git" and blobs is None and not args.full:
+        try:
+            blobs = vault_git.blob_ids(args.vault)
+        except vault_git.GitError as e:
+            print(f"⚠️  Blob ID из git недоступны, хэшируем все файлы: {e}")
+    duplicates = find_duplicate_content(
+        entries, index, full=args.full, algorithm=args.hash, digests=digests, reporter=reporter,
+        workers=args.hash_workers, read_ahead=args.read_ahead, blobs=blobs,
+    )
+    similar = find_similar_files(entries, reporter, args.name_threshold)
+    empty = find_empty_files(entries, reporter)
+    near = find_near_duplicates(entries, args.threshold, args.num_perm, cache, reporter) if args.near else 0
+    if owns_index:
+        index.save()
 
     print("\n📋 Итоговый отчет:")
-    print(f"Дублированного контента: {len(duplicates)} групп")
-    print(f"Похожих названий: {len(similar)} групп")
-    print(f"Пустых файлов: {len(empty)}")
+    print(f"Дублированного контента: {duplicates} групп")
+    print(f"Похожих названий: {similar} групп")
+    print(f"Пустых файлов: {empty}")
+    if args.near:
+        print(f"Почти-дубликатов: {near} пар")
+    reporter.emit(
+        "summary",
+        duplicate_groups=duplicates,
+        similar_groups=similar,
+        empty_files=empty,
+        near_pairs=near if args.near else None,
+    )
 
-    if duplicates or similar or empty:
+    if duplicates or similar or empty or near:
         print("\n⚠️  Найдены дубликаты, требующие внимания")
         return 1
     else:
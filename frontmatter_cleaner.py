@@ -10,16 +10,45 @@
 - Сохраняет прочие поля как есть, не меняет порядок и кавычки, когда это возможно
 
 Исключает из обработки: каталоги Templates и backups.
+
+По умолчанию пропускает заметки, не изменившиеся с прошлого прогона (см.
+vault_index.py); --full обрабатывает все файлы заново.
+
+Почти все заметки чистые, поэтому заголовок сначала проверяется одним
+регулярным выражением на известные дефекты (FRONTMATTER_DEFECT_RE), и
+построчная очистка запускается только для отмеченных заметок. --check ничего
+не пишет, проверяет все заметки без учёта индекса и завершается с кодом 1,
+если есть что исправлять (для pre-commit).
 """
 
 from __future__ import annotations
 
+import argparse
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Tuple, TypeVar
+
+import vault_metrics
+import vault_report
+from vault_frontmatter import parse_frontmatter, read_header, rewrite_header
+from vault_index import IndexRecord, VaultIndex, make_record
+from vault_metrics import incr, stage
+from vault_report import Reporter
+from vault_scan import scan_vault
+from vault_writer import NoteWriter
 
 
 VAULT_PATH = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+TOOL_NAME = "frontmatter_cleaner"
+# Верхняя граница размера пачки задач для воркера в режиме --jobs
+MAX_CHUNKSIZE = 64
+# Ключи, перед которыми очистка ставит перенос строки после "]" или '"'
+KNOWN_KEYS = "type|topics|status|level|title|summary|platforms|ios_min|tags|severity|duration"
+
+T = TypeVar("T")
 
 
 def split_frontmatter(content: str) -> Tuple[str | None, str | None, str]:
@@ -38,6 +67,7 @@ def split_frontmatter(content: str) -> Tuple[str | None, str | None, str]:
         return m.group(1), "---", m.group(2)
 
     # Толерантный путь: парсим построчно и ищем закрывающий маркер
+    incr("split_frontmatter_fallback")
     lines = content.splitlines(keepends=True)
     if not lines or lines[0].strip() != "---":
         return None, None, content
@@ -226,116 +256,99 @@ def normalize_title_value(value: str) -> str:
     return " ".join(normalized)
 
 
-def clean_frontmatter_text(text: str) -> str:
-    """Чистит только самые распространённые ошибки без агрессивной нормализации."""
-    lines = text.splitlines(keepends=True)
-    out: List[str] = []
+# Начало строки вида "key: value"
+_KEY_HEAD_RE = re.compile(r"^(\s*[A-Za-z_][\w-]*\s*:\s*)(.*)$")
+# Лексемы значения: экранирование, кавычка, скобки, пробелы, слово, прочий символ
+_VALUE_TOKEN_RE = re.compile(
+    r'(?P<esc>\\.?)|(?P<quote>")|(?P<open>\[)|(?P<close>\])|(?P<ws>\s+)|(?P<word>[\w-]+)|.',
+    re.DOTALL,
+)
+# Хвост ключа после слова: необязательные пробелы, двоеточие и пробел
+_KEY_TAIL_RE = re.compile(r"\s*:\s")
+# Допустимое первое символьное начало ключа
+_KEY_START_RE = re.compile(r"[A-Za-z_]")
 
-    def split_multiple_keys(raw_line: str) -> List[str]:
-        # Ставит каждую пару key: value на отдельную строку, если их >1 в строке
-        line_no_nl = raw_line[:-1] if raw_line.endswith("\n") else raw_line
-        m = re.match(r"^(\s*[A-Za-z_][\w-]*\s*:\s*)(.*)$", line_no_nl)
-        if not m:
-            return [raw_line]
 
-        prefix, value_str = m.groups()
+def find_glued_key(value: str) -> int:
+    """Позиция начала следующего ключа "key: " внутри значения или -1.
 
-        # Сканируем value_str на предмет второго ключа вне кавычек и квадратных скобок
-        in_quotes = False
-        escape = False
-        bracket_level = 0
-        pos2 = -1
-        i = 0
-        while i < len(value_str):
-            ch = value_str[i]
-            if escape:
-                escape = False
-                i += 1
-                continue
-            if ch == '\\':
-                escape = True
-                i += 1
-                continue
-            if ch == '"':
-                in_quotes = not in_quotes
-                i += 1
+    Ключ ищется вне кавычек и квадратных скобок; экранированный символ
+    пропускается. Значение разбирается за один линейный проход по лексемам,
+    без срезов строки и без повторных попыток регулярного выражения в каждой
+    позиции: хвост ":" проверяется один раз на слово.
+    """
+    in_quotes = False
+    bracket_level = 0
+    ws_start = -1  # начало пробельной лексемы прямо перед текущей
+    for m in _VALUE_TOKEN_RE.finditer(value):
+        kind = m.lastgroup
+        if kind == "esc":
+            ws_start = -1
+            continue
+        if kind == "quote":
+            in_quotes = not in_quotes
+            ws_start = -1
+            continue
+        if in_quotes:
+            ws_start = -1
+            continue
+        if kind == "open":
+            bracket_level += 1
+        elif kind == "close":
+            bracket_level = max(0, bracket_level - 1)
+        elif bracket_level == 0:
+            if kind == "ws":
+                ws_start = m.start()
                 continue
-            if not in_quotes:
-                if ch == '[':
-                    bracket_level += 1
-                elif ch == ']':
-                    bracket_level = max(0, bracket_level - 1)
-                # Потенциальное начало нового ключа
-                if bracket_level == 0:
-                    m2 = re.match(r"\s*([A-Za-z_][\w-]*)\s*:\s", value_str[i:])
-                    if m2:
-                        pos2 = i + m2.start()
-                        break
-            i += 1
+            if kind == "word":
+                start = _KEY_START_RE.search(value, m.start(), m.end())
+                if start is not None and _KEY_TAIL_RE.match(value, m.end()):
+                    if ws_start != -1 and start.start() == m.start():
+                        return ws_start
+                    return start.start()
+        ws_start = -1
+    return -1
+
+
+def split_multiple_keys(raw_line: str) -> List[str]:
+    """Ставит каждую пару key: value на отдельную строку, если их >1 в строке."""
+    line_no_nl = raw_line[:-1] if raw_line.endswith("\n") else raw_line
+    m = _KEY_HEAD_RE.match(line_no_nl)
+    if not m:
+        return [raw_line]
+
+    prefix, value_str = m.groups()
+    cut = find_glued_key(value_str)
+    if cut == -1:
+        return [raw_line]
+
+    parts = [prefix + value_str[:cut].rstrip()]
+    rest = value_str[cut:].lstrip()
+    # Хвост тоже может содержать склеенные ключи
+    while True:
+        m = _KEY_HEAD_RE.match(rest)
+        if not m:
+            parts.append(rest)
+            break
+        prefix, value_str = m.groups()
+        cut = find_glued_key(value_str)
+        if cut == -1:
+            parts.append(rest)
+            break
+        parts.append(prefix + value_str[:cut].rstrip())
+        rest = value_str[cut:].lstrip()
+
+    return [p + "\n" for p in parts]
 
-        if pos2 == -1:
-            return [raw_line]
-
-        first = (prefix + value_str[:pos2].rstrip())
-        rest = value_str[pos2:].lstrip()
-        # Рекурсивно разбиваем хвост, если там тоже склеены ключи
-        tail_lines: List[str] = []
-        cur = rest
-        while True:
-            # добавим переносы строк к частям
-            block = cur
-            # следующий разрез
-            m_head = re.match(r"^(\s*[A-Za-z_][\w-]*\s*:\s*)(.*)$", block)
-            if not m_head:
-                tail_lines.append(block)
-                break
-            pfx, val = m_head.groups()
-            # поиск следующего ключа
-            in_q = False
-            esc = False
-            br = 0
-            cut = -1
-            j = 0
-            while j < len(val):
-                c = val[j]
-                if esc:
-                    esc = False
-                    j += 1
-                    continue
-                if c == '\\':
-                    esc = True
-                    j += 1
-                    continue
-                if c == '"':
-                    in_q = not in_q
-                    j += 1
-                    continue
-                if not in_q:
-                    if c == '[':
-                        br += 1
-                    elif c == ']':
-                        br = max(0, br - 1)
-                    if br == 0:
-                        m3 = re.match(r"\s*([A-Za-z_][\w-]*)\s*:\s", val[j:])
-                        if m3:
-                            cut = j + m3.start()
-                            break
-                j += 1
-
-            if cut == -1:
-                tail_lines.append(pfx + val)
-                break
-            else:
-                tail_lines.append((pfx + val[:cut].rstrip()))
-                cur = val[cut:].lstrip()
-                continue
 
-        result = []
-        result.append(first + ("\n" if not first.endswith("\n") else ""))
-        for t in tail_lines:
-            t2 = t + ("\n" if not t.endswith("\n") else "")
-            result.append(t2)
-        return result
+# "]" или '"', за которыми в той же строке сразу идёт известный ключ
+_KEY_BREAK_RE = re.compile(rf"(\]|\")\s*(?=(?:{KNOWN_KEYS})\s*:)")
+
+
+def clean_frontmatter_text(text: str) -> str:
+    """Чистит только самые распространённые ошибки без агрессивной нормализации."""
+    lines = text.splitlines(keepends=True)
+    out: List[str] = []
 
     for raw in lines:
         # Разбиваем строки, где случайно склеены несколько ключей
@@ -390,16 +403,11 @@ def clean_frontmatter_text(text: str) -> str:
 
     # Форсируем переносы строк между склеенными ключами (например, 
     # 'topics: ["Networking"]status: "done"' -> две строки)
-    known_keys = (
-        "type|topics|status|level|title|summary|platforms|ios_min|tags|severity|duration"
-    )
-    pattern_keys = re.compile(rf"(\]|\")\s*(?=(?:{known_keys})\s*:)" )
-
     def enforce_newlines_between_keys(block: str) -> str:
         # Применяем построчно, чтобы не задеть многострочные структуры
         result_lines: List[str] = []
         for ln in block.splitlines(keepends=False):
-            fixed_ln = pattern_keys.sub(r"\1\n", ln)
+            fixed_ln = _KEY_BREAK_RE.sub(r"\1\n", ln)
             result_lines.append(fixed_ln)
         return "\n".join(result_lines) + ("\n" if block.endswith("\n") else "")
 
@@ -415,42 +423,282 @@ def rebuild_content(frontmatter_text: str, body: str) -> str:
     return f"---\n{fm}---\n{body}"
 
 
-def process_file(md_file: Path) -> bool:
+# Строка-продолжение после канонического списка topics/tags: очистка теряет
+# перенос строки после списка, и он восстанавливается, только если следующая
+# строка начинается с известного ключа (или список стоит последним)
+_LIST_END = rf"(?:\n(?=(?:{KNOWN_KEYS})[^\S\n]*:)|\n---\n\Z)"
+_TOPIC = r'"(?=[^"\n]*\w)[^"\n]+"'
+_TAG = r'"(?=[^"\n]*\w)[^\s"\',\[\]](?:[^"\',\n\[\]]*[^\s"\',\[\]])?"'
+_SEPARATORS = r"\x0b\x0c\x1c-\x1e\x85\u2028\u2029"  # разделители строк для splitlines, кроме \n
+
+# Дефекты в пределах одной строки: имя -> образец, проверяемый с начала строки
+_LINE_DEFECTS = {
+    # title: "..."--- и прочие --- внутри строки
+    "glued_fence": r"(?!---$)[^\n]*---",
+    # key: value other: value в одной строке; ключ — слово с буквой, за которым ": "
+    "glued_key": (
+        r"(?=[^:\n]*:[^\n]*:[^\S\n])"
+        r'(?![^\S\n]*[A-Za-z_][\w-]*[^\S\n]*:[^\S\n]*"[^"\\\n]*"[^\S\n]*$)'
+        r"[^\S\n]*[A-Za-z_][\w-]*[^\S\n]*:[^\n]*?(?<![\w-])(?=[\w-]*?[A-Za-z_])[\w-]*+[^\S\n]*:[^\S\n]"
+        rf'|[^\n]*?[\]"][^\S\n]*(?:{KNOWN_KEYS})[^\S\n]*:'
+    ),
+    # topics не каноническим списком ["a", "b"]
+    "topics": (
+        r'(?=[^\S\n]*topics:[^\n]*")(?![^\n]*:[^\S\n]*$)'
+        rf"(?!topics:[ ]\[{_TOPIC}(?:,[ ]{_TOPIC})*\]{_LIST_END})"
+    ),
+    # tags не каноническим списком строк
+    "tags": (
+        r"(?=[^\S\n]*tags:)(?![^\n]*:[^\S\n]*$)(?![^\S\n]*tags:[^\S\n]*\[[^\S\n]*\][^\S\n]*$)"
+        rf"(?![^\S\n]*tags:[^\S\n]*\[{_TAG}(?:,[ ]{_TAG})*\]{_LIST_END})"
+    ),
+    # title без кавычек или slug в кавычках
+    "slug_title": (
+        r'[^\S\n]*title:(?:(?![^\S\n]*"[^\n]*"[^\S\n]*$)[^\n]'
+        r'|[^\S\n]*"[^\S\n]*[^ \n]*[-_][^ \n]*[^\S\n]*"[^\S\n]*$)'
+    ),
+}
+
+# Известные дефекты заголовка заметки (вместе с разделителями ---). Выражение
+# намеренно шире правил clean_frontmatter_text: если оно ничего не нашло (и в
+# списках нет повторов, см. _duplicate_lists), очистка заголовок не изменит, а
+# ложное срабатывание лишь отправляет заметку в полную очистку. Строчные
+# дефекты собраны под одним ^, чтобы не пробовать их в каждой позиции.
+FRONTMATTER_DEFECT_RE = re.compile(
+    r"(?P<layout>\A(?!---\n)|\Z(?<!\n---\n)|^\n---\n\Z"
+    rf"|^[^\n{_SEPARATORS}]*[{_SEPARATORS}])"
+    + "|^(?:" + "|".join(f"(?P<{name}>{pattern})" for name, pattern in _LINE_DEFECTS.items()) + ")",
+    re.MULTILINE,
+)
+DEFECTS = ("layout", *_LINE_DEFECTS)
+
+_LIST_LINE_RE = re.compile(r"^[^\S\n]*(topics|tags):([^\n]*)", re.MULTILINE)
+_LIST_VALUE_RE = re.compile(r'"([^"\n]+)"')
+
+
+def _duplicate_lists(content: str) -> List[str]:
+    """Ключи topics/tags, в строке которых значение повторяется (очистка убрала бы дубль).
+
+    Один линейный проход: значения строки собираются во множество.
+    """
+    found: List[str] = []
+    for m in _LIST_LINE_RE.finditer(content):
+        values = _LIST_VALUE_RE.findall(m.group(2))
+        if len(set(values)) != len(values) and m.group(1) not in found:
+            found.append(m.group(1))
+    return found
+
+
+def has_defects(content: str) -> bool:
+    """Может ли clean_frontmatter_text изменить заголовок; False — гарантированно нет."""
+    return FRONTMATTER_DEFECT_RE.search(content) is not None or bool(_duplicate_lists(content))
+
+
+def detect_defects(content: str) -> List[str]:
+    """Виды известных дефектов в заголовке заметки (от --- до ---, переводы строк нормализованы).
+
+    Пустой список гарантирует, что clean_frontmatter_text заголовок не изменит.
+    """
+    found: List[str] = []
+    for m in FRONTMATTER_DEFECT_RE.finditer(content):
+        name = m.lastgroup
+        if name not in found:
+            found.append(name)
+    for name in _duplicate_lists(content):
+        if name not in found:
+            found.append(name)
+    return found
+
+
+def _read_content(md_file: Path) -> str | None:
+    """Заголовок заметки с нормализованными переводами строк; None — фронтматтера нет."""
+    header = read_header(md_file, tolerant=True)
+    if header.frontmatter_text is None:
+        return None
+    return header.text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _clean_content(content: str) -> Tuple[str | None, str | None]:
+    """(исправленный заголовок, очищенный фронтматтер); (None, None) — фронтматтера нет."""
+    with stage("parse"):
+        fm_text, delim, rest = split_frontmatter(content)
+    if fm_text is None:
+        return None, None
+    with stage("clean"):
+        cleaned_fm = clean_frontmatter_text(fm_text)
+    return f"---\n{cleaned_fm}---\n{rest}", cleaned_fm
+
+
+def clean_file(md_file: Path, durable: bool = False) -> Tuple[bool, IndexRecord | None]:
+    """Чистит один файл и возвращает (изменён ли, запись для индекса).
+
+    С диска читается только заголовок заметки: тело при перезаписи переносится
+    как есть, а у неизменённых файлов не читается вовсе. Заголовок без
+    известных дефектов построчно не чистится. Не трогает общее
+    состояние, поэтому годится как задача для процесса-воркера: запись в индекс
+    и общий fsync (NoteWriter.sync) делает вызывающая сторона; durable=True —
+    сбросить файл на диск сразу.
+    """
+    try:
+        header = read_header(md_file, tolerant=True)
+    except Exception:
+        return False, None
+
+    if header.frontmatter_text is None:
+        return False, make_record(md_file, None, None)
+
+    content = header.text.replace("\r\n", "\n").replace("\r", "\n")
+    with stage("clean"):
+        clean = not has_defects(content)
+    if clean:
+        # Ровно "---\n" + фронтматтер + "---\n": очистка вернула бы его как есть
+        incr("prefilter_clean")
+        fixed, cleaned_fm = content, content[4:-4]
+    else:
+        fixed, cleaned_fm = _clean_content(content)
+        if fixed is None:
+            return False, make_record(md_file, None, None)
+    with stage("parse"):
+        frontmatter = parse_frontmatter(cleaned_fm).to_dict()
+    if fixed == content:
+        return False, make_record(md_file, None, frontmatter)
     try:
-        content = md_file.read_text(encoding="utf-8")
+        digest = rewrite_header(md_file, fixed, header.body_offset, durable=durable, newline=header.newline)
     except Exception:
-        return False
+        return False, None
+    return True, make_record(md_file, None, frontmatter, content_hash=digest)
 
-    fm_text, delim, body = split_frontmatter(content)
-    if fm_text is None:
-        return False
 
-    fixed = rebuild_content(fm_text, body)
-    if fixed != content:
-        try:
-            md_file.write_text(fixed, encoding="utf-8")
-            return True
-        except Exception:
-            return False
-    return False
+def check_file(md_file: Path) -> List[str]:
+    """Дефекты, которые clean_file исправил бы в заметке; пусто — править нечего.
 
+    Файл не меняется. Отмеченный регулярным выражением заголовок проверяется
+    полной очисткой, поэтому ложные срабатывания в результат не попадают.
+    """
+    try:
+        content = _read_content(md_file)
+    except Exception:
+        return []
+    if content is None:
+        return []
+    with stage("clean"):
+        defects = detect_defects(content)
+    if not defects:
+        incr("prefilter_clean")
+        return []
+    fixed, _ = _clean_content(content)
+    if fixed is None or fixed == content:
+        return []
+    return defects
+
+
+def process_file(md_file: Path, index: VaultIndex | None = None) -> bool:
+    changed, record = clean_file(md_file)
+    if index is not None and record is not None:
+        index.update(record, TOOL_NAME)
+    return changed
+
+
+def _task(func: Callable[[Path], T], md_file: Path) -> Tuple[T, dict]:
+    """func в процессе-воркере: результат вместе с метриками воркера."""
+    result = func(md_file)
+    return result, vault_metrics.current().drain()
+
+
+def _iter_results(func: Callable[[Path], T], paths: List[Path], jobs: int) -> Iterator[T]:
+    """Применяет func к файлам последовательно или пулом процессов, результаты — в порядке paths."""
+    if jobs <= 1 or len(paths) < 2:
+        for path in paths:
+            yield func(path)
+        return
+
+    chunksize = max(1, min(MAX_CHUNKSIZE, len(paths) // (jobs * 4)))
+    metrics = vault_metrics.current()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result, snapshot in pool.map(partial(_task, func), paths, chunksize=chunksize):
+            metrics.merge(snapshot)
+            yield result
+
+
+def iter_clean_results(
+    paths: List[Path], jobs: int = 1, durable: bool = False
+) -> Iterator[Tuple[bool, IndexRecord | None]]:
+    """Чистит файлы последовательно или пулом процессов.
+
+    Результаты приходят в порядке paths независимо от числа воркеров, поэтому
+    вывод и итоговый индекс детерминированы. Задачи раздаются пачками, чтобы
+    не платить за межпроцессный обмен на каждый файл.
+    """
+    return _iter_results(partial(clean_file, durable=durable), paths, jobs)
 
-def should_skip(path: Path) -> bool:
-    parts = set(path.parts)
-    return "Templates" in parts or "backups" in parts
 
+def iter_check_results(paths: List[Path], jobs: int = 1) -> Iterator[List[str]]:
+    """check_file для файлов — так же, как iter_clean_results, но без записи."""
+    return _iter_results(check_file, paths, jobs)
 
-def main() -> int:
-    changed = 0
-    scanned = 0
-    for md in VAULT_PATH.rglob("*.md"):
-        if should_skip(md):
-            continue
-        scanned += 1
-        if process_file(md):
-            changed += 1
 
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="Обработать все файлы, игнорируя индекс изменений")
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Число процессов для параллельной очистки (0 — по числу ядер)",
+    )
+    parser.add_argument(
+        "--durable",
+        action="store_true",
+        help="fsync после каждого файла вместо общего fsync в конце прогона",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Ничего не писать: код выхода 1, если есть заметки, которые нужно исправить (для pre-commit); "
+             "проверяет все заметки, индекс изменений не учитывается",
+    )
+    parser.add_argument("--vault", type=Path, default=VAULT_PATH, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    vault_metrics.add_arguments(parser)
+    vault_report.add_arguments(parser)
+    args = parser.parse_args()
+    reporter = Reporter.from_args(TOOL_NAME, args)
+    with vault_metrics.instrument(TOOL_NAME, args), reporter.session():
+        return _run(args, reporter)
+
+
+def _run(args, reporter: Reporter) -> int:
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    index = VaultIndex.load(args.vault)
+    # Templates, backups и .git отсекаются при обходе
+    entries = scan_vault(args.vault)
+    # --check не доверяет индексу: его могла записать старая версия очистки
+    full = args.full or args.check
+    pending = [
+        e.path for e in entries
+        if full or not index.is_fresh(e.path, e.stat, TOOL_NAME)
+    ]
+    skipped = len(entries) - len(pending)
+    scanned = len(pending)
+    if args.check:
+        return _check(pending, jobs, skipped, reporter)
+    with NoteWriter(durable=args.durable) as writer:
+        for path, (file_changed, record) in zip(pending, iter_clean_results(pending, jobs, args.durable)):
+            if file_changed:
+                reporter.emit("fixed", path=path)
+                writer.add(path)
+            else:
+                writer.skip()
+            if record is not None:
+                index.update(record, TOOL_NAME)
+    changed = writer.written
+    index.prune(e.path for e in entries)
+    index.save()
+
+    reporter.emit("summary", scanned=scanned, skipped=skipped, fixed=changed)
     print(f"Просканировано файлов: {scanned}")
+    if skipped:
+        print(f"Пропущено без изменений с прошлого прогона: {skipped}")
     print(f"Исправлено фронтматтеров: {changed}")
     if changed:
         print("Готово ✅")
@@ -459,7 +707,25 @@ def main() -> int:
     return 0
 
 
-if __name__ == "__main__":
-    raise SystemExit(main())
+def _check(pending: List[Path], jobs: int, skipped: int, reporter: Reporter) -> int:
+    """Режим --check: только сообщает о заметках с дефектами, индекс не сохраняется."""
+    needs_fix = 0
+    for path, defects in zip(pending, iter_check_results(pending, jobs)):
+        if defects:
+            needs_fix += 1
+            reporter.emit("needs_fix", path=path, defects=defects)
+            print(f"❌ {path}: {', '.join(defects)}")
+
+    reporter.emit("summary", scanned=len(pending), skipped=skipped, needs_fix=needs_fix)
+    print(f"Просканировано файлов: {len(pending)}")
+    if skipped:
+        print(f"Пропущено без изменений с прошлого прогона: {skipped}")
+    if needs_fix:
+        print(f"Нужно исправить фронтматтер: {needs_fix} (запустите без --check)")
+        return 1
+    print("Изменений не требуется ✅")
+    return 0
 
 
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Граф ссылок хранилища: битые ссылки, заметки-сироты и обратные ссылки.
+
+Ссылки (``[[wikilink]]``, ``[text](path.md)``) и заголовки извлекаются из каждой
+заметки один раз; результат кэшируется в ``.vault_links.json`` по
+(mtime_ns, size), поэтому повторный прогон перечитывает только изменённые
+заметки. Цели разрешаются по заранее построенной таблице имён: полный путь,
+хвосты пути, имя файла и ``aliases`` из фронтматтера, всё в NFC и без учёта
+регистра. Прямые и обратные рёбра хранятся как массивы целых ID узлов, граф
+обновляется по одной заметке (update_note/remove_note).
+
+Содержимое блоков кода и `inline code` не считается ссылками: ``[[Int]]`` в
+Swift-примерах — это тип, а не wikilink.
+
+Использование:
+    python3 link_graph.py                     # битые ссылки и сироты
+    python3 link_graph.py --backlinks "arc-mrc"
+    python3 link_graph.py --full              # пересобрать кэш ссылок
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import posixpath
+import re
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import unquote
+
+import vault_metrics
+import vault_report
+from vault_frontmatter import parse_note
+from vault_metrics import incr, stage
+from vault_report import TEXT, Reporter
+from vault_scan import ScanEntry, markdown_files, scan_vault
+from vault_writer import write_if_changed
+
+
+VAULT_PATH = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+LINKS_FILENAME = ".vault_links.json"
+LINKS_VERSION = 1
+# Граф строится по всему хранилищу, кроме этих каталогов
+LINK_EXCLUDE_DIR_NAMES = frozenset({"backups", ".git"})
+# Заметки отсюда — только цели ссылок: их собственные ссылки не проверяются
+TARGET_ONLY_DIR_NAMES = frozenset({"Templates"})
+
+WIKI = "wiki"
+MARKDOWN = "md"
+
+_FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_INLINE_CODE_RE = re.compile(r"(`+)(?:(?!\1).)+?\1")
+_HEADING_RE = re.compile(r"^ {0,3}#{1,6}[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$")
+_WIKILINK_RE = re.compile(r"!?\[\[([^\[\]|]*?)(?:\|[^\[\]]*)?\]\]")
+_MDLINK_RE = re.compile(r"!?\[(?:[^\[\]]|\[[^\[\]]*\])*\]\(\s*<?([^()\s<>]+(?:\([^()\s]*\))?)>?(?:\s+[\"'(][^)]*)?\)")
+_SCHEME_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+_ANCHOR_DROP_RE = re.compile(r"[^\w\s-]")
+_ANCHOR_SPACE_RE = re.compile(r"[\s-]+")
+
+
+class Link(NamedTuple):
+    kind: str           # WIKI или MARKDOWN
+    target: str         # путь/имя без якоря; "" — ссылка внутри той же заметки
+    anchor: str         # заголовок без "#", "" — без якоря
+    line: int           # номер строки в файле (с 1)
+
+
+class NoteLinks(NamedTuple):
+    links: List[Link]
+    headings: List[str]
+    aliases: List[str]
+
+
+class BrokenLink(NamedTuple):
+    source: Path
+    link: Link
+    reason: str         # "note" — нет цели, "anchor" — нет заголовка
+
+
+def normalize_name(name: str) -> str:
+    """Ключ таблицы имён: NFC, без учёта регистра, с / в качестве разделителя."""
+    return unicodedata.normalize("NFC", name.replace("\\", "/")).casefold().strip()
+
+
+def anchor_key(text: str) -> str:
+    """Якорь заголовка в стиле GitHub/Obsidian: «Деревья и графы» и #деревья-и-графы совпадают."""
+    text = _ANCHOR_DROP_RE.sub("", normalize_name(text))
+    return _ANCHOR_SPACE_RE.sub("-", text).strip("-")
+
+
+def is_target_only(rel: str) -> bool:
+    return any(part in TARGET_ONLY_DIR_NAMES for part in rel.split("/")[:-1])
+
+
+def _strip_md(key: str) -> str:
+    return key[:-3] if key.endswith(".md") else key
+
+
+def _split_anchor(target: str) -> Tuple[str, str]:
+    target, _, anchor = target.partition("#")
+    return target.strip(), anchor.strip()
+
+
+def _text_lines(content: str, body: str) -> Iterator[Tuple[int, int, str]]:
+    """Строки тела вне блоков кода: (номер строки, смещение в content, строка).
+
+    `inline code` в строке заменяется пробелами, смещения при этом не сдвигаются.
+    """
+    pos = len(content) - len(body)
+    lineno = content.count("\n", 0, pos) + 1
+    fence: Optional[str] = None
+    for line in body.split("\n"):
+        offset = pos
+        pos += len(line) + 1
+        lineno += 1
+        m = _FENCE_RE.match(line)
+        if fence is not None:
+            if m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence):
+                fence = None
+            continue
+        if m:
+            fence = m.group(1)
+            continue
+        if "`" in line:
+            line = _INLINE_CODE_RE.sub(lambda c: " " * len(c.group(0)), line)
+        yield lineno - 1, offset, line
+
+
+def _line_links(line: str, lineno: int, offset: int) -> Iterator[Tuple[Link, int, int]]:
+    for w in _WIKILINK_RE.finditer(line):
+        target, anchor = _split_anchor(w.group(1))
+        if target or anchor:
+            yield Link(WIKI, target, anchor, lineno), offset + w.start(1), offset + w.end(1)
+    for md in _MDLINK_RE.finditer(line):
+        raw = md.group(1)
+        if _SCHEME_RE.match(raw):
+            continue
+        target, anchor = _split_anchor(raw)
+        yield Link(MARKDOWN, unquote(target), unquote(anchor), lineno), offset + md.start(1), offset + md.end(1)
+
+
+def iter_links(content: str) -> Iterator[Tuple[Link, int, int]]:
+    """Ссылки заметки вне блоков кода и границы их цели (``путь#якорь``) в content."""
+    _, body = parse_note(content)
+    for lineno, offset, line in _text_lines(content, body):
+        if "[" in line:
+            yield from _line_links(line, lineno, offset)
+
+
+def extract_links(content: str) -> NoteLinks:
+    """Извлекает ссылки, заголовки и aliases из текста заметки за один проход."""
+    fm, body = parse_note(content)
+    aliases: List[str] = []
+    if fm is not None:
+        value = fm.get("aliases")
+        if isinstance(value, list):
+            aliases = [a for a in value if a]
+        elif value:
+            aliases = [value]
+
+    links: List[Link] = []
+    headings: List[str] = []
+    for lineno, offset, line in _text_lines(content, body):
+        h = _HEADING_RE.match(line)
+        if h:
+            headings.append(h.group(1))
+        if "[" in line:
+            links.extend(link for link, _, _ in _line_links(line, lineno, offset))
+    return NoteLinks(links, headings, aliases)
+
+
+class LinkGraph:
+    """Граф ссылок с целочисленными ID узлов.
+
+    Узлы — все файлы хранилища (заметки и вложения); рёбра есть только у
+    заметок. Для каждой ссылки заметки хранится ID цели (или -1, если цель не
+    найдена) в массиве, выровненном по списку ссылок; обратные ссылки — массив
+    ID источников (по одному на каждую ссылку).
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._paths: List[str] = []                 # ID -> путь относительно корня
+        self._ids: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._is_note: List[bool] = []
+        self._links: List[Optional[NoteLinks]] = []
+        self._anchors: List[Optional[Set[str]]] = []
+        self._out: List[array] = []
+        self._in: List[array] = []
+        self._names: Dict[str, List[int]] = {}      # ключ имени -> ID узлов
+        self._by_path: Dict[str, int] = {}          # нормализованный путь -> ID (для markdown-ссылок)
+        self._node_keys: List[List[str]] = []
+        self._waiting: Dict[str, Set[int]] = {}     # ключ неразрешённой цели -> ID источников
+
+    # --- таблица имён -------------------------------------------------------
+
+    def key(self, path: Path | str) -> str:
+        p = Path(path)
+        try:
+            return p.relative_to(self.root).as_posix()
+        except ValueError:
+            return p.as_posix()
+
+    def _name_keys(self, rel: str, note: bool, aliases: Iterable[str]) -> List[str]:
+        norm = normalize_name(rel)
+        if note:
+            norm = _strip_md(norm)
+        parts = norm.split("/")
+        keys = ["/".join(parts[i:]) for i in range(len(parts))]
+        keys.extend(normalize_name(a) for a in aliases)
+        if note:
+            keys.append(norm + ".md")
+        return keys
+
+    def _register_names(self, node: int, keys: List[str]) -> Set[int]:
+        """Добавляет имена узла; возвращает источники, чьи ссылки надо разрешить заново.
+
+        Это ждавшие этих имён битые ссылки и ссылки на узел, который перестал
+        быть лучшим кандидатом (при одинаковых именах выигрывает более короткий путь).
+        """
+        self._node_keys[node] = keys
+        self._by_path[normalize_name(self._paths[node])] = node
+        woken: Set[int] = set()
+        for k in keys:
+            ids = self._names.setdefault(k, [])
+            if node not in ids:
+                previous = ids[0] if ids else None
+                ids.append(node)
+                ids.sort(key=lambda i: (len(self._paths[i]), self._paths[i]))
+                if previous is not None and ids[0] == node:
+                    woken.update(self._in[previous])
+            woken |= self._waiting.pop(k, set())
+        return woken
+
+    def _unregister_names(self, node: int) -> None:
+        self._by_path.pop(normalize_name(self._paths[node]), None)
+        for k in self._node_keys[node]:
+            ids = self._names.get(k)
+            if ids and node in ids:
+                ids.remove(node)
+                if not ids:
+                    del self._names[k]
+        self._node_keys[node] = []
+
+    # --- узлы ---------------------------------------------------------------
+
+    def _new_node(self, rel: str, note: bool) -> int:
+        if self._free:
+            node = self._free.pop()
+            self._paths[node] = rel
+            self._is_note[node] = note
+        else:
+            node = len(self._paths)
+            self._paths.append(rel)
+            self._is_note.append(note)
+            self._links.append(None)
+            self._anchors.append(None)
+            self._out.append(array("l"))
+            self._in.append(array("l"))
+            self._node_keys.append([])
+        self._ids[rel] = node
+        return node
+
+    def add_file(self, path: Path | str) -> int:
+        """Регистрирует файл, который только цель ссылок: вложение или шаблон."""
+        rel = self.key(path)
+        node = self._ids.get(rel)
+        if node is not None:
+            return node
+        node = self._new_node(rel, False)
+        self._rewire(self._register_names(node, self._name_keys(rel, rel.endswith(".md"), ())))
+        return node
+
+    def update_note(self, path: Path | str, links: NoteLinks) -> int:
+        """Добавляет или обновляет заметку: перестраивает только её рёбра и имена."""
+        rel = self.key(path)
+        node = self._ids.get(rel)
+        sources: Set[int] = set()
+        if node is None:
+            node = self._new_node(rel, True)
+        else:
+            # Ссылки на заметку могли держаться на удалённом alias
+            sources.update(self._in[node])
+            self._drop_edges(node)
+            self._unregister_names(node)
+        self._links[node] = links
+        self._anchors[node] = {anchor_key(h) for h in links.headings}
+        sources |= self._register_names(node, self._name_keys(rel, True, links.aliases))
+        self._resolve_edges(node)
+        sources.discard(node)
+        self._rewire(sources)
+        return node
+
+    def remove_note(self, path: Path | str) -> None:
+        """Удаляет файл: ссылки на него становятся битыми."""
+        rel = self.key(path)
+        node = self._ids.pop(rel, None)
+        if node is None:
+            return
+        self._drop_edges(node)
+        self._unregister_names(node)
+        self._links[node] = None
+        self._anchors[node] = None
+        sources = set(self._in[node])
+        sources.discard(node)
+        self._rewire(sources)
+        self._in[node] = array("l")
+        self._is_note[node] = False
+        self._paths[node] = ""
+        self._free.append(node)
+
+    def _rewire(self, sources: Iterable[int]) -> None:
+        for src in sources:
+            if self._links[src] is not None:
+                self._drop_edges(src)
+                self._resolve_edges(src)
+
+    def _drop_edges(self, node: int) -> None:
+        links = self._links[node]
+        for i, target in enumerate(self._out[node]):
+            if target >= 0:
+                incoming = self._in[target]
+                incoming.pop(incoming.index(node))
+            elif links is not None:
+                waiting = self._waiting.get(self._lookup_key(node, links.links[i]))
+                if waiting is not None:
+                    waiting.discard(node)
+        self._out[node] = array("l")
+
+    # --- разрешение ссылок --------------------------------------------------
+
+    def _lookup_key(self, node: int, link: Link) -> str:
+        base = posixpath.dirname(self._paths[node])
+        if link.kind == WIKI:
+            target = link.target
+            if target.startswith(("./", "../")):
+                target = posixpath.normpath(posixpath.join(base, target))
+            return _strip_md(normalize_name(target))
+        return normalize_name(posixpath.normpath(posixpath.join(base, link.target)))
+
+    def resolve(self, node: int, link: Link) -> int:
+        """ID цели ссылки или -1."""
+        if not link.target:
+            return node
+        key = self._lookup_key(node, link)
+        if link.kind == MARKDOWN:
+            # markdown-ссылка — путь от заметки (или от корня), а не имя
+            target = self._by_path.get(key)
+            if target is None:
+                target = self._by_path.get(normalize_name(posixpath.normpath(link.target.lstrip("/"))))
+            return -1 if target is None else target
+        ids = self._names.get(key)
+        return ids[0] if ids else -1
+
+    def target_of(self, source: Path | str, link: Link) -> Optional[str]:
+        """Путь (относительно корня) файла, на который указывает ссылка заметки source."""
+        node = self._ids.get(self.key(source))
+        if node is None or self._links[node] is None:
+            return None
+        target = self.resolve(node, link)
+        return self._paths[target] if target >= 0 else None
+
+    def _resolve_edges(self, node: int) -> None:
+        out = array("l")
+        for link in self._links[node].links:
+            target = self.resolve(node, link)
+            out.append(target)
+            if target >= 0:
+                self._in[target].append(node)
+            else:
+                self._waiting.setdefault(self._lookup_key(node, link), set()).add(node)
+        self._out[node] = out
+
+    # --- запросы ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def notes(self) -> List[str]:
+        return sorted(p for p, i in self._ids.items() if self._is_note[i])
+
+    def iter_broken_links(self) -> Iterator[BrokenLink]:
+        """Ссылки на несуществующие заметки/файлы и на несуществующие заголовки."""
+        for rel, node in sorted(self._ids.items()):
+            links = self._links[node]
+            if links is None:
+                continue
+            for link, target in zip(links.links, self._out[node]):
+                if target < 0:
+                    yield BrokenLink(self.root / rel, link, "note")
+                elif (
+                    link.anchor
+                    and not link.anchor.startswith("^")
+                    and self._anchors[target] is not None
+                    and anchor_key(link.anchor) not in self._anchors[target]
+                ):
+                    yield BrokenLink(self.root / rel, link, "anchor")
+
+    def broken_links(self) -> List[BrokenLink]:
+        return list(self.iter_broken_links())
+
+    def iter_orphans(self) -> Iterator[Path]:
+        """Заметки, на которые не ссылается ни одна другая заметка."""
+        for rel, node in sorted(self._ids.items()):
+            if self._is_note[node] and all(src == node for src in self._in[node]):
+                yield self.root / rel
+
+    def orphans(self) -> List[Path]:
+        return list(self.iter_orphans())
+
+    def _node(self, path: Path | str) -> Optional[int]:
+        """ID по пути или по имени, как в wikilink."""
+        node = self._ids.get(self.key(path))
+        if node is None:
+            ids = self._names.get(_strip_md(normalize_name(str(path))))
+            node = ids[0] if ids else None
+        return node
+
+    def backlinks(self, path: Path | str) -> List[Path]:
+        node = self._node(path)
+        if node is None:
+            return []
+        return sorted(self.root / self._paths[src] for src in set(self._in[node]) if src != node)
+
+    def outlinks(self, path: Path | str) -> List[Path]:
+        node = self._node(path)
+        if node is None:
+            return []
+        return sorted(self.root / self._paths[t] for t in set(self._out[node]) if t >= 0 and t != node)
+
+
+# --- Кэш извлечённых ссылок -------------------------------------------------
+
+def _load_cache(path: Path) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != LINKS_VERSION:
+        return {}
+    return data.get("notes") or {}
+
+
+def _to_json(links: NoteLinks) -> dict:
+    return {
+        "links": [list(link) for link in links.links],
+        "headings": links.headings,
+        "aliases": links.aliases,
+    }
+
+
+def _from_json(data: dict) -> NoteLinks:
+    return NoteLinks([Link(*link) for link in data["links"]], data["headings"], data["aliases"])
+
+
+def build_graph(
+    root: Path,
+    files: Optional[List[ScanEntry]] = None,
+    full: bool = False,
+    cache=None,
+) -> LinkGraph:
+    """Строит граф по одному обходу хранилища.
+
+    files — все файлы (не только .md) без LINK_EXCLUDE_DIR_NAMES.
+
+    Ссылки перечитываются только у заметок, изменившихся с прошлого прогона;
+    cache — общий vault_frontmatter.NoteCache, если заметки уже читались.
+    """
+    if files is None:
+        files = scan_vault(root, suffix=None, exclude=LINK_EXCLUDE_DIR_NAMES)
+    cache_path = root / LINKS_FILENAME
+    old = {} if full else _load_cache(cache_path)
+    new: Dict[str, dict] = {}
+
+    graph = LinkGraph(root)
+    notes = [e for e in markdown_files(files) if not is_target_only(graph.key(e.path))]
+    note_paths = {e.path for e in notes}
+    for entry in files:
+        if not entry.is_dir and entry.path not in note_paths:
+            graph.add_file(entry.path)
+    for entry in notes:
+        rel = graph.key(entry.path)
+        cached = old.get(rel)
+        if cached is not None and cached["mtime_ns"] == entry.stat.st_mtime_ns and cached["size"] == entry.stat.st_size:
+            links = _from_json(cached)
+        else:
+            try:
+                if cache is not None:
+                    content = cache.text(entry.path, entry.stat)
+                else:
+                    with stage("read"), open(entry.path, "r", encoding="utf-8") as f:
+                        content = f.read()
+                    incr("bytes_read", entry.stat.st_size)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Ошибка чтения {entry.path}: {e}")
+                continue
+            with stage("parse"):
+                links = extract_links(content)
+        record = _to_json(links)
+        record["mtime_ns"] = entry.stat.st_mtime_ns
+        record["size"] = entry.stat.st_size
+        new[rel] = record
+        graph.update_note(entry.path, links)
+
+    if new != old:
+        write_if_changed(
+            cache_path,
+            json.dumps({"version": LINKS_VERSION, "notes": new}, ensure_ascii=False, separators=(",", ":")),
+        )
+    return graph
+
+
+def report_links(graph: LinkGraph, reporter: Reporter = TEXT) -> Tuple[int, int]:
+    """Печатает битые ссылки и сирот; возвращает их число.
+
+    В режиме jsonl находки сразу уходят в reporter и в памяти не копятся.
+    """
+    print("🔍 Проверка ссылок...")
+    if reporter.jsonl:
+        broken_count = orphan_count = 0
+        for item in graph.iter_broken_links():
+            link = item.link
+            reporter.emit(
+                "broken_link",
+                path=item.source,
+                line=link.line,
+                target=link.target,
+                anchor=link.anchor or None,
+                reason=item.reason,
+            )
+            broken_count += 1
+        for path in graph.iter_orphans():
+            reporter.emit("orphan", path=path)
+            orphan_count += 1
+        return broken_count, orphan_count
+
+    broken = graph.broken_links()
+    orphans = graph.orphans()
+
+    if broken:
+        print(f"\n❌ Найдено {len(broken)} битых ссылок:")
+        for item in broken:
+            link = item.link
+            shown = link.target + (f"#{link.anchor}" if link.anchor else "")
+            what = "нет заголовка" if item.reason == "anchor" else "нет заметки"
+            print(f"  {item.source}:{link.line}: {shown} ({what})")
+    else:
+        print("✅ Битых ссылок не найдено")
+
+    if orphans:
+        print(f"\n⚠️ Заметок без входящих ссылок: {len(orphans)}")
+        for path in orphans:
+            print(f"  {path}")
+    return len(broken), len(orphans)
+
+
+def main(argv=None, root=None, files=None, cache=None, reporter: Optional[Reporter] = None) -> int:
+    """CLI; root, files, cache и reporter передаёт complete_maintenance, чтобы не обходить хранилище повторно."""
+    parser = argparse.ArgumentParser(description="Граф ссылок: битые ссылки, сироты, обратные ссылки")
+    parser.add_argument("--full", action="store_true", help="Перечитать ссылки всех заметок, игнорируя кэш")
+    parser.add_argument("--backlinks", metavar="NOTE", help="Показать заметки, ссылающиеся на NOTE")
+    parser.add_argument("--vault", type=Path, default=VAULT_PATH, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    vault_metrics.add_arguments(parser)
+    vault_report.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if reporter is None:
+        reporter = Reporter.from_args("link_graph", args)
+    with vault_metrics.instrument("link_graph", args), reporter.session():
+        return _run(args, root, files, cache, reporter)
+
+
+def _run(args, root, files, cache, reporter: Reporter) -> int:
+    graph = build_graph(root or args.vault, files, full=args.full, cache=cache)
+
+    if args.backlinks:
+        backlinks = graph.backlinks(args.backlinks)
+        print(f"🔗 Обратные ссылки на {args.backlinks}: {len(backlinks)}")
+        for path in backlinks:
+            reporter.emit("backlink", path=path, target=args.backlinks)
+            print(f"  {path}")
+        reporter.emit("summary", backlinks=len(backlinks))
+        return 0
+
+    broken, orphans = report_links(graph, reporter)
+    notes = len(graph.notes())
+    print("\n📋 Итоговый отчет:")
+    print(f"Заметок: {notes}")
+    print(f"Битых ссылок: {broken}")
+    print(f"Заметок-сирот: {orphans}")
+    reporter.emit("summary", notes=notes, broken_links=broken, orphans=orphans)
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,30 +4,56 @@
 - Приводит имена к Unicode NFC (устраняет разницу "й" vs "й" и т.п.)
 - Опционально удаляет конфликтные суффиксы " 2"/" 3" (только при явном флаге)
 - Безопасно объединяет идентичные файлы (если хэши совпадают)
+- Обновляет ссылки ([[wikilink]] и markdown) на переименованные файлы
+- Переименовывает каталог целиком, а не каждый файл в нём
+- Ведёт журнал: прерванный прогон можно продолжить или откатить
 
 Запуск:
   python3 normalize_filenames.py --apply        # применить
   python3 normalize_filenames.py --dry-run      # показать план
   python3 normalize_filenames.py --strip-suffix # дополнительно убрать суффиксы " 2"/" 3"
+  python3 normalize_filenames.py --resume       # довести до конца прерванный прогон
+  python3 normalize_filenames.py --rollback     # откатить прерванный прогон
 """
 import argparse
-import hashlib
+import base64
+import json
+import os
+import posixpath
+import shutil
 import sys
 import unicodedata
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+from urllib.parse import unquote
+
+import content_hash
+import vault_metrics
+import vault_report
+from content_hash import DEFAULT_HASH_WORKERS, DEFAULT_READ_AHEAD, DigestCache, hash_file
+from link_graph import MARKDOWN, build_graph, iter_links, normalize_name
+from vault_metrics import stage
+from vault_report import TEXT, Reporter
+from vault_writer import NoteWriter
 
 ROOT = Path("/Users/kirilltitov/Documents/Obsidian Vault")
 
 EXCLUDE_DIR_NAMES = {".git", "backups"}
 EXCLUDE_PARTS_CONTAIN = {"Templates"}
+# Сколько конфликтов показать в текстовом отчёте (все — в --format jsonl)
+SHOWN_CONFLICTS = 20
+
+# Журнал прогона --apply в корне хранилища; удаляется после успешного прогона
+JOURNAL_NAME = ".normalize_journal.jsonl"
+JOURNAL_VERSION = 1
+# Итог шага, выполненного до прерывания, но не попавшего в журнал
+ALREADY_MOVED = "already-moved"
+# Неожиданные ошибки: после них журнал остаётся, ссылки на эти пути уже переписаны
+ERROR_ACTIONS = ("rename-error", "hash-error", "dir-clean-error")
 
 
 def compute_md5(path: Path) -> str:
-    m = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            m.update(chunk)
-    return m.hexdigest()
+    return hash_file(path, "md5")
 
 
 def has_combining_marks(s: str) -> bool:
@@ -35,8 +61,8 @@ def has_combining_marks(s: str) -> bool:
 
 
 def normalize_component(name: str, strip_suffix: bool) -> str:
-    # Unicode NFC нормализация
-    normalized = unicodedata.normalize("NFC", name)
+    # Unicode NFC нормализация (ASCII-имена в NFC уже, без вызова normalize)
+    normalized = name if name.isascii() else unicodedata.normalize("NFC", name)
     # Не трогаем расширения/точки, только хвостовые пробел+цифра-сценарии, если явно указано
     if strip_suffix:
         for suffix in (" 2", " 3"):
@@ -46,132 +72,599 @@ def normalize_component(name: str, strip_suffix: bool) -> str:
     return normalized
 
 
-def should_skip(path: Path) -> bool:
-    parts = set(path.parts)
-    if parts & EXCLUDE_DIR_NAMES:
-        return True
-    if any(ex in path.parts for ex in EXCLUDE_PARTS_CONTAIN):
-        return True
-    return False
+FILE = "file"
+# Путь назначения файла к моменту переноса будет занят: идентичный файл
+# сливается, при разном содержимом — конфликт
+MERGE_FILE = "merge-file"
+DIR = "dir"
+# Каталог назначения уже существует: содержимое переносится поштучно,
+# а опустевший исходный каталог удаляется
+MERGE_DIR = "merge-dir"
 
 
-def plan_normalization(strip_suffix: bool):
-    moves = []  # (src, dst)
-    for path in sorted(ROOT.rglob("*"), key=lambda p: (p.is_dir(), len(str(p))), reverse=True):
-        if path == ROOT:
-            continue
-        if should_skip(path):
-            continue
-        # Собираем нормализованный путь по компонентам
-        new_parts = []
-        for comp in path.relative_to(ROOT).parts:
-            new_parts.append(normalize_component(comp, strip_suffix))
-        dst = ROOT.joinpath(*new_parts)
-        if dst != path:
-            moves.append((path, dst))
-    return moves
+class Move(NamedTuple):
+    src: Path  # путь на момент выполнения шага (предок к этому времени уже переименован)
+    dst: Path
+    kind: str  # FILE, MERGE_FILE, DIR или MERGE_DIR
 
 
-def ensure_parent(dst: Path):
-    dst.parent.mkdir(parents=True, exist_ok=True)
+class NormalizationPlan(NamedTuple):
+    moves: List[Move]
+    # Исходный путь -> итоговый для каждого файла, который окажется по новому
+    # пути (в том числе внутри переименованных каталогов), — для ссылок
+    renamed: List[Tuple[Path, Path]]
 
 
-def apply_moves(moves, dry_run: bool):
-    # Сначала файлы, потом директории (во избежание конфликтов путей)
-    file_moves = [(s, d) for s, d in moves if s.is_file()]
-    dir_moves = [(s, d) for s, d in moves if s.is_dir()]
+def _same_file(a, b) -> bool:
+    """Одна ли это запись ФС (на нечувствительной к нормализации ФС NFD- и NFC-имя совпадают).
 
-    conflicts = []
-    performed = []
+    Символические ссылки не разыменовываются: две ссылки на один каталог — разные записи.
+    """
+    try:
+        return os.path.samestat(os.lstat(a), os.lstat(b))
+    except OSError:
+        return False
 
-    # Файлы
-    for src, dst in file_moves:
-        if dry_run:
-            print(f"FILE: {src} -> {dst}")
+
+def plan_normalization(strip_suffix: bool, digests: DigestCache | None = None,
+                       workers: int = DEFAULT_HASH_WORKERS, read_ahead: int = DEFAULT_READ_AHEAD) -> NormalizationPlan:
+    """Планирует переименования одним обходом сверху вниз.
+
+    Каталог с новым именем переносится целиком одним rename, если каталога
+    назначения ещё нет; его содержимое дальше планируется уже по новому пути
+    (вложенным именам тоже может понадобиться нормализация). Только если
+    каталог назначения уже существует, содержимое переносится поштучно, а
+    исходный каталог удаляется после детей, когда опустеет.
+
+    Для файлов, которым уже занят путь назначения, исход предсказывается
+    заранее: идентичный файл будет слит, а при разном содержимом файл останется
+    на месте и в renamed не попадёт — ссылки на него переписывать нельзя.
+    Содержимое таких пар сравнивается после обхода, пачкой в workers потоков;
+    хэши остаются в digests и при переносе не считаются заново.
+    """
+    if digests is None:
+        digests = DigestCache("md5")
+    moves = []
+    renamed = []
+    claimed = {}  # итоговый путь -> исходный путь файла, первым занявшего его
+    contested = []  # (занявший путь, файл, итоговый путь) — сравнить содержимое
+    excluded = EXCLUDE_DIR_NAMES | EXCLUDE_PARTS_CONTAIN
+    root = str(ROOT)
+    # (исходный путь, путь на момент переноса детей, итоговый путь,
+    #  существующий сейчас каталог с содержимым итогового, выход из каталога)
+    stack = [(root, root, root, root, False)]
+    while stack:
+        orig_dir, cur_dir, dst_dir, probe_dir, leaving = stack.pop()
+        if leaving:
+            moves.append(Move(Path(cur_dir), Path(dst_dir), MERGE_DIR))
+            continue
+        try:
+            it = os.scandir(orig_dir)
+        except OSError:
             continue
-        if dst.exists():
-            if dst.is_file():
-                # Сравнить содержимое
+        with it:
+            for entry in it:
                 try:
-                    if compute_md5(src) == compute_md5(dst):
-                        # Идентичные: удаляем источник
-                        src.unlink()
-                        performed.append((src, dst, "deleted-duplicate"))
-                        continue
-                except Exception as e:
-                    conflicts.append((src, dst, f"hash-error: {e}"))
+                    # Символическая ссылка на каталог переименовывается как один файл:
+                    # обход в неё не заходит, цель (возможно, вне хранилища) не трогается
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
                     continue
-                # Разное содержимое: конфликт
-                conflicts.append((src, dst, "content-diff"))
-                continue
-            else:
-                conflicts.append((src, dst, "dst-exists-nonfile"))
+                name = entry.name
+                if is_dir and name in excluded:
+                    continue
+                new_name = normalize_component(name, strip_suffix)
+                cur = os.path.join(cur_dir, name)
+                dst = os.path.join(dst_dir, new_name)
+                needs_move = cur != dst
+                probe = os.path.join(probe_dir, new_name)
+                occupied = needs_move and os.path.lexists(probe) and not _same_file(entry.path, probe)
+                if is_dir:
+                    if not needs_move:
+                        stack.append((entry.path, cur, dst, entry.path, False))
+                    elif occupied:
+                        # Маркер выхода кладётся под детей — каталог попадёт в план после них
+                        stack.append((entry.path, cur, dst, probe, True))
+                        stack.append((entry.path, cur, dst, probe, False))
+                    else:
+                        moves.append(Move(Path(cur), Path(dst), DIR))
+                        stack.append((entry.path, dst, dst, entry.path, False))
+                    continue
+                if needs_move:
+                    occupant = claimed.get(dst) or (probe if occupied else None)
+                    moves.append(Move(Path(cur), Path(dst), FILE if occupant is None else MERGE_FILE))
+                    if occupant is not None:
+                        contested.append((occupant, entry.path, dst))
+                        continue
+                    claimed[dst] = entry.path
+                if entry.path != dst:
+                    renamed.append((Path(entry.path), Path(dst)))
+    pairs = ((occupant, path) for occupant, path, _ in contested)
+    for (_, path, dst), (_, same) in zip(contested, digests.same_content_many(pairs, workers, read_ahead)):
+        if same:
+            renamed.append((Path(path), Path(dst)))
+    return NormalizationPlan(moves, renamed)
+
+
+class MoveJournal:
+    """Журнал прогона --apply: JSON-строки в корне хранилища.
+
+    Первая строка — план. Перед перезаписью заметки в журнал попадают её
+    исходные байты (в base64), после каждого шага переноса — его итог.
+    Успешный прогон удаляет журнал; оставшийся журнал значит, что прогон
+    прервался, и его можно продолжить (--resume) или откатить (--rollback).
+    """
+
+    def __init__(self, plan: NormalizationPlan):
+        self.path = ROOT / JOURNAL_NAME
+        self.plan = plan
+        self.originals: Dict[str, bytes] = {}  # заметка -> содержимое до правки ссылок
+        self.done: Dict[int, str] = {}  # номер шага -> действие (без конфликтов)
+        self.last = -1  # последний записанный шаг
+        self.moving = False  # ссылки переписаны, идут переносы
+        self._file = None
+
+    @classmethod
+    def start(cls, plan: NormalizationPlan) -> "MoveJournal":
+        journal = cls(plan)
+        journal._file = open(journal.path, "x", encoding="utf-8")
+        journal.record(
+            version=JOURNAL_VERSION,
+            moves=[[_rel(src), _rel(dst), kind] for src, dst, kind in plan.moves],
+            renamed=[[_rel(src), _rel(dst)] for src, dst in plan.renamed],
+        )
+        return journal
+
+    @classmethod
+    def load(cls) -> "MoveJournal":
+        path = ROOT / JOURNAL_NAME
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        records = []
+        for line in text.splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Строка, оборванная при прерывании: её шаг считается невыполненным
                 continue
-        ensure_parent(dst)
+        if not records or records[0].get("version") != JOURNAL_VERSION:
+            raise ValueError(f"неизвестный формат журнала {path}")
+        header = records[0]
+        journal = cls(NormalizationPlan(
+            [Move(ROOT / src, ROOT / dst, kind) for src, dst, kind in header["moves"]],
+            [(ROOT / src, ROOT / dst) for src, dst in header["renamed"]],
+        ))
+        for record in records[1:]:
+            if "note" in record:
+                if "original_b64" in record:
+                    original = base64.b64decode(record["original_b64"])
+                else:
+                    # Журнал старой версии: текст с уже нормализованными переводами строк
+                    original = record["original"].encode("utf-8")
+                journal.originals.setdefault(record["note"], original)
+            elif "op" in record:
+                journal.last = max(journal.last, record["op"])
+                if not record["conflict"]:
+                    journal.done[record["op"]] = record["action"]
+            elif record.get("phase") == "moves":
+                journal.moving = True
+        journal._file = open(path, "a", encoding="utf-8")
+        if text and not text.endswith("\n"):
+            journal._file.write("\n")
+        return journal
+
+    def record(self, **fields) -> None:
+        self._file.write(json.dumps(fields, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def keep_original(self, note_rel: str, data: bytes) -> None:
+        """Сохраняет байты заметки до первой правки (повторная правка после --resume не затирает их).
+
+        Хранятся в base64 как есть, чтобы --rollback вернул файл байт в байт
+        (переводы строк CRLF, BOM).
+        """
+        if note_rel not in self.originals:
+            self.originals[note_rel] = data
+            self.record(note=note_rel, original_b64=base64.b64encode(data).decode("ascii"))
+
+    def start_moves(self) -> None:
+        self.moving = True
+        self.record(phase="moves")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self) -> None:
+        self.close()
+        self.path.unlink()
+
+
+def _apply_move(move: Move, digests: DigestCache):
+    """Выполняет один шаг плана; возвращает (действие, конфликт ли)."""
+    src, dst, kind = move
+    if kind == MERGE_DIR:
+        # Содержимое уже перенесено поштучно — пустой исходный каталог удаляем
         try:
-            src.rename(dst)
-            performed.append((src, dst, "moved"))
+            if src.is_dir() and not any(src.iterdir()):
+                src.rmdir()
+                return "removed-empty-dir", False
+            return "dst-exists", True
         except Exception as e:
-            conflicts.append((src, dst, f"rename-error: {e}"))
+            return f"dir-clean-error: {e}", True
+    if os.path.lexists(dst) and not _same_file(src, dst):
+        if kind == DIR:
+            return "dst-exists", True
+        if not dst.is_file():
+            return "dst-exists-nonfile", True
+        try:
+            if digests.same_content(src, dst):
+                # Идентичные: удаляем источник
+                src.unlink()
+                return "deleted-duplicate", False
+        except Exception as e:
+            return f"hash-error: {e}", True
+        # Разное содержимое: конфликт
+        return "content-diff", True
+    try:
+        src.rename(dst)
+    except Exception as e:
+        return f"rename-error: {e}", True
+    return ("moved-dir" if kind == DIR else "moved"), False
+
+
+def iter_moves(moves, dry_run: bool, digests: DigestCache | None = None, journal: MoveJournal | None = None,
+               resume: bool = False):
+    """Выполняет план по шагам и сразу выдаёт итог: (src, dst, действие, конфликт ли).
 
-    # Директории (переименуем пустые/не конфликтующие)
-    for src, dst in dir_moves:
+    Итоги не копятся, поэтому даже огромный список конфликтов не держится в
+    памяти. В dry-run только печатает план и ничего не выдаёт. С журналом
+    каждый итог записывается в него, а уже выполненные шаги пропускаются.
+    """
+    # Хэши переиспользуются: если несколько источников сходятся в один dst
+    # ("Note", "Note 2", "Note 3"), dst хэшируется один раз
+    if digests is None:
+        digests = DigestCache("md5")
+    for i, move in enumerate(moves):
+        src, dst, kind = move
         if dry_run:
-            print(f"DIR:  {src} -> {dst}")
+            if kind in (FILE, MERGE_FILE):
+                print(f"FILE: {src} -> {dst}")
+            else:
+                print(f"DIR:  {src} -> {dst}" + (" (слияние)" if kind == MERGE_DIR else ""))
             continue
-        if dst.exists():
-            # Если dst существует и src пустая — удалим src
-            try:
-                if src.exists() and src.is_dir() and not any(src.iterdir()):
-                    src.rmdir()
-                    performed.append((src, dst, "removed-empty-dir"))
-                else:
-                    conflicts.append((src, dst, "dst-exists"))
-            except Exception as e:
-                conflicts.append((src, dst, f"dir-clean-error: {e}"))
+        if journal is not None and i in journal.done:
             continue
-        ensure_parent(dst)
-        try:
-            src.rename(dst)
-            performed.append((src, dst, "moved-dir"))
-        except Exception as e:
-            conflicts.append((src, dst, f"rename-error: {e}"))
+        if resume and not os.path.lexists(src) and (kind == MERGE_DIR or os.path.lexists(dst)):
+            # Шаг выполнился перед прерыванием, но итог не успел попасть в журнал
+            action, conflict = ("removed-empty-dir" if kind == MERGE_DIR else ALREADY_MOVED), False
+        else:
+            action, conflict = _apply_move(move, digests)
+        if journal is not None:
+            journal.record(op=i, action=action, conflict=conflict)
+        yield src, dst, action, conflict
+
 
+def apply_moves(moves, dry_run: bool, digests: DigestCache | None = None):
+    """iter_moves со сбором итогов в списки (performed, conflicts)."""
+    conflicts = []
+    performed = []
+    for src, dst, action, conflict in iter_moves(moves, dry_run, digests):
+        (conflicts if conflict else performed).append((src, dst, action))
     return performed, conflicts
 
 
+def _rel(path: Path) -> str:
+    return path.relative_to(ROOT).as_posix()
+
+
+def _names_path(target: str, target_rel: str) -> bool:
+    """Цель wikilink записана путём (имя файла или хвост пути), а не alias из фронтматтера."""
+    key = normalize_name(target)
+    path = normalize_name(target_rel)
+    if path.endswith(".md"):
+        path = path[:-3]
+        if key.endswith(".md"):
+            key = key[:-3]
+    return path == key or path.endswith("/" + key)
+
+
+def _new_wiki_target(written: str, new_rel: str, new_source_rel: str) -> str:
+    """Новая цель wikilink в той же форме, что и старая: имя, хвост пути или относительный путь."""
+    has_md = written.lower().endswith(".md")
+    if new_rel.endswith(".md") and not has_md:
+        new_rel = new_rel[:-3]
+    if written.startswith(("./", "../")):
+        new = posixpath.relpath(new_rel, posixpath.dirname(new_source_rel) or ".")
+        if not new.startswith("../"):
+            new = "./" + new
+        return new
+    depth = written.rstrip("/").count("/") + 1
+    return "/".join(new_rel.split("/")[-depth:])
+
+
+def _new_markdown_target(written: str, target_rel: str, new_rel: str, new_source_rel: str) -> str:
+    if posixpath.normpath(unquote(written).lstrip("/")) == target_rel:
+        # Ссылка от корня хранилища остаётся ссылкой от корня
+        new = ("/" if written.startswith("/") else "") + new_rel
+    else:
+        new = posixpath.relpath(new_rel, posixpath.dirname(new_source_rel) or ".")
+    if "%" in written or (" " in new and " " not in written):
+        new = new.replace(" ", "%20")
+    return new
+
+
+def rewrite_note_links(content: str, graph, source_rel: str, new_source_rel: str, renamed: dict):
+    """Переписывает ссылки одной заметки; возвращает (новый текст, число правок).
+
+    Каждая ссылка разрешается по графу, собранному до переименований, и
+    ищется в словаре renamed (старый путь -> новый) — один проход по тексту
+    независимо от числа переименований.
+    """
+    parts = []
+    last = 0
+    count = 0
+    # iter_links выдаёт ссылки строки по видам (wikilink, затем markdown) — склеиваем по порядку в тексте
+    for link, start, end in sorted(iter_links(content), key=lambda item: item[1]):
+        if not link.target:
+            continue
+        target_rel = graph.target_of(source_rel, link)
+        if target_rel is None:
+            continue
+        new_rel = renamed.get(target_rel, target_rel)
+        raw = content[start:end]
+        written, sep, anchor = raw.partition("#")
+        if link.kind == MARKDOWN:
+            old_relpath = posixpath.relpath(target_rel, posixpath.dirname(source_rel) or ".")
+            new_relpath = posixpath.relpath(new_rel, posixpath.dirname(new_source_rel) or ".")
+            if new_rel == target_rel and old_relpath == new_relpath:
+                continue
+            new_target = _new_markdown_target(written, target_rel, new_rel, new_source_rel)
+        else:
+            relative = written.startswith(("./", "../"))
+            if new_rel == target_rel and not relative:
+                continue
+            if not relative and not _names_path(link.target, target_rel):
+                continue  # Разрешилась через alias — он переживает переименование
+            new_target = _new_wiki_target(written.strip(), new_rel, new_source_rel)
+        replacement = new_target + sep + anchor
+        if replacement == raw:
+            continue
+        parts.append(content[last:start])
+        parts.append(replacement)
+        last = end
+        count += 1
+    if not count:
+        return content, 0
+    parts.append(content[last:])
+    return "".join(parts), count
+
+
+def rewrite_links(graph, renamed_paths, dry_run: bool, reporter: Reporter = TEXT, journal: MoveJournal | None = None):
+    """Обновляет ссылки на переименованные файлы.
+
+    Вызывается до переименований: graph собран по старым путям, заметки
+    читаются и пишутся на старом месте, а ссылки в них сразу указывают на
+    новые пути. Читаются только заметки, которые ссылаются на переименованные
+    файлы (обратные ссылки графа), и сами переносимые заметки — у них могут
+    сломаться относительные ссылки. Исходные байты каждой заметки перед
+    записью сохраняются в журнал. Возвращает [(заметка по новому пути,
+    число исправленных ссылок)].
+    """
+    renamed = {_rel(src): _rel(dst) for src, dst in renamed_paths}
+    sources = set()
+    for src, _ in renamed_paths:
+        sources.update(graph.backlinks(src))
+        if src.suffix == ".md":
+            sources.add(src)
+
+    updated = []
+    with NoteWriter() as writer:
+        for source in sorted(sources):
+            source_rel = _rel(source)
+            new_source_rel = renamed.get(source_rel, source_rel)
+            try:
+                # Байты без преобразования переводов строк: CRLF-заметка остаётся CRLF
+                data = source.read_bytes()
+                content = data.decode("utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Ошибка чтения {source}: {e}")
+                continue
+            new_content, count = rewrite_note_links(content, graph, source_rel, new_source_rel, renamed)
+            if not count:
+                continue
+            reporter.emit("links_updated", path=ROOT / new_source_rel, links=count, dry_run=dry_run)
+            if dry_run:
+                print(f"LINKS: {source} ({count})")
+            else:
+                if journal is not None:
+                    journal.keep_original(source_rel, data)
+                writer.write(source, new_content)
+            updated.append((ROOT / new_source_rel, count))
+    return updated
+
+
 def main():
+    global ROOT
     parser = argparse.ArgumentParser()
     parser.add_argument("--apply", action="store_true", help="Применить изменения (по умолчанию dry-run)")
     parser.add_argument("--dry-run", action="store_true", help="Только показать план (по умолчанию если --apply не указан)")
     parser.add_argument("--strip-suffix", action="store_true", help="Удалять суффиксы ' 2'/' 3' в именах")
+    parser.add_argument("--vault", type=Path, default=ROOT, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    journal_group = parser.add_mutually_exclusive_group()
+    journal_group.add_argument("--resume", action="store_true", help="Довести до конца прерванный прогон по журналу")
+    journal_group.add_argument("--rollback", action="store_true", help="Откатить прерванный прогон по журналу")
+    content_hash.add_arguments(parser)
+    vault_metrics.add_arguments(parser)
+    vault_report.add_arguments(parser)
     args = parser.parse_args()
+    ROOT = args.vault
+    reporter = Reporter.from_args("normalize_filenames", args)
+    with vault_metrics.instrument("normalize_filenames", args), reporter.session():
+        return _run(args, reporter)
+
 
+def _run(args, reporter: Reporter) -> int:
     dry_run = not args.apply or args.dry_run
+    journal_path = ROOT / JOURNAL_NAME
+
+    if args.resume or args.rollback:
+        if not journal_path.exists():
+            print("✅ Прерванных прогонов нет")
+            reporter.emit("summary", planned=0)
+            return 0
+        try:
+            journal = MoveJournal.load()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Не удалось прочитать журнал {journal_path}: {e}")
+            return 1
+        if args.rollback:
+            return _rollback(journal, reporter)
+        print(f"🔁 Продолжаем прерванный прогон: {len(journal.plan.moves)} шагов")
+        return _apply(journal, reporter, resume=True)
+
+    if not dry_run and journal_path.exists():
+        print(f"⚠️ Найден журнал прерванного прогона {journal_path}")
+        print("   Продолжите его (--resume) или откатите (--rollback)")
+        return 1
 
-    moves = plan_normalization(strip_suffix=args.strip_suffix)
-    if not moves:
+    digests = DigestCache("md5")
+    with stage("walk"):
+        plan = plan_normalization(
+            strip_suffix=args.strip_suffix, digests=digests, workers=args.hash_workers, read_ahead=args.read_ahead
+        )
+    if not plan.moves:
         print("✅ Нечего нормализовать")
+        reporter.emit("summary", planned=0)
         return 0
 
-    print(f"🔧 Нашлось к нормализации: {len(moves)} путей")
-    performed, conflicts = apply_moves(moves, dry_run=dry_run)
+    print(f"🔧 Нашлось к нормализации: {len(plan.moves)} путей (файлов с новым путём: {len(plan.renamed)})")
+    # Граф ссылок нужен по старым путям — до переименований
+    graph = build_graph(ROOT)
 
     if dry_run:
+        for src, dst, kind in plan.moves:
+            reporter.emit("planned_move", src=src, dst=dst, type=kind)
+        for _ in iter_moves(plan.moves, dry_run=True):
+            pass
+        updated = rewrite_links(graph, plan.renamed, dry_run=True, reporter=reporter)
+        links = sum(n for _, n in updated)
+        reporter.emit("summary", dry_run=True, planned=len(plan.moves), links=links, notes=len(updated))
         print("\nℹ️  Это dry-run. Добавьте --apply для применения.")
         return 0
 
-    print(f"\n✅ Выполнено: {len(performed)}")
+    journal = MoveJournal.start(plan)
+    return _apply(journal, reporter, graph=graph, digests=digests)
+
+
+def _apply(journal: MoveJournal, reporter: Reporter, graph=None, digests: DigestCache | None = None,
+           resume: bool = False) -> int:
+    """Правит ссылки, затем переносит пути; оба этапа отмечаются в журнале.
+
+    Ссылки переписываются первыми, пока граф соответствует файлам на диске.
+    При повторе после прерывания уже исправленные ссылки указывают на новые
+    пути и второй раз не меняются.
+    """
+    plan = journal.plan
+    updated = []
+    if not journal.moving:
+        if graph is None:
+            graph = build_graph(ROOT)
+        updated = rewrite_links(graph, plan.renamed, dry_run=False, reporter=reporter, journal=journal)
+        journal.start_moves()
+
+    performed = 0
+    conflicts = 0
+    errors = 0
+    shown_conflicts = []  # в текстовом отчёте — только первые SHOWN_CONFLICTS
+    for src, dst, action, conflict in iter_moves(plan.moves, False, digests, journal, resume):
+        if conflict:
+            reporter.emit("conflict", src=src, dst=dst, reason=action)
+            conflicts += 1
+            if action.startswith(ERROR_ACTIONS):
+                errors += 1
+            if len(shown_conflicts) < SHOWN_CONFLICTS:
+                shown_conflicts.append((src, dst, action))
+            continue
+        reporter.emit("move", src=src, dst=dst, action=action)
+        performed += 1
+    if errors:
+        journal.close()
+    else:
+        journal.finish()
+    links = sum(n for _, n in updated)
+
+    reporter.emit("summary", dry_run=False, performed=performed, conflicts=conflicts, links=links, notes=len(updated))
+    print(f"\n✅ Выполнено: {performed}")
+    if updated:
+        print(f"🔗 Обновлено ссылок: {links} в {len(updated)} заметках")
     if conflicts:
-        print(f"⚠️ Конфликтов/ошибок: {len(conflicts)}")
-        for src, dst, reason in conflicts[:20]:
+        print(f"⚠️ Конфликтов/ошибок: {conflicts}")
+        for src, dst, reason in shown_conflicts:
             print(f"  {src} -> {dst} : {reason}")
-        if len(conflicts) > 20:
-            print(f"  ... и ещё {len(conflicts)-20}")
+        if conflicts > len(shown_conflicts):
+            print(f"  ... и ещё {conflicts - len(shown_conflicts)}")
+        if errors:
+            print(f"⚠️ Журнал сохранён в {journal.path}: ссылки на непереименованные пути уже переписаны.")
+            print("   Устраните ошибки и запустите --resume или откатите всё через --rollback")
         return 1
 
     return 0
 
 
+def _rollback(journal: MoveJournal, reporter: Reporter) -> int:
+    """Отменяет выполненные шаги в обратном порядке и возвращает заметкам исходные байты."""
+    plan = journal.plan
+    steps = sorted(journal.done.items(), reverse=True)
+    # Шаг, на котором прогон прервался, мог выполниться, не попав в журнал
+    pending = journal.last + 1
+    if journal.moving and pending < len(plan.moves) and pending not in journal.done:
+        src, dst, kind = plan.moves[pending]
+        if kind == MERGE_DIR and not os.path.lexists(src):
+            steps.insert(0, (pending, "removed-empty-dir"))
+        elif kind != MERGE_DIR and not os.path.lexists(src) and os.path.lexists(dst):
+            steps.insert(0, (pending, ALREADY_MOVED))
+
+    undone = 0
+    errors = 0
+    for i, action in steps:
+        src, dst, kind = plan.moves[i]
+        try:
+            if action == "removed-empty-dir":
+                src.mkdir(exist_ok=True)
+            elif action == "deleted-duplicate" or (action == ALREADY_MOVED and kind == MERGE_FILE):
+                # Копия, а не перенос: перенесён файл или слит дубликат, уже не различить
+                if not os.path.lexists(src):
+                    shutil.copy2(dst, src)
+            else:
+                dst.rename(src)
+        except OSError as e:
+            print(f"❌ Не удалось вернуть {dst} -> {src}: {e}")
+            errors += 1
+            continue
+        reporter.emit("rollback", src=src, dst=dst, action=action)
+        undone += 1
+
+    restored = 0
+    with NoteWriter() as writer:
+        for note_rel, original in journal.originals.items():
+            try:
+                if writer.write(ROOT / note_rel, original):
+                    restored += 1
+            except OSError as e:
+                print(f"❌ Не удалось восстановить {note_rel}: {e}")
+                errors += 1
+
+    reporter.emit("summary", rollback=True, undone=undone, notes=restored, errors=errors)
+    print(f"\n↩️ Отменено шагов: {undone}, восстановлено заметок: {restored}")
+    if errors:
+        journal.close()
+        print(f"⚠️ Ошибок: {errors}; журнал сохранён в {journal.path}, откат можно повторить")
+        return 1
+    journal.finish()
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -1,172 +1,211 @@
 #!/usr/bin/env python3
-import os
+import argparse
 import re
 from pathlib import Path
 
+import vault_metrics
+import vault_report
+from vault_frontmatter import dump_frontmatter, parse_frontmatter, parse_header, render_header, rewrite_header
+from vault_index import VaultIndex, make_record
+from vault_metrics import stage
+from vault_report import TEXT, Reporter
+from vault_scan import scan_vault
+from vault_writer import NoteWriter
+
+TOOL_NAME = "standardize_frontmatter"
+
 def parse_simple_yaml(text):
-    """Простой парсер YAML для базовых структур"""
-    result = {}
-    for line in text.split('\n'):
-        line = line.strip()
-        if ': ' in line:
-            key, value = line.split(': ', 1)
-            key = key.strip()
-            value = value.strip().strip('"\'')
-            result[key] = value
-    return result
+    """Разбирает текст фронтматтера в dict (списки — list, скаляры — str)"""
+    return parse_frontmatter(text).to_dict()
 
 def generate_simple_yaml(data):
-    """Простой генератор YAML"""
-    lines = []
-    for key, value in data.items():
-        if isinstance(value, list):
-            lines.append(f"{key}: [{', '.join(f'\"{v}\"' for v in value)}]")
-        else:
-            lines.append(f"{key}: \"{value}\"")
-    return '\n'.join(lines)
-
-def standardize_frontmatter():
-    """Стандартизирует фронтматтер во всех .md файлах"""
-
-    # Шаблоны фронтматтера для разных типов контента
-    templates = {
-        'thread': {
-            'type': 'thread',
-            'topics': [],
-            'status': 'draft',
-            'summary': ''
-        },
-        'example': {
-            'type': 'example',
-            'topics': [],
-            'level': 'intermediate',
-            'platforms': ['iOS'],
-            'ios_min': '15.0',
-            'status': 'draft',
-            'tags': []
-        },
-        'topic': {
-            'type': 'topic',
-            'topics': [],
-            'status': 'draft'
-        },
-        'guide': {
-            'type': 'guide',
-            'topics': [],
-            'status': 'draft',
-            'level': 'intermediate'
-        },
-        'index': {
-            'type': 'index',
-            'topics': [],
-            'status': 'draft'
-        },
-        'antipattern': {
-            'type': 'antipattern',
-            'topics': [],
-            'status': 'draft',
-            'severity': 'medium'
-        },
-        'playbook': {
-            'type': 'playbook',
-            'topics': [],
-            'status': 'draft',
-            'duration': '30m'
-        }
+    """Генерирует фронтматтер из dict с экранированием кавычек"""
+    return dump_frontmatter(data).rstrip('\n')
+
+# Шаблоны фронтматтера для разных типов контента
+TEMPLATES = {
+    'thread': {
+        'type': 'thread',
+        'topics': [],
+        'status': 'draft',
+        'summary': ''
+    },
+    'example': {
+        'type': 'example',
+        'topics': [],
+        'level': 'intermediate',
+        'platforms': ['iOS'],
+        'ios_min': '15.0',
+        'status': 'draft',
+        'tags': []
+    },
+    'topic': {
+        'type': 'topic',
+        'topics': [],
+        'status': 'draft'
+    },
+    'guide': {
+        'type': 'guide',
+        'topics': [],
+        'status': 'draft',
+        'level': 'intermediate'
+    },
+    'index': {
+        'type': 'index',
+        'topics': [],
+        'status': 'draft'
+    },
+    'antipattern': {
+        'type': 'antipattern',
+        'topics': [],
+        'status': 'draft',
+        'severity': 'medium'
+    },
+    'playbook': {
+        'type': 'playbook',
+        'topics': [],
+        'status': 'draft',
+        'duration': '30m'
     }
-
+}
+
+def detect_type(frontmatter, md_file):
+    """Тип контента из фронтматтера, а если он не распознан — по папкам пути"""
+    file_type = frontmatter.get('type', 'thread')
+    if file_type in TEMPLATES:
+        return file_type
+    for folder in md_file.parts:
+        if folder in ['Examples', 'Примеры']:
+            return 'example'
+        elif folder in ['Antipatterns', 'Антипаттерны']:
+            return 'antipattern'
+        elif folder in ['Playbooks', 'Плейбуки']:
+            return 'playbook'
+    return 'thread'  # По умолчанию
+
+def path_topics(md_file, root):
+    """Топики из папок пути заметки относительно корня хранилища"""
+    try:
+        folders = md_file.relative_to(root).parts[:-1]
+    except ValueError:
+        folders = md_file.parts[:-1]
+    topics = []
+    for part in folders:
+        if part not in ['iOS', 'General', 'Templates', 'Examples', 'Antipatterns', 'Playbooks']:
+            # Очистить от специальных символов и номеров
+            clean_part = re.sub(r'[0-9()«»""'']', '', part).strip()
+            if clean_part and len(clean_part) > 2:
+                topics.append(clean_part)
+    return topics[:3]  # Максимум 3 топика
+
+def apply_template(frontmatter, md_file, root):
+    """Дополняет фронтматтер полями шаблона, не трогая существующие значения и прочие ключи"""
+    template = TEMPLATES[detect_type(frontmatter, md_file)]
+
+    # Недостающие поля берём из шаблона, существующие значения сохраняем
+    for key, default in template.items():
+        if frontmatter[key] is None:
+            frontmatter[key] = list(default) if isinstance(default, list) else default
+
+    # Специальная обработка для топиков
+    if not frontmatter.get('topics'):
+        topics = path_topics(md_file, root)
+        if topics:
+            frontmatter['topics'] = topics
+
+    # Добавить title если отсутствует
+    if not frontmatter.get('title'):
+        frontmatter['title'] = md_file.stem
+
+def standardize_frontmatter(full=False, durable=False, root=None, entries=None, index=None, cache=None, reporter=TEXT):
+    """Стандартизирует фронтматтер во всех .md файлах
+
+    Заметки, не изменившиеся с прошлого прогона, пропускаются по индексу
+    (vault_index.py), если не передан full=True. Файл перезаписывается, только
+    если фронтматтер действительно изменился; durable=True — fsync после
+    каждого файла вместо общего в конце.
+
+    entries, index и cache передаёт complete_maintenance, чтобы шаги делили
+    один обход и разобранные заметки; переданный индекс сохраняет вызывающий.
+    reporter (vault_report.Reporter) получает каждую обновлённую или
+    пропущенную заметку.
+    """
     # Пройтись по всем .md файлам
-    obsidian_root = Path("/Users/kirilltitov/Documents/Obsidian Vault")
-
-    for md_file in obsidian_root.rglob("*.md"):
-        # Пропустить шаблоны и файлы в Templates
-        if "Templates" in md_file.parts or md_file.name.startswith("Thread.md"):
+    obsidian_root = root or Path("/Users/kirilltitov/Documents/Obsidian Vault")
+
+    owns_index = index is None
+    if owns_index:
+        index = VaultIndex.load(obsidian_root)
+
+    # Templates, backups и .git отсекаются при обходе
+    if entries is None:
+        entries = scan_vault(obsidian_root)
+    writer = NoteWriter(durable=durable)
+    for entry in entries:
+        md_file = entry.path
+        if md_file.name.startswith("Thread.md"):
+            continue
+        if not full and index.is_fresh(md_file, entry.stat, TOOL_NAME):
             continue
 
         try:
-            with open(md_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # С диска читается только заголовок, тело переносится при записи как есть
+            if cache is not None:
+                frontmatter, header = cache.header(md_file, entry.stat)
+            else:
+                frontmatter, header = parse_header(md_file)
 
             # Проверить, есть ли фронтматтер
-            if not content.startswith('---'):
+            if not header.has_opening:
+                reporter.emit("skipped", path=md_file, reason="no-frontmatter")
                 print(f"Пропускаем {md_file} - нет фронтматтера")
+                index.update(make_record(md_file, None, None), TOOL_NAME)
                 continue
 
-            # Извлечь фронтматтер
-            frontmatter_match = re.match(r'^---\n(.*?)\n---\n', content, re.DOTALL)
-            if not frontmatter_match:
+            if frontmatter is None:
+                reporter.emit("skipped", path=md_file, reason="invalid-frontmatter")
                 print(f"Пропускаем {md_file} - неправильный формат фронтматтера")
+                index.update(make_record(md_file, None, None), TOOL_NAME)
                 continue
 
-            frontmatter_text = frontmatter_match.group(1)
-            body = content[frontmatter_match.end():]
-
-            # Парсить фронтматтер
-            try:
-                frontmatter = parse_simple_yaml(frontmatter_text)
-                if not frontmatter:
-                    frontmatter = {}
-            except:
-                print(f"Ошибка парсинга фронтматтера в {md_file}")
-                continue
-
-            # Определить тип контента по пути файла или существующему типу
-            file_type = frontmatter.get('type', 'thread')
-
-            # Если тип не распознан, попробовать определить по пути
-            if file_type not in templates:
-                for folder in md_file.parts:
-                    if folder in ['Examples', 'Примеры']:
-                        file_type = 'example'
-                        break
-                    elif folder in ['Antipatterns', 'Антипаттерны']:
-                        file_type = 'antipattern'
-                        break
-                    elif folder in ['Playbooks', 'Плейбуки']:
-                        file_type = 'playbook'
-                        break
-                else:
-                    file_type = 'thread'  # По умолчанию
-
             # Стандартизировать фронтматтер
-            template = templates.get(file_type, templates['thread']).copy()
-
-            # Сохранить существующие значения, если они есть
-            for key in template:
-                if key in frontmatter:
-                    template[key] = frontmatter[key]
-
-            # Специальная обработка для топиков
-            if not template.get('topics'):
-                # Попытаться извлечь топики из пути файла
-                path_topics = []
-                for part in md_file.parts:
-                    if part not in ['iOS', 'General', 'Templates', 'Examples', 'Antipatterns', 'Playbooks']:
-                        # Очистить от специальных символов и номеров
-                        clean_part = re.sub(r'[0-9()«»""'']', '', part).strip()
-                        if clean_part and len(clean_part) > 2:
-                            path_topics.append(clean_part)
-
-                if path_topics:
-                    template['topics'] = path_topics[:3]  # Максимум 3 топика
-
-            # Добавить title если отсутствует
-            if not template.get('title'):
-                template['title'] = md_file.stem
-
-            # Создать новый фронтматтер
-            new_frontmatter = generate_simple_yaml(template)
-
-            # Обновить файл
-            new_content = f"---\n{new_frontmatter}\n---\n{body}"
-
-            with open(md_file, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            with stage("clean"):
+                apply_template(frontmatter, md_file, obsidian_root)
+
+                # Обновить файл: неизменённые строки фронтматтера сохраняются как есть
+                new_header = render_header(frontmatter, has_body=header.size > header.body_offset)
+            if new_header == header.text:
+                writer.skip()
+                index.update(make_record(md_file, None, frontmatter.to_dict()), TOOL_NAME)
+                continue
+            digest = rewrite_header(md_file, new_header, header.body_offset, writer=writer,
+                                    newline=header.newline)
+            if cache is not None:
+                cache.forget(md_file)
+            index.update(make_record(md_file, None, frontmatter.to_dict(), content_hash=digest), TOOL_NAME)
 
+            reporter.emit("updated", path=md_file, type=frontmatter.get('type'))
             print(f"Обновлен фронтматтер в {md_file}")
 
         except Exception as e:
+            reporter.emit("error", path=md_file, error=str(e))
             print(f"Ошибка обработки {md_file}: {e}")
 
+    writer.sync()
+    if owns_index:
+        index.prune(e.path for e in entries)
+        index.save()
+    reporter.emit("summary", updated=writer.written, unchanged=writer.skipped)
+    print(f"Обновлено: {writer.written}, без изменений: {writer.skipped}")
+
 if __name__ == "__main__":
-    standardize_frontmatter()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="Обработать все файлы, игнорируя индекс изменений")
+    parser.add_argument("--durable", action="store_true", help="fsync после каждого файла вместо общего fsync в конце прогона")
+    parser.add_argument("--vault", type=Path, default=None, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    vault_metrics.add_arguments(parser)
+    vault_report.add_arguments(parser)
+    args = parser.parse_args()
+    reporter = Reporter.from_args(TOOL_NAME, args)
+    with vault_metrics.instrument(TOOL_NAME, args), reporter.session():
+        standardize_frontmatter(full=args.full, durable=args.durable, root=args.vault, reporter=reporter)
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Каталог хранилища в SQLite: фронтматтер и полнотекстовый поиск (FTS5).
+
+Каталог необязателен: он создаётся первой командой ``update`` и дальше
+обновляется инкрементально — перечитываются только заметки, у которых
+изменились (mtime_ns, size), удалённые заметки вычищаются. Фронтматтер
+разбирается тем же vault_frontmatter.parse_note, что и у остальных скриптов.
+
+Запросы идут по индексам базы, без обхода хранилища:
+- ``notes`` — заметка, её штамп и фронтматтер в JSON;
+- ``fields`` — пары (ключ, значение) фронтматтера, элементы списков
+  (topics, tags, platforms) — отдельными строками; значения сравниваются
+  без учёта регистра;
+- ``notes_fts`` — FTS5-индекс по заголовку и телу заметки.
+
+Использование:
+    python3 vault_catalog.py update [--full]
+    python3 vault_catalog.py query --text "actor reentrancy"
+    python3 vault_catalog.py query --type guide --status draft
+    python3 vault_catalog.py query --topic concurrency --tag swift --field level=advanced
+
+Каталог лежит в корне хранилища в файле ``.vault_catalog.sqlite``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import vault_metrics
+import vault_report
+from vault_frontmatter import parse_note
+from vault_metrics import incr, stage
+from vault_report import TEXT, Reporter
+from vault_scan import ScanEntry, scan_vault
+
+
+VAULT_PATH = Path("/Users/kirilltitov/Documents/Obsidian Vault")
+CATALOG_FILENAME = ".vault_catalog.sqlite"
+# Хранится в PRAGMA user_version; другая версия — каталог пересоздаётся
+CATALOG_VERSION = 1
+DEFAULT_LIMIT = 50
+
+_SCHEMA = """
+CREATE TABLE notes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    title TEXT,
+    frontmatter TEXT
+);
+CREATE TABLE fields (
+    note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    norm TEXT NOT NULL
+);
+CREATE INDEX fields_lookup ON fields(key, norm, note_id);
+CREATE INDEX fields_note ON fields(note_id);
+CREATE VIRTUAL TABLE notes_fts USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+
+class CatalogHit(NamedTuple):
+    path: str
+    title: Optional[str]
+    frontmatter: Dict[str, Any]
+    snippet: Optional[str]      # фрагмент с совпадением (только для полнотекстового поиска)
+
+
+def fts5_available() -> bool:
+    """Собран ли sqlite3 этого Python с FTS5."""
+    try:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def normalize_value(value: str) -> str:
+    """Ключ сравнения значений фронтматтера: NFC, без учёта регистра и крайних пробелов."""
+    return unicodedata.normalize("NFC", value).strip().casefold()
+
+
+def fts_query(text: str) -> str:
+    """Превращает строку поиска в запрос FTS5: все слова должны встретиться.
+
+    Слова берутся в кавычки, поэтому ``async/await`` или ``C++`` не ломают
+    синтаксис FTS5; ``слово*`` остаётся поиском по префиксу.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*") and len(word) > 1
+        if prefix:
+            word = word[:-1]
+        term = '"' + word.replace('"', '""') + '"'
+        terms.append(term + "*" if prefix else term)
+    return " ".join(terms)
+
+
+def _field_rows(frontmatter: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
+    for key, value in frontmatter.items():
+        values = value if isinstance(value, list) else [value]
+        for item in values:
+            if item is None:
+                continue
+            item = str(item)
+            if item.strip():
+                yield key, item
+
+
+class VaultCatalog:
+    """Соединение с каталогом одного хранилища.
+
+    Использование::
+
+        with VaultCatalog.open(root) as catalog:
+            catalog.update(scan_vault(root))
+            hits = catalog.query(fields={"type": ["guide"]}, text="actor reentrancy")
+    """
+
+    def __init__(self, root: Path, conn: sqlite3.Connection):
+        self.root = root
+        self.conn = conn
+
+    @classmethod
+    def open(cls, root: Path, catalog_path: Optional[Path] = None) -> "VaultCatalog":
+        """Открывает (или создаёт) каталог; при другой версии схемы пересоздаёт его."""
+        catalog_path = catalog_path or root / CATALOG_FILENAME
+        conn = sqlite3.connect(catalog_path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CATALOG_VERSION:
+            with conn:
+                for (name,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                    " AND name NOT LIKE 'notes_fts_%'"
+                ).fetchall():
+                    conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+                conn.executescript(_SCHEMA)
+                conn.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        return cls(root, conn)
+
+    def __enter__(self) -> "VaultCatalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def key(self, path: Path | str) -> str:
+        p = Path(path)
+        try:
+            return p.relative_to(self.root).as_posix()
+        except ValueError:
+            return p.as_posix()
+
+    # --- Обновление ---------------------------------------------------------
+
+    def _stamps(self) -> Dict[str, Tuple[int, int, int]]:
+        return {
+            path: (note_id, mtime_ns, size)
+            for note_id, path, mtime_ns, size in self.conn.execute("SELECT id, path, mtime_ns, size FROM notes")
+        }
+
+    def _delete(self, note_id: int) -> None:
+        self.conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+        self.conn.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+
+    def upsert(self, path: Path, st: os.stat_result, content: str) -> None:
+        """Записывает (или заменяет) заметку по её уже прочитанному тексту."""
+        key = self.key(path)
+        row = self.conn.execute("SELECT id FROM notes WHERE path = ?", (key,)).fetchone()
+        if row is not None:
+            self._delete(row[0])
+        with stage("parse"):
+            fm, body = parse_note(content)
+        frontmatter = fm.to_dict() if fm is not None else {}
+        title = frontmatter.get("title")
+        title = title if isinstance(title, str) else None
+        cur = self.conn.execute(
+            "INSERT INTO notes (path, mtime_ns, size, title, frontmatter) VALUES (?, ?, ?, ?, ?)",
+            (key, st.st_mtime_ns, st.st_size, title,
+             json.dumps(frontmatter, ensure_ascii=False) if fm is not None else None),
+        )
+        note_id = cur.lastrowid
+        self.conn.executemany(
+            "INSERT INTO fields (note_id, key, value, norm) VALUES (?, ?, ?, ?)",
+            [(note_id, k, v, normalize_value(v)) for k, v in _field_rows(frontmatter)],
+        )
+        self.conn.execute(
+            "INSERT INTO notes_fts (rowid, title, body) VALUES (?, ?, ?)",
+            (note_id, title or Path(key).stem, body),
+        )
+
+    def remove(self, path: Path | str) -> bool:
+        """Удаляет заметку из каталога. Возвращает True, если она там была."""
+        row = self.conn.execute("SELECT id FROM notes WHERE path = ?", (self.key(path),)).fetchone()
+        if row is None:
+            return False
+        self._delete(row[0])
+        return True
+
+    def update(self, entries: Sequence[ScanEntry], full: bool = False, cache=None) -> Tuple[int, int]:
+        """Приводит каталог к entries одной транзакцией. Возвращает (обновлено, удалено).
+
+        Перечитываются только заметки с новыми (mtime_ns, size); cache — общий
+        vault_frontmatter.NoteCache прогона, если заметки уже читались.
+        """
+        stamps = self._stamps()
+        updated = 0
+        seen = set()
+        with self.conn:
+            for entry in entries:
+                key = self.key(entry.path)
+                seen.add(key)
+                old = stamps.get(key)
+                if not full and old is not None and old[1:] == (entry.stat.st_mtime_ns, entry.stat.st_size):
+                    continue
+                try:
+                    if cache is not None:
+                        content = cache.text(entry.path, entry.stat)
+                    else:
+                        with stage("read"), open(entry.path, "r", encoding="utf-8") as f:
+                            content = f.read()
+                        incr("bytes_read", entry.stat.st_size)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Ошибка чтения {entry.path}: {e}")
+                    continue
+                self.upsert(entry.path, entry.stat, content)
+                updated += 1
+            removed = [note_id for key, (note_id, _, _) in stamps.items() if key not in seen]
+            for note_id in removed:
+                self._delete(note_id)
+        return updated, len(removed)
+
+    # --- Запросы ------------------------------------------------------------
+
+    def query(
+        self,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+        text: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_LIMIT,
+    ) -> List[CatalogHit]:
+        """Заметки, подходящие под все условия сразу.
+
+        fields — {ключ: [значения]}: для каждого ключа нужно совпадение с любым
+        из значений (элементы списков topics/tags сравниваются поштучно).
+        text — полнотекстовый поиск (см. fts_query); результаты тогда
+        упорядочены по релевантности (bm25), иначе по пути.
+        """
+        return list(self.iter_query(fields, text, limit))
+
+    def iter_query(
+        self,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+        text: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_LIMIT,
+    ) -> Iterator[CatalogHit]:
+        """То же, что query, но строки читаются из курсора по одной."""
+        joins: List[str] = []
+        where: List[str] = []
+        params: List[Any] = []
+        for i, (key, values) in enumerate((fields or {}).items()):
+            values = [normalize_value(v) for v in values]
+            placeholders = ", ".join("?" * len(values))
+            where.append(
+                f"EXISTS (SELECT 1 FROM fields f{i} WHERE f{i}.note_id = n.id"
+                f" AND f{i}.key = ? AND f{i}.norm IN ({placeholders}))"
+            )
+            params.extend([key, *values])
+        if text:
+            joins.append("JOIN notes_fts ON notes_fts.rowid = n.id")
+            where.append("notes_fts MATCH ?")
+            params.append(fts_query(text))
+            snippet = "snippet(notes_fts, 1, '[', ']', '…', 12)"
+            order = "bm25(notes_fts)"
+        else:
+            snippet = "NULL"
+            order = "n.path"
+        sql = f"SELECT n.path, n.title, n.frontmatter, {snippet} FROM notes n {' '.join(joins)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for path, title, frontmatter, snip in self.conn.execute(sql, params):
+            yield CatalogHit(path, title, json.loads(frontmatter) if frontmatter else {}, snip)
+
+
+def update_catalog(root: Path, entries: Optional[List[ScanEntry]] = None, full: bool = False, cache=None,
+                   catalog_path: Optional[Path] = None, reporter: Reporter = TEXT) -> Tuple[int, int]:
+    """Открывает каталог, обновляет его и печатает итог. Возвращает (обновлено, удалено)."""
+    if entries is None:
+        entries = scan_vault(root)
+    with VaultCatalog.open(root, catalog_path) as catalog:
+        updated, removed = catalog.update(entries, full=full, cache=cache)
+        total = len(catalog)
+    reporter.emit("summary", notes=total, updated=updated, removed=removed)
+    print(f"🗂️ Каталог: заметок {total}, обновлено {updated}, удалено {removed}")
+    return updated, removed
+
+
+def _parse_field(text: str) -> Tuple[str, str]:
+    key, sep, value = text.partition("=")
+    if not sep or not key.strip():
+        raise argparse.ArgumentTypeError(f"ожидается КЛЮЧ=ЗНАЧЕНИЕ, получено {text!r}")
+    return key.strip(), value
+
+
+def main(argv=None, root=None) -> int:
+    parser = argparse.ArgumentParser(description="Каталог хранилища: поиск по фронтматтеру и полному тексту")
+    parser.add_argument("--vault", type=Path, default=VAULT_PATH, help="Корень хранилища (по умолчанию — рабочее хранилище)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = sub.add_parser("update", help="Обновить каталог по изменённым заметкам")
+    update_parser.add_argument("--full", action="store_true", help="Перечитать все заметки")
+
+    query_parser = sub.add_parser("query", help="Найти заметки в каталоге")
+    query_parser.add_argument("--text", help="Полнотекстовый поиск (все слова, 'слово*' — по префиксу)")
+    query_parser.add_argument("--type", action="append", default=[], help="Значение type (можно несколько)")
+    query_parser.add_argument("--status", action="append", default=[], help="Значение status (можно несколько)")
+    query_parser.add_argument("--topic", action="append", default=[], help="Тема из topics (можно несколько)")
+    query_parser.add_argument("--tag", action="append", default=[], help="Тег из tags (можно несколько)")
+    query_parser.add_argument("--field", action="append", default=[], type=_parse_field, metavar="КЛЮЧ=ЗНАЧЕНИЕ",
+                              help="Любой ключ фронтматтера (можно несколько)")
+    query_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Сколько заметок показать (0 — все)")
+    for subparser in (update_parser, query_parser):
+        vault_metrics.add_arguments(subparser)
+        vault_report.add_arguments(subparser)
+    args = parser.parse_args(argv)
+    tool = f"vault_catalog.{args.command}"
+    reporter = Reporter.from_args(tool, args)
+    with vault_metrics.instrument(tool, args), reporter.session():
+        return _run(args, root or args.vault, reporter)
+
+
+def _run(args, root: Path, reporter: Reporter) -> int:
+    if not fts5_available():
+        print("❌ sqlite3 этого Python собран без FTS5 — каталог недоступен")
+        return 1
+
+    if args.command == "update":
+        update_catalog(root, full=args.full, reporter=reporter)
+        return 0
+
+    catalog_path = root / CATALOG_FILENAME
+    if not catalog_path.exists():
+        print("❌ Каталог не найден: сначала выполните python3 vault_catalog.py update")
+        return 1
+
+    fields: Dict[str, List[str]] = {}
+    for key, values in (("type", args.type), ("status", args.status), ("topics", args.topic), ("tags", args.tag)):
+        if values:
+            fields.setdefault(key, []).extend(values)
+    for key, value in args.field:
+        fields.setdefault(key, []).append(value)
+
+    with VaultCatalog.open(root, catalog_path) as catalog:
+        if reporter.jsonl:
+            # Без --limit выдача может быть большой — пишем по мере чтения курсора
+            count = 0
+            try:
+                for hit in catalog.iter_query(fields, args.text, limit=args.limit or None):
+                    reporter.emit("hit", **hit._asdict())
+                    count += 1
+            except sqlite3.OperationalError as e:
+                print(f"❌ Ошибка запроса: {e}")
+                return 1
+            reporter.emit("summary", hits=count)
+            return 0
+        try:
+            hits = catalog.query(fields, args.text, limit=args.limit or None)
+        except sqlite3.OperationalError as e:
+            print(f"❌ Ошибка запроса: {e}")
+            return 1
+
+    print(f"🔍 Найдено заметок: {len(hits)}")
+    for hit in hits:
+        meta = ", ".join(f"{k}: {hit.frontmatter[k]}" for k in ("type", "status") if hit.frontmatter.get(k))
+        print(f"  {hit.path}" + (f" — {hit.title}" if hit.title else "") + (f" ({meta})" if meta else ""))
+        if hit.snippet:
+            print(f"      {' '.join(hit.snippet.split())}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
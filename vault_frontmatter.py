@@ -0,0 +1,666 @@
+#!/usr/bin/env python3
+"""
+Общий разбор и сериализация фронтматтера заметок.
+
+- Компактное типизированное представление: известные ключи
+  (type, topics, status, level, title, summary, platforms, ios_min, tags,
+  severity, duration) хранятся в __slots__, прочие — в ``extra``.
+- Быстрый разбор: ищется только закрывающий ``---``, тело заметки не
+  разбирается и не копируется построчно.
+- Поддерживаются однострочные значения, строки в кавычках (с экранированием),
+  inline-списки ``[a, "b"]``, блочные списки ``- item``, многострочные значения
+  и блочные скаляры ``|``/``>``.
+- Чтение с диска только заголовка (read_header/parse_header) со смещением
+  тела: тело можно дочитать лениво или перенести при перезаписи без
+  декодирования (rewrite_header).
+- Сериализация без потерь: неизменённые строки выводятся байт в байт, заново
+  рендерятся только изменённые ключи, новые ключи дописываются в конец.
+  Строки всегда экранируются, поэтому кавычки в значениях не ломают YAML.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from vault_metrics import incr, stage
+from vault_writer import NoteWriter, atomic_replace
+
+
+KNOWN_KEYS = (
+    "type",
+    "topics",
+    "status",
+    "level",
+    "title",
+    "summary",
+    "platforms",
+    "ios_min",
+    "tags",
+    "severity",
+    "duration",
+)
+LIST_KEYS = frozenset({"topics", "platforms", "tags"})
+
+FENCE = "---"
+# Дальше этого фронтматтер не ищется при чтении только заголовка
+HEADER_LIMIT = 64 * 1024
+# Тела больше этого размера переносятся при перезаписи через mmap
+MMAP_THRESHOLD = 256 * 1024
+
+_KEY_LINE_RE = re.compile(r"^([A-Za-z_][\w-]*)[ \t]*:(?:[ \t]+(.*?))?[ \t]*\r?\n?$")
+_BLOCK_SCALAR_RE = re.compile(r"^([|>])([+-]?)\d*[ \t]*(?:#.*)?$")
+_PLAIN_COMMENT_RE = re.compile(r"[ \t]+#.*$")
+_DQ_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "0": "\0",
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    " ": " ",
+}
+
+Value = Any  # str | List[str] | None
+
+
+# --- Скаляры ---------------------------------------------------------------
+
+def _read_double_quoted(text: str, start: int) -> Tuple[str, int]:
+    """Разбирает "..." начиная с кавычки в позиции start. Возвращает (значение, позиция после)."""
+    out: List[str] = []
+    i = start + 1
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "\\" and i + 1 < n:
+            nxt = text[i + 1]
+            if nxt == "u" and i + 6 <= n:
+                try:
+                    out.append(chr(int(text[i + 2:i + 6], 16)))
+                    i += 6
+                    continue
+                except ValueError:
+                    pass
+            out.append(_DQ_ESCAPES.get(nxt, "\\" + nxt))
+            i += 2
+            continue
+        if ch == '"':
+            return "".join(out), i + 1
+        out.append(ch)
+        i += 1
+    # Незакрытая кавычка — берём всё до конца
+    return "".join(out), n
+
+
+def _read_single_quoted(text: str, start: int) -> Tuple[str, int]:
+    out: List[str] = []
+    i = start + 1
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "'":
+            if i + 1 < n and text[i + 1] == "'":
+                out.append("'")
+                i += 2
+                continue
+            return "".join(out), i + 1
+        out.append(ch)
+        i += 1
+    return "".join(out), n
+
+
+def parse_scalar(text: str) -> str:
+    """Скаляр YAML как строка: кавычки снимаются, у plain-значений отрезается комментарий."""
+    text = text.strip()
+    if not text:
+        return ""
+    if text[0] == '"':
+        return _read_double_quoted(text, 0)[0]
+    if text[0] == "'":
+        return _read_single_quoted(text, 0)[0]
+    return _PLAIN_COMMENT_RE.sub("", text).strip()
+
+
+def _split_flow_items(inner: str) -> Iterator[str]:
+    """Делит содержимое [ ... ] по запятым вне кавычек."""
+    start = 0
+    i = 0
+    n = len(inner)
+    while i < n:
+        ch = inner[i]
+        if ch == '"':
+            i = _read_double_quoted(inner, i)[1]
+            continue
+        if ch == "'":
+            i = _read_single_quoted(inner, i)[1]
+            continue
+        if ch == ",":
+            yield inner[start:i]
+            start = i + 1
+        i += 1
+    yield inner[start:]
+
+
+def parse_flow_list(text: str) -> List[str]:
+    """Разбирает inline-список [a, "b", 'c'] в список строк."""
+    text = text.strip()
+    if text.startswith("["):
+        text = text[1:]
+    end = text.rfind("]")
+    if end != -1:
+        text = text[:end]
+    items = []
+    for raw in _split_flow_items(text):
+        if raw.strip():
+            items.append(parse_scalar(raw))
+    return items
+
+
+def quote(value: str) -> str:
+    """Строка в двойных кавычках с экранированием (безопасна для любого содержимого)."""
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+def render_value(value: Value) -> str:
+    """Значение в стиле хранилища: строки в кавычках, списки inline."""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(quote(str(v)) for v in value) + "]"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return quote(str(value))
+
+
+# --- Сегменты фронтматтера -----------------------------------------------
+
+class _Segment:
+    __slots__ = ("key", "lines")
+
+    def __init__(self, key: Optional[str], lines: List[str]):
+        self.key = key
+        self.lines = lines
+
+
+def _strip_eol(line: str) -> str:
+    if line.endswith("\n"):
+        line = line[:-1]
+    if line.endswith("\r"):
+        line = line[:-1]
+    return line
+
+
+def _is_continuation(line: str, head_empty: bool, block_scalar: bool) -> bool:
+    if not line.strip():
+        return block_scalar
+    if line[0] in " \t":
+        return True
+    # Блочный список может начинаться с колонки 0, но только после "key:"
+    return head_empty and (line.startswith("- ") or _strip_eol(line) == "-")
+
+
+def _segment_lines(lines: List[str]) -> List[_Segment]:
+    segments: List[_Segment] = []
+    current: Optional[_Segment] = None
+    head_empty = False
+    block_scalar = False
+    for line in lines:
+        m = _KEY_LINE_RE.match(line)
+        if m and line[0] not in " \t":
+            current = _Segment(m.group(1), [line])
+            segments.append(current)
+            value = m.group(2) or ""
+            head_empty = not value
+            block_scalar = bool(_BLOCK_SCALAR_RE.match(value))
+            continue
+        if current is not None and _is_continuation(line, head_empty, block_scalar):
+            current.lines.append(line)
+            continue
+        # Комментарии, пустые строки и мусор сохраняются как есть
+        current = None
+        block_scalar = False
+        segments.append(_Segment(None, [line]))
+    return segments
+
+
+def _dedent(lines: List[str]) -> List[str]:
+    stripped = [_strip_eol(l) for l in lines]
+    indents = [len(l) - len(l.lstrip(" \t")) for l in stripped if l.strip()]
+    cut = min(indents) if indents else 0
+    return [l[cut:] for l in stripped]
+
+
+def _parse_segment(segment: _Segment) -> Value:
+    m = _KEY_LINE_RE.match(segment.lines[0])
+    head = (m.group(2) or "").strip() if m else ""
+    rest = segment.lines[1:]
+
+    block = _BLOCK_SCALAR_RE.match(head)
+    if block:
+        style, chomp = block.groups()
+        body = _dedent(rest)
+        while body and not body[-1].strip():
+            body.pop()
+        if style == "|":
+            text = "\n".join(body)
+        else:
+            text = " ".join(l.strip() if l.strip() else "\n" for l in body).replace(" \n ", "\n")
+        return text if chomp == "-" or not text else text + "\n"
+
+    if not head:
+        if not rest:
+            return None
+        items = [_strip_eol(l).strip() for l in rest if l.strip()]
+        if all(item == "-" or item.startswith("- ") for item in items):
+            return [parse_scalar(item[1:]) for item in items]
+        return " ".join(parse_scalar(item) for item in items)
+
+    # Многострочные значения продолжаются на отступленных строках
+    if rest:
+        head = " ".join([head] + [_strip_eol(l).strip() for l in rest if l.strip()])
+
+    if head.startswith("["):
+        return parse_flow_list(head)
+    return parse_scalar(head)
+
+
+# --- Представление ---------------------------------------------------------
+
+class Frontmatter:
+    """Разобранный фронтматтер одной заметки.
+
+    Известные ключи доступны как атрибуты (``fm.title``, ``fm.topics``), прочие —
+    через ``fm.extra`` или ``fm[key]``. None означает отсутствие ключа:
+    присваивание None удаляет ключ при сериализации.
+    """
+
+    __slots__ = KNOWN_KEYS + ("extra", "_segments", "_original", "_fences")
+
+    type: Optional[str]
+    topics: Optional[List[str]]
+    status: Optional[str]
+    level: Optional[str]
+    title: Optional[str]
+    summary: Optional[str]
+    platforms: Optional[List[str]]
+    ios_min: Optional[str]
+    tags: Optional[List[str]]
+    severity: Optional[str]
+    duration: Optional[str]
+    extra: Dict[str, Value]
+
+    def __init__(self):
+        for key in KNOWN_KEYS:
+            setattr(self, key, None)
+        self.extra = {}
+        self._segments: List[_Segment] = []
+        self._original: Dict[str, Value] = {}
+        self._fences: Tuple[str, str] = (FENCE + "\n", FENCE + "\n")
+
+    # Доступ по ключу
+    def __getitem__(self, key: str) -> Value:
+        if key in KNOWN_KEYS:
+            return getattr(self, key)
+        return self.extra.get(key)
+
+    def __setitem__(self, key: str, value: Value) -> None:
+        if key in KNOWN_KEYS:
+            setattr(self, key, value)
+        elif value is None:
+            self.extra.pop(key, None)
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self[key] is not None
+
+    def get(self, key: str, default: Value = None) -> Value:
+        value = self[key]
+        return default if value is None else value
+
+    def keys(self) -> List[str]:
+        """Присутствующие ключи: сначала в исходном порядке, затем новые."""
+        seen: List[str] = []
+        for seg in self._segments:
+            if seg.key is not None and seg.key not in seen and self[seg.key] is not None:
+                seen.append(seg.key)
+        for key in list(KNOWN_KEYS) + list(self.extra):
+            if key not in seen and self[key] is not None:
+                seen.append(key)
+        return seen
+
+    def to_dict(self) -> Dict[str, Value]:
+        """Простой dict (JSON-совместимый) для индексов и отчётов."""
+        return {key: self[key] for key in self.keys()}
+
+    def is_modified(self) -> bool:
+        current = self.to_dict()
+        original = {k: v for k, v in self._original.items() if v is not None}
+        return current != original
+
+    def dump(self) -> str:
+        """Текст фронтматтера между разделителями (без самих ``---``).
+
+        Без изменений возвращает исходный текст байт в байт.
+        """
+        out: List[str] = []
+        rendered = set()
+        for seg in self._segments:
+            key = seg.key
+            if key is None:
+                out.append("".join(seg.lines))
+                continue
+            value = self[key]
+            if key in rendered:
+                # Повторный ключ: оставляем как был, если значение не трогали
+                if value == self._original.get(key):
+                    out.append("".join(seg.lines))
+                continue
+            rendered.add(key)
+            if value == self._original.get(key):
+                out.append("".join(seg.lines))
+            elif value is not None:
+                out.append(f"{key}: {render_value(value)}\n")
+
+        appended = [
+            f"{key}: {render_value(self[key])}\n"
+            for key in self.keys()
+            if key not in rendered
+        ]
+        if appended and out and not out[-1].endswith("\n"):
+            out[-1] += "\n"
+        out.extend(appended)
+        return "".join(out)
+
+
+def parse_frontmatter(text: str) -> Frontmatter:
+    """Разбирает текст фронтматтера (без разделителей ``---``)."""
+    fm = Frontmatter()
+    fm._segments = _segment_lines(text.splitlines(keepends=True))
+    for seg in fm._segments:
+        if seg.key is None:
+            continue
+        value = _parse_segment(seg)
+        # Копия, чтобы правки списка на месте тоже считались изменением
+        fm._original[seg.key] = list(value) if isinstance(value, list) else value
+        fm[seg.key] = value
+    return fm
+
+
+def dump_frontmatter(data: Dict[str, Value]) -> str:
+    """Сериализует dict в фронтматтер в стиле хранилища (без разделителей)."""
+    return "".join(f"{key}: {render_value(value)}\n" for key, value in data.items() if value is not None)
+
+
+# --- Заметка целиком -------------------------------------------------------
+
+def split_note(content: str) -> Tuple[Optional[str], str, Tuple[str, str]]:
+    """Делит заметку на (текст фронтматтера, тело, (открывающая, закрывающая строки)).
+
+    Сканирует только до закрывающего ``---``: тело не разбирается. Если
+    корректного блока нет, возвращает (None, content, ...).
+    """
+    fences = (FENCE + "\n", FENCE + "\n")
+    if not content.startswith(FENCE):
+        return None, content, fences
+    first_nl = content.find("\n")
+    if first_nl == -1 or content[:first_nl].strip() != FENCE:
+        return None, content, fences
+    start = first_nl + 1
+    pos = first_nl
+    while True:
+        # Кандидаты — только строки, начинающиеся с "---"; поиск идёт на C-скорости
+        idx = content.find("\n" + FENCE, pos)
+        if idx == -1:
+            return None, content, fences
+        line_start = idx + 1
+        line_end = content.find("\n", line_start)
+        line = content[line_start:] if line_end == -1 else content[line_start:line_end]
+        if line.rstrip() == FENCE:
+            closing = content[line_start:] if line_end == -1 else content[line_start:line_end + 1]
+            body = "" if line_end == -1 else content[line_end + 1:]
+            return content[start:line_start], body, (content[:start], closing)
+        pos = line_start
+
+
+def parse_note(content: str) -> Tuple[Optional[Frontmatter], str]:
+    """Разбирает заметку: (фронтматтер или None, тело)."""
+    fm_text, body, fences = split_note(content)
+    if fm_text is None:
+        return None, content
+    fm = parse_frontmatter(fm_text)
+    fm._fences = fences
+    return fm, body
+
+
+def render_header(fm: Frontmatter, has_body: bool = True) -> str:
+    """Блок фронтматтера вместе с разделителями ``---``."""
+    opening, closing = fm._fences
+    text = fm.dump()
+    if text and not text.endswith("\n"):
+        text += "\n"
+    if not closing.endswith("\n") and has_body:
+        closing += "\n"
+    return f"{opening}{text}{closing}"
+
+
+def render_note(fm: Frontmatter, body: str) -> str:
+    """Собирает заметку обратно; для неизменённого фронтматтера — без потерь."""
+    return render_header(fm, has_body=bool(body)) + body
+
+
+# --- Чтение только заголовка с диска ----------------------------------------
+
+class NoteHeader(NamedTuple):
+    """Блок фронтматтера, прочитанный с диска без тела заметки.
+
+    text — заголовок от начала файла до конца закрывающей строки как есть
+    (переводы строк не нормализуются); body_offset — смещение тела в байтах.
+    frontmatter_text is None — корректного блока в пределах лимита нет.
+    """
+
+    text: str
+    frontmatter_text: Optional[str]
+    body_offset: int
+    fences: Tuple[str, str]
+    has_opening: bool
+    size: int
+
+    @property
+    def newline(self) -> str:
+        """Перевод строки заметки по открывающему ``---``: ``"\\r\\n"`` или ``"\\n"``."""
+        return "\r\n" if self.fences[0].endswith("\r\n") else "\n"
+
+
+def read_header(path: Path, limit: int = HEADER_LIMIT, tolerant: bool = False) -> NoteHeader:
+    """Потоково читает только фронтматтер заметки.
+
+    Читает строки до закрывающего ``---`` и не дальше limit байт; тело не
+    загружается. tolerant=True повторяет поведение frontmatter_cleaner:
+    закрывающий ``---``, прилепленный к концу строки поля, тоже считается
+    концом блока, если отдельной строки ``---`` в пределах limit нет.
+    """
+    with stage("read"):
+        header, total = _read_header(path, limit, tolerant)
+    incr("bytes_read", total)
+    return header
+
+
+def _read_header(path: Path, limit: int, tolerant: bool) -> Tuple[NoteHeader, int]:
+    fences = (FENCE + "\n", FENCE + "\n")
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        first = f.readline(limit)
+        if not first.startswith(b"---") or first.strip() != b"---":
+            return NoteHeader("", None, 0, fences, False, size), len(first)
+
+        lines = [first]
+        total = len(first)
+        glued_at = -1
+        while total < limit:
+            line = f.readline(limit - total)
+            if not line:
+                break
+            lines.append(line)
+            total += len(line)
+            stripped = line.strip() if tolerant else line.rstrip()
+            if stripped == b"---" and (tolerant or line.startswith(b"---")):
+                return _make_header(lines, size), total
+            if tolerant and glued_at == -1:
+                idx = line.find(b"---")
+                if idx > 0 and line[idx:].rstrip(b"\r\n") == b"---":
+                    glued_at = len(lines)
+
+    if glued_at != -1:
+        return _make_header(lines[:glued_at], size), total
+    return NoteHeader(first.decode("utf-8"), None, 0, fences, True, size), total
+
+
+def _make_header(lines: List[bytes], size: int) -> NoteHeader:
+    opening = lines[0].decode("utf-8")
+    closing = lines[-1].decode("utf-8")
+    fm_text = b"".join(lines[1:-1]).decode("utf-8")
+    offset = sum(len(l) for l in lines)
+    return NoteHeader(opening + fm_text + closing, fm_text, offset, (opening, closing), True, size)
+
+
+def parse_header(path: Path) -> Tuple[Optional[Frontmatter], NoteHeader]:
+    """Разбирает фронтматтер заметки, читая с диска только заголовок."""
+    header = read_header(path)
+    if header.frontmatter_text is None:
+        return None, header
+    with stage("parse"):
+        fm = parse_frontmatter(header.frontmatter_text)
+    fm._fences = header.fences
+    return fm, header
+
+
+def read_body(path: Path, header: NoteHeader) -> str:
+    """Лениво дочитывает тело заметки после заголовка."""
+    with stage("read"), open(path, "rb") as f:
+        f.seek(header.body_offset)
+        data = f.read()
+    incr("bytes_read", len(data))
+    return data.decode("utf-8")
+
+
+def copy_body(src, dst, offset: int, hasher=None) -> None:
+    """Переносит тело из файла src (с offset) в dst без декодирования.
+
+    Большие тела копируются через mmap без промежуточных bytes-объектов.
+    """
+    size = os.fstat(src.fileno()).st_size
+    if size <= offset:
+        return
+    incr("bytes_read", size - offset)
+    if size - offset >= MMAP_THRESHOLD:
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)[offset:]
+            try:
+                dst.write(view)
+                if hasher is not None:
+                    hasher.update(view)
+            finally:
+                view.release()
+        return
+    src.seek(offset)
+    data = src.read()
+    dst.write(data)
+    if hasher is not None:
+        hasher.update(data)
+
+
+def rewrite_header(path: Path, header_text: str, body_offset: int, writer: Optional[NoteWriter] = None,
+                   durable: bool = False, newline: str = "\n") -> str:
+    """Записывает новый заголовок, перенося тело заметки как есть.
+
+    Все переводы строк заголовка приводятся к newline — переводу строки
+    заметки (NoteHeader.newline), чтобы заголовок не расходился с телом.
+    Файл подменяется атомарно (vault_writer): через writer, если он передан,
+    иначе напрямую с durable. Возвращает MD5 нового содержимого (для
+    vault_index), посчитанный по ходу записи.
+    """
+    hasher = hashlib.md5()
+    header_text = header_text.replace("\r\n", "\n")
+    if newline != "\n":
+        header_text = header_text.replace("\n", newline)
+    data = header_text.encode("utf-8")
+
+    def fill(dst) -> None:
+        dst.write(data)
+        hasher.update(data)
+        with open(path, "rb") as src:
+            copy_body(src, dst, body_offset, hasher)
+
+    if writer is not None:
+        writer.replace(path, fill)
+    else:
+        atomic_replace(path, fill, durable=durable)
+    return hasher.hexdigest()
+
+
+class NoteCache:
+    """Общий кэш прочитанных заметок на один прогон обслуживания.
+
+    Записи проверяются по (st_mtime_ns, st_size), поэтому после перезаписи
+    файла кэш сам перечитает его. Разобранный Frontmatter общий для всех
+    шагов: шаг, который его меняет, должен после записи вызвать forget().
+    """
+
+    def __init__(self):
+        self._headers: Dict[str, Tuple[Tuple[int, int], Optional[Frontmatter], NoteHeader]] = {}
+        self._texts: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stamp(path: Path, st: Optional[os.stat_result]) -> Tuple[int, int]:
+        if st is None:
+            st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def header(self, path: Path, st: Optional[os.stat_result] = None) -> Tuple[Optional[Frontmatter], NoteHeader]:
+        """Как parse_header, но повторные вызовы для неизменённого файла не читают диск."""
+        key = os.fspath(path)
+        stamp = self._stamp(path, st)
+        cached = self._headers.get(key)
+        if cached is not None and cached[0] == stamp:
+            self.hits += 1
+            return cached[1], cached[2]
+        self.misses += 1
+        fm, header = parse_header(path)
+        self._headers[key] = (stamp, fm, header)
+        return fm, header
+
+    def text(self, path: Path, st: Optional[os.stat_result] = None) -> str:
+        """Полный текст заметки (с universal newlines, как у ``open(..., 'r')``)."""
+        key = os.fspath(path)
+        stamp = self._stamp(path, st)
+        cached = self._texts.get(key)
+        if cached is not None and cached[0] == stamp:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        with stage("read"), open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        incr("bytes_read", stamp[1])
+        self._texts[key] = (stamp, text)
+        return text
+
+    def forget(self, path: Path) -> None:
+        key = os.fspath(path)
+        self._headers.pop(key, None)
+        self._texts.pop(key, None)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Источник изменений из git: что поменялось с ревизии и хэши чистых файлов.
+
+Хранилище — git-репозиторий (с подмодулями, например ``Career``), и git уже
+знает, какие файлы изменились и каковы их blob ID. Модуль спрашивает
+локальный репозиторий вместо чтения и хэширования всего хранилища:
+
+- ``changed_since(root, rev)`` — изменённые, добавленные, переименованные и
+  неотслеживаемые пути с ревизии ``rev`` по рабочее дерево включительно;
+- ``blob_ids(root)`` — blob ID чистых (совпадающих с индексом) файлов. Это
+  SHA-1 от ``blob <размер>\\0<содержимое>``, его же считает алгоритм ``git``
+  в content_hash, поэтому хэши из git и посчитанные с диска сравнимы.
+
+Оба вызова рекурсивно заходят в инициализированные подмодули: для
+подмодуля ревизией служит коммит, записанный в надпроекте на момент ``rev``.
+Если git недоступен или root не в репозитории, бросается GitError —
+вызывающий возвращается к обычному режиму (индекс изменений vault_index).
+
+Если в .gitattributes настроены фильтры или нормализация переводов строк,
+blob ID соответствует содержимому после фильтров, а не байтам на диске.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from vault_metrics import incr, stage
+
+GIT_TIMEOUT = 120  # секунд на одну команду git
+SUBMODULE_MODE = "160000"
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+class GitError(RuntimeError):
+    """git недоступен, root не в репозитории или команда git завершилась с ошибкой."""
+
+
+class GitChanges(NamedTuple):
+    changed: Set[Path]  # изменённые, добавленные, новые имена переименованных, неотслеживаемые
+    deleted: Set[Path]  # удалённые и старые имена переименованных
+    renamed: Dict[Path, Path]  # старый путь -> новый
+
+
+def _git(repo: Path, *args: str) -> bytes:
+    incr("git_commands")
+    try:
+        with stage("git"):
+            result = subprocess.run(
+                ["git", "-C", str(repo), *args],
+                capture_output=True,
+                timeout=GIT_TIMEOUT,
+            )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise GitError(f"git {' '.join(args)}: {e}") from None
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", "replace").strip()
+        raise GitError(f"git {' '.join(args)}: {message}")
+    return result.stdout
+
+
+def _split_z(output: bytes) -> List[str]:
+    """Поля вывода с -z; пути в UTF-8 как есть (без экранирования core.quotePath)."""
+    return [field.decode("utf-8", "surrogateescape") for field in output.split(b"\0") if field]
+
+
+def head(root: Path) -> Optional[str]:
+    """Коммит HEAD репозитория (None — в репозитории ещё нет коммитов)."""
+    _git(root, "rev-parse", "--git-dir")  # не репозиторий — GitError вызывающему
+    try:
+        return _git(root, "rev-parse", "--verify", "--quiet", "HEAD^{commit}").decode().strip() or None
+    except GitError:
+        return None
+
+
+def _resolve(repo: Path, rev: str) -> str:
+    return _git(repo, "rev-parse", "--verify", f"{rev}^{{commit}}").decode().strip()
+
+
+def _submodules(repo: Path, rev: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """(путь, коммит) подмодулей из индекса или из дерева ревизии rev (пути относительно repo)."""
+    if rev is None:
+        output = _git(repo, "ls-files", "--stage", "-z")
+    else:
+        output = _git(repo, "ls-tree", "-r", "-z", rev)
+    for record in _split_z(output):
+        meta, _, path = record.partition("\t")
+        fields = meta.split()
+        if fields and fields[0] == SUBMODULE_MODE:
+            # ls-files: "mode sha stage", ls-tree: "mode type sha"
+            yield path, fields[1] if rev is None else fields[2]
+
+
+def _initialized(path: Path) -> bool:
+    """Подмодуль склонирован: в каталоге есть .git (файл или каталог)."""
+    return os.path.lexists(path / ".git")
+
+
+def changed_since(root: Path, rev: str) -> GitChanges:
+    """Пути, изменившиеся с ревизии rev по рабочее дерево (включая незакоммиченное).
+
+    Пути строятся от root (как он передан) и только внутри него, даже если
+    root — подкаталог репозитория. Неотслеживаемые файлы (кроме игнорируемых)
+    считаются добавленными. Подмодуль, которого на момент rev не было,
+    целиком считается добавленным.
+    """
+    changes = GitChanges(set(), set(), {})
+    _collect_changes(root, _resolve(root, rev), changes)
+    return changes
+
+
+def _collect_changes(repo: Path, base: str, changes: GitChanges) -> None:
+    # --relative и запуск из repo: пути относительно repo и только внутри него
+    output = _git(
+        repo, "diff", "--name-status", "-z", "-M", "--relative", "--no-ext-diff", "--ignore-submodules=all",
+        base, "--",
+    )
+    fields = iter(_split_z(output))
+    for status in fields:
+        kind = status[0]
+        if kind in "RC":
+            old, new = repo / next(fields), repo / next(fields)
+            changes.changed.add(new)
+            if kind == "R":
+                changes.deleted.add(old)
+                changes.renamed[old] = new
+        elif kind == "D":
+            changes.deleted.add(repo / next(fields))
+        else:
+            changes.changed.add(repo / next(fields))
+    for path in _split_z(_git(repo, "ls-files", "--others", "--exclude-standard", "-z")):
+        changes.changed.add(repo / path)
+
+    then = dict(_submodules(repo, base)) if base != EMPTY_TREE else {}
+    for path, _ in _submodules(repo):
+        sub = repo / path
+        if not _initialized(sub):
+            continue
+        # Подмодуля не было на момент base — всё его содержимое новое
+        _collect_changes(sub, then.get(path) or EMPTY_TREE, changes)
+
+
+def blob_ids(root: Path) -> Dict[Path, str]:
+    """Blob ID отслеживаемых файлов, содержимое которых совпадает с индексом git.
+
+    Файлы с незакоммиченными правками в рабочем дереве в результат не
+    попадают — их хэш нужно считать с диска (алгоритм ``git`` в content_hash).
+    """
+    blobs: Dict[Path, str] = {}
+    _collect_blobs(root, blobs)
+    return blobs
+
+
+def _collect_blobs(repo: Path, blobs: Dict[Path, str]) -> None:
+    staged = _split_z(_git(repo, "ls-files", "--stage", "-z"))
+    dirty = set(_split_z(_git(
+        repo, "diff", "--name-only", "-z", "--relative", "--no-ext-diff", "--ignore-submodules=all"
+    )))
+    submodules = []
+    for record in staged:
+        meta, _, path = record.partition("\t")
+        mode, sha, stage_number = meta.split()
+        if mode == SUBMODULE_MODE:
+            submodules.append(path)
+        elif stage_number == "0" and path not in dirty:
+            # Ненулевая стадия — конфликт слияния: содержимое не определено
+            blobs[repo / path] = sha
+    for path in submodules:
+        sub = repo / path
+        if _initialized(sub):
+            _collect_blobs(sub, blobs)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Персистентный инкрементальный индекс заметок хранилища.
+
+Для каждой заметки хранит (путь, mtime_ns, size, хэш содержимого, разобранный
+фронтматтер) и список инструментов, которые уже обработали именно эту версию
+файла. Скрипты обслуживания спрашивают индекс и пропускают неизменённые
+заметки, поэтому регулярный прогон стоит пропорционально числу правок, а не
+размеру хранилища. Флаг ``--full`` у скриптов заставляет обработать всё заново.
+
+Индекс лежит в корне хранилища в файле ``.vault_index.json``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from vault_metrics import incr, stage
+
+
+INDEX_FILENAME = ".vault_index.json"
+INDEX_VERSION = 1
+
+
+class IndexRecord(NamedTuple):
+    path: str
+    mtime_ns: int
+    size: int
+    content_hash: Optional[str]
+    frontmatter: Optional[Dict[str, Any]]
+
+
+def hash_content(data: bytes) -> str:
+    """Хэш содержимого файла (MD5 от байтов, как у остальных скриптов)."""
+    return hashlib.md5(data).hexdigest()
+
+
+def read_note(path: Path) -> Tuple[bytes, str]:
+    """Читает заметку один раз: сырые байты (для хэша) и текст.
+
+    Текст декодируется с universal newlines — так же, как ``Path.read_text``.
+    """
+    with stage("read"):
+        data = path.read_bytes()
+    incr("bytes_read", len(data))
+    text = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    return data, text
+
+
+def make_record(
+    path: Path,
+    data: Optional[bytes],
+    frontmatter: Optional[Dict[str, Any]],
+    content_hash: Optional[str] = None,
+) -> IndexRecord:
+    """Собирает запись по уже прочитанным (или только что записанным) байтам файла.
+
+    Если файл читался не целиком (только заголовок), data=None: хэш берётся из
+    content_hash, а без него остаётся неизвестным. Запись — простой кортеж,
+    поэтому её можно вернуть из процесса-воркера.
+    """
+    st = path.stat()
+    if data is not None:
+        content_hash = hash_content(data)
+    return IndexRecord(str(path), st.st_mtime_ns, st.st_size, content_hash, frontmatter)
+
+
+class VaultIndex:
+    """Манифест заметок, ключ — путь относительно корня хранилища."""
+
+    def __init__(self, root: Path, entries: Optional[Dict[str, Dict[str, Any]]] = None,
+                 index_path: Optional[Path] = None):
+        self.root = root
+        self.index_path = index_path or root / INDEX_FILENAME
+        self._entries: Dict[str, Dict[str, Any]] = entries or {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, root: Path, index_path: Optional[Path] = None) -> "VaultIndex":
+        """Читает индекс с диска; отсутствующий или битый индекс — пустой."""
+        index_path = index_path or root / INDEX_FILENAME
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(root, index_path=index_path)
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return cls(root, index_path=index_path)
+        return cls(root, data.get("files") or {}, index_path=index_path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, path: Path | str) -> str:
+        p = Path(path)
+        try:
+            return p.relative_to(self.root).as_posix()
+        except ValueError:
+            return p.as_posix()
+
+    def lookup(self, path: Path | str, st: os.stat_result) -> Optional[Dict[str, Any]]:
+        """Возвращает запись, только если файл не менялся с момента её создания."""
+        entry = self._entries.get(self.key(path))
+        if entry is None:
+            return None
+        if entry["mtime_ns"] != st.st_mtime_ns or entry["size"] != st.st_size:
+            return None
+        return entry
+
+    def is_fresh(self, path: Path | str, st: os.stat_result, tool: str) -> bool:
+        """True, если инструмент tool уже обработал текущую версию файла."""
+        entry = self.lookup(path, st)
+        return entry is not None and tool in entry["tools"]
+
+    def content_hash(self, path: Path | str, st: os.stat_result) -> Optional[str]:
+        entry = self.lookup(path, st)
+        return entry["hash"] if entry is not None else None
+
+    def frontmatter(self, path: Path | str, st: os.stat_result) -> Optional[Dict[str, Any]]:
+        entry = self.lookup(path, st)
+        return entry["frontmatter"] if entry is not None else None
+
+    def update(self, record: IndexRecord, tool: Optional[str] = None) -> None:
+        """Запоминает новую версию файла.
+
+        Если содержимое не изменилось, инструмент добавляется к уже отметившимся;
+        иначе список инструментов начинается заново — остальные должны
+        обработать файл повторно. Неизвестный хэш (None) сравнивается только
+        по mtime_ns и размеру, известный хэш при этом сохраняется.
+        """
+        key = self.key(record.path)
+        old = self._entries.get(key)
+        tools: List[str] = []
+        frontmatter = record.frontmatter
+        content_hash = record.content_hash
+        if (
+            old is not None
+            and old["mtime_ns"] == record.mtime_ns
+            and old["size"] == record.size
+            and (record.content_hash is None or old["hash"] in (None, record.content_hash))
+        ):
+            tools = list(old["tools"])
+            if frontmatter is None:
+                frontmatter = old["frontmatter"]
+            if content_hash is None:
+                content_hash = old["hash"]
+        if tool is not None and tool not in tools:
+            tools.append(tool)
+        self._entries[key] = {
+            "mtime_ns": record.mtime_ns,
+            "size": record.size,
+            "hash": content_hash,
+            "frontmatter": frontmatter,
+            "tools": tools,
+        }
+        self._dirty = True
+
+    def remember_hash(self, path: Path | str, st: os.stat_result, content_hash: str) -> None:
+        """Кэширует хэш файла для read-only инструментов (без отметки об обработке)."""
+        self.update(IndexRecord(str(path), st.st_mtime_ns, st.st_size, content_hash, None))
+
+    def prune(self, paths: Iterable[Path | str]) -> int:
+        """Удаляет записи о файлах, которых больше нет среди paths. Возвращает число удалённых."""
+        keep = {self.key(p) for p in paths}
+        stale = [k for k in self._entries if k not in keep]
+        for k in stale:
+            del self._entries[k]
+        if stale:
+            self._dirty = True
+        return len(stale)
+
+    def save(self) -> None:
+        """Атомарно сохраняет индекс (временный файл + os.replace)."""
+        if not self._dirty:
+            return
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": INDEX_VERSION, "files": self._entries},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
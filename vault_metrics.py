@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Общая инструментация скриптов обслуживания: счётчики, таймеры этапов, профиль.
+
+Код скриптов отмечает работу вызовами ``incr("bytes_read", n)`` и
+``with stage("parse"): ...``; накопленные значения в конце прогона уходят
+одной JSON-строкой в файл из ``--metrics`` (или переменной окружения
+``VAULT_METRICS``). Флаг ``--profile`` оборачивает прогон в cProfile и
+печатает самые горячие функции в stderr.
+
+Стандартные имена:
+- счётчики: files_scanned, bytes_read, bytes_written, files_written,
+  split_frontmatter_fallback;
+- этапы: walk, read, parse, clean, write (плюс свои у отдельных скриптов,
+  например hash и links).
+
+Метрики хранятся в ContextVar: complete_maintenance даёт каждому шагу свой
+экземпляр Metrics, поэтому параллельные шаги не смешивают счётчики.
+Время этапов, выполнявшихся в нескольких потоках, суммируется.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+METRICS_ENV = "VAULT_METRICS"
+PROFILE_TOP = 25
+
+
+class Metrics:
+    """Счётчики и суммарное время этапов одного прогона (потокобезопасно)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.stages: Dict[str, float] = {}
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, snapshot: Dict[str, Dict[str, Any]]) -> None:
+        """Добавляет снимок другого экземпляра (например, из процесса-воркера)."""
+        for name, n in snapshot.get("counters", {}).items():
+            self.incr(name, n)
+        for name, seconds in snapshot.get("stages", {}).items():
+            self.add_time(name, seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "stages": {k: round(v, 6) for k, v in sorted(self.stages.items())},
+            }
+
+    def drain(self) -> Dict[str, Dict[str, Any]]:
+        """Снимок с обнулением — для передачи из воркера вместе с результатом."""
+        snap = self.snapshot()
+        with self._lock:
+            self.counters.clear()
+            self.stages.clear()
+        return snap
+
+
+_current: ContextVar[Optional[Metrics]] = ContextVar("vault_metrics", default=None)
+_process_metrics = Metrics()
+
+
+def current() -> Metrics:
+    """Метрики текущего контекста (шага complete_maintenance) или всего процесса."""
+    return _current.get() or _process_metrics
+
+
+@contextmanager
+def scope(metrics: Optional[Metrics] = None) -> Iterator[Metrics]:
+    """Собирает метрики кода внутри блока в отдельный экземпляр."""
+    metrics = metrics or Metrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def incr(name: str, n: int = 1) -> None:
+    current().incr(name, n)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current().add_time(name, time.perf_counter() - start)
+
+
+def add_arguments(parser) -> None:
+    """Флаги --metrics и --profile для argparse-парсера скрипта."""
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help=f"Дописать метрики прогона JSON-строкой в файл (по умолчанию ${METRICS_ENV}, если задана)",
+    )
+    parser.add_argument("--profile", action="store_true", help="Профилировать прогон (cProfile) и вывести горячие точки")
+
+
+def write_record(path: Path | str, record: Dict[str, Any]) -> None:
+    """Дописывает одну JSON-строку; строка пишется одним write, поэтому процессы не перемешивают записи."""
+    line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def read_records(path: Path | str) -> list:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+
+def print_profile(*profilers: cProfile.Profile, top: int = PROFILE_TOP, stream=None) -> None:
+    """Печатает горячие точки; профили нескольких потоков складываются."""
+    out = io.StringIO()
+    stats = pstats.Stats(*profilers, stream=out)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(top)
+    stream = stream or sys.stderr
+    stream.write(f"\n🔥 Горячие точки (топ {top} по cumulative):\n")
+    stream.write(out.getvalue())
+
+
+@contextmanager
+def instrument(tool: str, args=None, profilers: Optional[List[cProfile.Profile]] = None) -> Iterator[Metrics]:
+    """Оборачивает прогон скрипта: профиль по --profile и JSON-строка метрик в конце.
+
+    В записи — только то, что накопилось внутри блока (разница снимков), так
+    что вложенные вызовы из complete_maintenance не дублируют счётчики шага.
+    cProfile видит только свой поток: профили других потоков прогона можно
+    добавить в список profilers, они попадут в общий отчёт.
+    """
+    metrics = current()
+    before = metrics.snapshot()
+    target = getattr(args, "metrics", None) or os.environ.get(METRICS_ENV)
+    profiler = cProfile.Profile() if getattr(args, "profile", False) else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        wall = time.perf_counter() - start
+        if profiler is not None:
+            print_profile(profiler, *(profilers or ()))
+        if target:
+            after = metrics.snapshot()
+            record = {
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "tool": tool,
+                "pid": os.getpid(),
+                "wall_seconds": round(wall, 6),
+                "counters": {
+                    k: v - before["counters"].get(k, 0)
+                    for k, v in after["counters"].items()
+                    if v != before["counters"].get(k, 0)
+                },
+                "stages": {
+                    k: round(v - before["stages"].get(k, 0.0), 6)
+                    for k, v in after["stages"].items()
+                    if v != before["stages"].get(k, 0.0)
+                },
+            }
+            try:
+                write_record(target, record)
+            except OSError as e:
+                print(f"⚠️ Не удалось записать метрики в {target}: {e}", file=sys.stderr)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Машиночитаемый вывод скриптов обслуживания: ``--format jsonl``.
+
+В режиме jsonl каждая находка уходит в stdout отдельной JSON-строкой сразу,
+как только найдена, — вывод можно передавать по конвейеру (jq, другие
+скрипты), не дожидаясь конца прогона. Обычный вывод с эмодзи в этом режиме
+перенаправляется в stderr, поэтому stdout содержит только JSON-строки.
+
+У каждой строки есть поля ``tool`` (скрипт) и ``kind`` (вид находки), прочие
+поля зависят от kind; пути — строками. Последняя строка прогона — kind
+``summary`` с итоговыми счётчиками.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Iterator, Optional, TextIO
+
+FORMATS = ("text", "jsonl")
+
+
+def add_arguments(parser) -> None:
+    """Флаг --format для argparse-парсера скрипта."""
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="text",
+        help="Формат вывода: text — для человека, jsonl — JSON-строка на каждую находку",
+    )
+
+
+class Reporter:
+    """Пишет находки JSON-строками в режиме jsonl; в режиме text ничего не делает.
+
+    Находки не копятся: каждая строка сразу пишется и сбрасывается в поток.
+    Потокобезопасен — шаги complete_maintenance пишут параллельно.
+    """
+
+    def __init__(self, tool: Optional[str] = None, fmt: str = "text", stream: Optional[TextIO] = None):
+        self.tool = tool
+        self.jsonl = fmt == "jsonl"
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, tool: str, args) -> "Reporter":
+        return cls(tool, getattr(args, "format", "text"))
+
+    def child(self, tool: str) -> "Reporter":
+        """Reporter вложенного инструмента: тот же поток и формат, своё имя в поле tool."""
+        child = Reporter(tool, "jsonl" if self.jsonl else "text", self._stream)
+        child._lock = self._lock
+        return child
+
+    def emit(self, kind: str, **fields: Any) -> None:
+        if not self.jsonl:
+            return
+        record = {"tool": self.tool, "kind": kind, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            stream = self._stream or sys.stdout
+            stream.write(line)
+            stream.flush()
+
+    @contextmanager
+    def session(self) -> Iterator["Reporter"]:
+        """На время прогона: в режиме jsonl print() уходит в stderr, JSON-строки — в stdout.
+
+        У вложенного (child) Reporter поток уже выбран — stdout не трогается.
+        """
+        if not self.jsonl or self._stream is not None:
+            yield self
+            return
+        self._stream = sys.stdout
+        with redirect_stdout(sys.stderr):
+            yield self
+
+
+# Для вызовов без --format: находки не пишутся
+TEXT = Reporter()
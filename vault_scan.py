@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Общий однопроходный обход Obsidian-хранилища.
+
+Все инструменты обслуживания раньше обходили хранилище своим ``Path.rglob``
+со своей версией ``should_skip``. Этот модуль обходит дерево один раз через
+``os.scandir``, отсекает исключённые каталоги (Templates, backups, .git) ещё до
+спуска в них и возвращает ``stat`` вместе с каждым путём, чтобы инструменты
+не делали повторных системных вызовов.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple
+
+from vault_metrics import incr, stage
+
+
+EXCLUDE_DIR_NAMES = frozenset({"Templates", "backups", ".git"})
+
+
+class ScanEntry(NamedTuple):
+    path: Path
+    stat: os.stat_result
+    is_dir: bool = False
+
+
+def iter_vault(
+    root: Path,
+    suffix: str | None = ".md",
+    exclude: Iterable[str] = EXCLUDE_DIR_NAMES,
+    include_dirs: bool = False,
+) -> Iterator[ScanEntry]:
+    """Лениво обходит хранилище, не спускаясь в исключённые каталоги.
+
+    suffix=None — отдаёт все файлы; include_dirs — отдаёт и сами каталоги.
+    В символические ссылки на каталоги обход не заходит (как и ``rglob``):
+    они ведут за пределы хранилища или в цикл и в результат не попадают.
+    Ссылки на файлы отдаются со ``stat`` цели. Ошибки доступа к отдельным
+    каталогам и файлам молча пропускаются, как это делал ``rglob``.
+    """
+    excluded = frozenset(exclude)
+    stack: List[str] = [os.fspath(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if entry.name in excluded:
+                        continue
+                    stack.append(entry.path)
+                    if include_dirs:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        yield ScanEntry(Path(entry.path), st, True)
+                    continue
+                if suffix is not None and not entry.name.endswith(suffix):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    continue  # символическая ссылка на каталог
+                yield ScanEntry(Path(entry.path), st, False)
+
+
+def scan_vault(
+    root: Path,
+    suffix: str | None = ".md",
+    exclude: Iterable[str] = EXCLUDE_DIR_NAMES,
+    include_dirs: bool = False,
+) -> List[ScanEntry]:
+    """Обходит хранилище один раз и возвращает список записей для повторного использования."""
+    with stage("walk"):
+        entries = list(iter_vault(root, suffix=suffix, exclude=exclude, include_dirs=include_dirs))
+    incr("files_scanned", sum(1 for e in entries if not e.is_dir))
+    return entries
+
+
+def markdown_files(entries: Iterable[ScanEntry]) -> List[ScanEntry]:
+    """Оставляет только .md-файлы (для результатов полного скана с suffix=None)."""
+    return [e for e in entries if not e.is_dir and e.path.name.endswith(".md")]
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Watch-режим: заметки чистятся и индексируются сразу после сохранения.
+
+Изменения отслеживаются через inotify (Linux, через ctypes без внешних
+зависимостей), а где его нет — периодическим опросом mtime/size. Серия
+сохранений одного файла из редактора схлопывается (debounce): заметка
+обрабатывается, когда в неё не писали ``debounce`` секунд.
+
+Для каждой изменённой заметки выполняются те же шаги, что и в пакетном
+прогоне, но только для неё:
+- frontmatter_cleaner.clean_file;
+- standardize_frontmatter;
+- проверка дубликатов по content_hash.DuplicateIndex;
+- обновление каталога vault_catalog, если он создан.
+
+Собственные записи не вызывают повторной обработки: после шагов запоминается
+(mtime_ns, size) заметки, и событие с тем же штампом пропускается. Индекс
+изменений сохраняется не чаще раза в SAVE_INTERVAL секунд и при выходе —
+запись всего индекса на каждое сохранение стоила бы пропорционально
+размеру хранилища.
+
+Запуск: ``python3 complete_maintenance.py --watch [--debounce 0.5] [--poll]``.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import frontmatter_cleaner
+from content_hash import DigestCache, DuplicateIndex
+from standardize_frontmatter import standardize_frontmatter
+from vault_catalog import CATALOG_FILENAME, VaultCatalog, fts5_available
+from vault_frontmatter import NoteCache
+from vault_index import VaultIndex
+from vault_report import TEXT, Reporter
+from vault_scan import EXCLUDE_DIR_NAMES, ScanEntry, iter_vault, scan_vault
+from vault_writer import NoteWriter
+
+
+DEFAULT_DEBOUNCE = 0.5
+POLL_INTERVAL = 2.0
+SAVE_INTERVAL = 60.0
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+def is_note_path(root: Path, path: Path) -> bool:
+    """Заметка, которую обслуживают скрипты: .md вне исключённых каталогов, не скрытая."""
+    if not path.name.endswith(".md") or path.name.startswith("."):
+        return False
+    try:
+        parts = path.relative_to(root).parts
+    except ValueError:
+        return False
+    return not EXCLUDE_DIR_NAMES.intersection(parts[:-1])
+
+
+class InotifyWatcher:
+    """Рекурсивное наблюдение за каталогами через inotify.
+
+    read() возвращает пути, о которых пришли события: файлы и каталоги
+    (созданные, перемещённые, удалённые). При переполнении очереди ядра
+    возвращается сам root — это сигнал перепроверить всё хранилище.
+    """
+
+    def __init__(self, root: Path, exclude: Iterable[str] = EXCLUDE_DIR_NAMES):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify недоступен")
+        self._libc = libc
+        self.root = root
+        self._exclude = frozenset(exclude)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dirs: Dict[int, Path] = {}
+        self._watch_tree(root)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # Каталог успел исчезнуть — не ошибка
+            if err in (2, 20):  # ENOENT, ENOTDIR
+                return
+            raise OSError(err, f"inotify_add_watch {directory}: {os.strerror(err)}")
+        self._dirs[wd] = directory
+
+    def _watch_tree(self, directory: Path) -> None:
+        self._watch(directory)
+        for entry in iter_vault(directory, suffix=None, exclude=self._exclude, include_dirs=True):
+            if entry.is_dir:
+                self._watch(entry.path)
+
+    def read(self, timeout: Optional[float]) -> Set[Path]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return set()
+        changed: Set[Path] = set()
+        pos = 0
+        while pos < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos:pos + length].rstrip(b"\0")
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.root)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # Каталог удалён или перемещён — ядро само сняло наблюдение
+                del self._dirs[wd]
+                continue
+            if not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if path.name in self._exclude:
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Файлы могли появиться до того, как встало наблюдение: каталог
+                    # отдаётся целиком, вызывающий сам обойдёт его
+                    self._watch_tree(path)
+            changed.add(path)
+        return changed
+
+
+class PollingWatcher:
+    """Запасной вариант без inotify: опрос (mtime_ns, size) всех заметок.
+
+    Стоит пропорционально размеру хранилища на каждый опрос, поэтому
+    используется только там, где inotify нет (или по флагу --poll).
+    """
+
+    def __init__(self, root: Path, interval: float = POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._stamps = self._scan()
+        self._next = time.monotonic() + interval
+
+    def close(self) -> None:
+        pass
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        return {e.path: (e.stat.st_mtime_ns, e.stat.st_size) for e in iter_vault(self.root)}
+
+    def read(self, timeout: Optional[float]) -> Set[Path]:
+        now = time.monotonic()
+        wait = self._next - now
+        if timeout is not None and timeout < wait:
+            time.sleep(max(timeout, 0.0))
+            return set()
+        time.sleep(max(wait, 0.0))
+        self._next = time.monotonic() + self.interval
+        stamps = self._scan()
+        changed = {p for p, stamp in stamps.items() if self._stamps.get(p) != stamp}
+        changed.update(p for p in self._stamps if p not in stamps)
+        self._stamps = stamps
+        return changed
+
+
+def open_watcher(root: Path, polling: bool = False):
+    """inotify, если он есть, иначе опрос."""
+    if not polling:
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify недоступен ({e}), переключаемся на опрос раз в {POLL_INTERVAL:.0f} сек")
+    return PollingWatcher(root)
+
+
+class Debouncer:
+    """Копит пути и отдаёт те, в которые не писали последние delay секунд."""
+
+    def __init__(self, delay: float = DEFAULT_DEBOUNCE):
+        self.delay = delay
+        self._pending: Dict[Path, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, paths: Iterable[Path], now: float) -> None:
+        for path in paths:
+            self._pending[path] = now
+
+    def due(self, now: float) -> List[Path]:
+        ready = [p for p, last in self._pending.items() if now - last >= self.delay]
+        for path in ready:
+            del self._pending[path]
+        return ready
+
+    def timeout(self, now: float) -> Optional[float]:
+        """Сколько ждать до ближайшего готового пути; None — ждать событий без таймаута."""
+        if not self._pending:
+            return None
+        return max(0.0, min(self._pending.values()) + self.delay - now)
+
+
+class WatchProcessor:
+    """Обрабатывает пачку изменённых путей шагами пакетного прогона."""
+
+    def __init__(self, root: Path, entries: List[ScanEntry], durable: bool = False, reporter: Reporter = TEXT):
+        self.root = root
+        self.durable = durable
+        self.reporter = reporter
+        self.index = VaultIndex.load(root)
+        self.cache = NoteCache()
+        self.duplicates = DuplicateIndex(entries, DigestCache())
+        self.catalog: Optional[VaultCatalog] = None
+        if (root / CATALOG_FILENAME).exists() and fts5_available():
+            self.catalog = VaultCatalog.open(root)
+        # Штамп заметки после обработки: событие с тем же штампом — наша же запись
+        self._handled: Dict[Path, Tuple[int, int]] = {}
+        self._saved_at = time.monotonic()
+
+    def close(self) -> None:
+        self.index.save()
+        if self.catalog is not None:
+            self.catalog.close()
+
+    def _expand(self, paths: Iterable[Path]) -> Tuple[List[ScanEntry], List[Path]]:
+        """Раскрывает пути событий в (изменённые заметки, удалённые заметки)."""
+        changed: Dict[Path, ScanEntry] = {}
+        removed: Set[Path] = set()
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is None:
+                if path in self.duplicates:
+                    removed.add(path)
+                elif not path.name.endswith(".md"):
+                    # Удалённый или перемещённый каталог: убираем всё, что под ним
+                    prefix = os.fspath(path) + os.sep
+                    removed.update(p for p in self.duplicates.paths() if os.fspath(p).startswith(prefix))
+                continue
+            if os.path.isdir(path):
+                scanned = scan_vault(self.root) if path == self.root else iter_vault(path)
+                known = set(self.duplicates.paths()) if path == self.root else set()
+                for entry in scanned:
+                    if is_note_path(self.root, entry.path):
+                        changed[entry.path] = entry
+                removed.update(known - set(changed))
+                continue
+            if is_note_path(self.root, path):
+                changed[path] = ScanEntry(path, st)
+        fresh = [
+            entry for entry in changed.values()
+            if self._handled.get(entry.path) != (entry.stat.st_mtime_ns, entry.stat.st_size)
+        ]
+        return fresh, sorted(removed)
+
+    def handle(self, paths: Iterable[Path]) -> int:
+        """Обрабатывает пути одного срабатывания debounce. Возвращает число заметок."""
+        entries, removed = self._expand(paths)
+        for path in removed:
+            self.duplicates.remove(path)
+            self.cache.forget(path)
+            self._handled.pop(path, None)
+            self.reporter.emit("removed", path=path)
+            print(f"🗑️ {path.relative_to(self.root)}")
+        if self.catalog is not None and removed:
+            with self.catalog.conn:
+                for path in removed:
+                    self.catalog.remove(path)
+        if not entries:
+            return 0
+
+        with NoteWriter(durable=self.durable) as writer:
+            for entry in entries:
+                changed, record = frontmatter_cleaner.clean_file(entry.path, durable=self.durable)
+                if changed:
+                    self.reporter.emit("fixed", path=entry.path)
+                    writer.add(entry.path)
+                    self.cache.forget(entry.path)
+                if record is not None:
+                    self.index.update(record, frontmatter_cleaner.TOOL_NAME)
+
+        fresh = []
+        for entry in entries:
+            try:
+                fresh.append(ScanEntry(entry.path, os.stat(entry.path)))
+            except OSError:
+                continue
+        standardize_frontmatter(
+            durable=self.durable, root=self.root, entries=fresh, index=self.index, cache=self.cache,
+            reporter=self.reporter.child("standardize_frontmatter"),
+        )
+
+        for entry in fresh:
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                continue
+            self._handled[entry.path] = (st.st_mtime_ns, st.st_size)
+            try:
+                duplicates = self.duplicates.update(entry.path, st)
+            except OSError as e:
+                print(f"Ошибка обработки {entry.path}: {e}")
+                duplicates = []
+            for other in duplicates:
+                self.reporter.emit("duplicate_content", paths=[entry.path, other])
+                print(f"⚠️ {entry.path.relative_to(self.root)} совпадает с {other.relative_to(self.root)}")
+
+        if self.catalog is not None:
+            # Одна транзакция на пачку: commit с fsync на каждую заметку дорог
+            with self.catalog.conn:
+                for entry in fresh:
+                    try:
+                        st = os.stat(entry.path)
+                        self.catalog.upsert(entry.path, st, self.cache.text(entry.path, st))
+                    except (OSError, UnicodeDecodeError) as e:
+                        print(f"Ошибка чтения {entry.path}: {e}")
+
+        now = time.monotonic()
+        if now - self._saved_at >= SAVE_INTERVAL:
+            self.index.save()
+            self._saved_at = now
+        return len(fresh)
+
+
+def watch(root: Path, debounce: float = DEFAULT_DEBOUNCE, polling: bool = False, durable: bool = False,
+          reporter: Reporter = TEXT) -> int:
+    """Основной цикл watch-режима; завершается по Ctrl+C.
+
+    С reporter в режиме jsonl каждая правка и находка сразу пишется JSON-строкой.
+    """
+    entries = [e for e in scan_vault(root) if is_note_path(root, e.path)]
+    processor = WatchProcessor(root, entries, durable=durable, reporter=reporter)
+    watcher = open_watcher(root, polling)
+    debouncer = Debouncer(debounce)
+    print(f"👀 Наблюдение за {root} ({type(watcher).__name__}), заметок: {len(entries)}. Ctrl+C — выход")
+
+    # Догоняем правки, сделанные, пока наблюдение не работало
+    stale = [e.path for e in entries if not processor.index.is_fresh(e.path, e.stat, frontmatter_cleaner.TOOL_NAME)]
+    if stale:
+        print(f"🔄 Изменено с прошлого прогона: {len(stale)}")
+        processor.handle(stale)
+    try:
+        while True:
+            changed = watcher.read(debouncer.timeout(time.monotonic()))
+            now = time.monotonic()
+            debouncer.add(changed, now)
+            ready = debouncer.due(now)
+            if ready:
+                started = time.perf_counter()
+                count = processor.handle(ready)
+                if count:
+                    reporter.emit("batch", notes=count, seconds=round(time.perf_counter() - started, 3))
+                    print(f"✅ Обработано заметок: {count} за {time.perf_counter() - started:.2f} сек")
+    except KeyboardInterrupt:
+        print("\n👋 Наблюдение остановлено")
+    finally:
+        watcher.close()
+        processor.close()
+    return 0
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Общая атомарная запись заметок.
+
+- Неизменённое содержимое не записывается: mtime, индекс Obsidian и
+  ``git status`` не трогаются.
+- Запись идёт во временный файл в том же каталоге и подменяет исходный через
+  ``os.replace``: прерванный прогон не оставляет наполовину записанных заметок.
+- ``fsync`` по умолчанию делается пачкой в конце прогона (NoteWriter.sync), а
+  с durable=True — сразу для каждого файла и его каталога.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, List, Union
+
+from vault_metrics import current
+
+
+def _fsync_path(path: Path | str, directory: bool = False) -> None:
+    flags = os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if directory else 0)
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def atomic_replace(path: Path, fill: Callable[[BinaryIO], None], durable: bool = False) -> None:
+    """Атомарно заменяет файл содержимым, которое fill пишет в переданный поток.
+
+    Права доступа исходного файла сохраняются. При любой ошибке временный файл
+    удаляется, а исходный остаётся нетронутым.
+    """
+    tmp_path = _tmp_path(path)
+    start = time.perf_counter()
+    try:
+        with open(tmp_path, "wb") as dst:
+            fill(dst)
+            written = dst.tell()
+            if durable:
+                dst.flush()
+                os.fsync(dst.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durable:
+        _fsync_path(path.parent, directory=True)
+    metrics = current()
+    metrics.add_time("write", time.perf_counter() - start)
+    metrics.incr("bytes_written", written)
+    metrics.incr("files_written")
+
+
+def write_if_changed(path: Path, data: Union[bytes, str], durable: bool = False) -> bool:
+    """Записывает data, только если содержимое файла отличается. Возвращает True при записи."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    atomic_replace(path, lambda dst: dst.write(data), durable=durable)
+    return True
+
+
+def sync_paths(paths: Iterable[Path | str]) -> None:
+    """Пачкой сбрасывает на диск файлы и каталоги, в которых их подменили."""
+    parents = set()
+    for path in paths:
+        path = Path(path)
+        try:
+            _fsync_path(path)
+        except OSError:
+            continue
+        parents.add(path.parent)
+    for parent in sorted(parents):
+        try:
+            _fsync_path(parent, directory=True)
+        except OSError:
+            pass
+
+
+class NoteWriter:
+    """Пишет заметки за один прогон и в конце делает общий fsync.
+
+    Использование::
+
+        with NoteWriter(durable=args.durable) as writer:
+            writer.write(path, new_content)
+    """
+
+    def __init__(self, durable: bool = False):
+        self.durable = durable
+        self.written = 0
+        self.skipped = 0
+        self._pending: List[Path] = []
+
+    def __enter__(self) -> "NoteWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.sync()
+
+    def write(self, path: Path, data: Union[bytes, str]) -> bool:
+        """Записывает заметку, если она изменилась. Возвращает True при записи."""
+        if not write_if_changed(path, data, durable=self.durable):
+            self.skip()
+            return False
+        self.add(path)
+        return True
+
+    def replace(self, path: Path, fill: Callable[[BinaryIO], None]) -> None:
+        """Атомарно перезаписывает заметку потоково (см. atomic_replace)."""
+        atomic_replace(path, fill, durable=self.durable)
+        self.add(path)
+
+    def add(self, path: Path) -> None:
+        """Учитывает запись, сделанную в обход writer (например, в процессе-воркере)."""
+        self.written += 1
+        if not self.durable:
+            self._pending.append(Path(path))
+
+    def skip(self) -> None:
+        """Учитывает заметку, которую не пришлось перезаписывать."""
+        self.skipped += 1
+
+    def sync(self) -> None:
+        """Сбрасывает на диск всё, что записано с прошлого sync (durable — уже сброшено)."""
+        pending, self._pending = self._pending, []
+        if pending:
+            sync_paths(pending)